@@ -1,17 +1,224 @@
 """Chat endpoint"""
+import asyncio
+import json
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import HumanMessage
 from app.models.schemas import ChatRequest, ChatResponse
 from app.api.dependencies import get_agent
 from app.utils.persona_detector import detect_persona_switch
+from app.database.adapter import db_adapter, UnitOfWork
 from app.services.memory.thread_manager import ThreadManager
+from app.services.memory.message_writer import message_writer
+from app.services.memory.thread_lock import thread_lock_manager
 from app.services.agent.prompts import DEFAULT_PERSONA
+from app.models.database import Thread
+from app.core.config import settings
 from app.core.logging import logger
+from app.core.exceptions import ChatbotException
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Dict, Any, AsyncIterator, List
 
 router = APIRouter()
 
 
+async def _resolve_thread(request: ChatRequest, thread_manager: ThreadManager) -> Thread:
+    """
+    Route the request to the thread that should handle it.
+    
+    - If switch detected: find existing thread for that persona or create new one
+    - If no switch: continue in current thread (or create default if none exists)
+    """
+    target_persona: Optional[str] = None
+    final_thread_id: Optional[str] = None
+    current_thread = None
+    
+    # Get current thread if thread_id provided
+    if request.thread_id:
+        try:
+            current_thread = await thread_manager.get_thread(request.thread_id)
+            logger.info(f"Current thread persona: {current_thread.persona}")
+        except (ValueError, Exception) as e:
+            logger.warning(f"Thread {request.thread_id} not found or invalid: {str(e)}")
+            current_thread = None
+    
+    # Detect persona switch intent
+    detected_persona_switch = detect_persona_switch(request.message)
+    logger.info(f"Detected persona switch: {detected_persona_switch}")
+    
+    # Handle persona switching logic
+    if detected_persona_switch:
+        # A specific persona switch was requested
+        target_persona = detected_persona_switch
+        
+        # Check if we're already in a thread with this persona
+        if current_thread and current_thread.persona == target_persona:
+            # Already in the correct thread, continue using it
+            final_thread_id = str(current_thread.thread_id)
+            logger.info(f"Already in {target_persona} thread, continuing")
+        else:
+            # Need to switch - check if user already has an existing thread for this persona
+            target_thread = await thread_manager.get_thread_for_persona(request.user_id, target_persona)
+            
+            if target_thread:
+                # Switch to existing thread (long-term memory recall)
+                final_thread_id = str(target_thread.thread_id)
+                logger.info(f"Switching to existing {target_persona} thread: {final_thread_id}")
+            else:
+                # Create NEW thread for this persona
+                new_thread = await _create_thread(thread_manager, request.user_id, target_persona)
+                final_thread_id = str(new_thread.thread_id)
+                logger.info(f"Created new {target_persona} thread: {final_thread_id}")
+    else:
+        # No persona switch requested - continue in current context
+        if current_thread:
+            # Continue in existing thread
+            final_thread_id = str(current_thread.thread_id)
+            target_persona = current_thread.persona
+            logger.info(f"Continuing in existing {target_persona} thread: {final_thread_id}")
+        else:
+            # First time user, no thread, no specific persona -> Default
+            target_persona = DEFAULT_PERSONA
+            new_thread = await _create_thread(thread_manager, request.user_id, target_persona)
+            final_thread_id = str(new_thread.thread_id)
+            logger.info(f"Created default {target_persona} thread for new user: {final_thread_id}")
+    
+    # Ensure we have a valid thread_id at this point
+    if not final_thread_id:
+        raise ValueError("Failed to determine thread_id")
+    
+    # Get the final thread to ensure it exists
+    return await thread_manager.get_thread(final_thread_id)
+
+
+def _build_initial_state(request: ChatRequest, thread: Thread, **metadata) -> Dict[str, Any]:
+    """Prepare the LangGraph input state for a turn"""
+    return {
+        "messages": [HumanMessage(content=request.message)],
+        "current_persona": thread.persona,  # Use the thread's actual persona
+        "thread_id": str(thread.thread_id),
+        "user_id": request.user_id,
+        "metadata": metadata
+    }
+
+
+def _turn_config(thread_id: str, uow: UnitOfWork) -> Dict[str, Any]:
+    """LangGraph config for a turn; the checkpointer buffers its writes in `uow`"""
+    return {"configurable": {"thread_id": thread_id, "unit_of_work": uow}}
+
+
+async def _create_thread(thread_manager: ThreadManager, user_id: str, persona: str) -> Thread:
+    """Provision the user (if needed) and create the thread in one transaction"""
+    async with db_adapter.transaction() as tx:
+        return await thread_manager.create_thread(user_id=user_id, persona=persona, tx=tx)
+
+
+def _extract_response_text(result: Dict[str, Any]) -> str:
+    """Extract the assistant reply from the final agent state"""
+    messages = result.get("messages", [])
+    if messages:
+        last_message = messages[-1]
+        return last_message.content if hasattr(last_message, 'content') else str(last_message)
+    return ""
+
+
+def _is_cache_hit(result: Dict[str, Any]) -> bool:
+    """Check whether the agent served this turn from the response cache"""
+    return bool((result.get("metadata") or {}).get("response_cache_hit"))
+
+
+def _chunk_text(chunk: Any) -> str:
+    """Extract text from a streamed message chunk"""
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            block.get("text", "") for block in content
+            if isinstance(block, dict) and block.get("type") == "text"
+        )
+    return ""
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Format a Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _run_turn(
+    agent,
+    request: ChatRequest,
+    thread_manager: ThreadManager,
+    priority: str = "interactive"
+) -> ChatResponse:
+    """Route, run and persist one chat turn"""
+    final_thread = await _resolve_thread(request, thread_manager)
+    final_thread_id = str(final_thread.thread_id)
+    
+    # Invoke LangGraph agent (one turn at a time per thread, so concurrent
+    # requests can't both build on the same checkpoint)
+    uow = db_adapter.unit_of_work(final_thread_id)
+    async with thread_lock_manager.hold(final_thread_id):
+        initial_state = _build_initial_state(request, final_thread, priority=priority)
+        result = await agent.ainvoke(initial_state, config=_turn_config(final_thread_id, uow))
+        response_text = _extract_response_text(result)
+        
+        # Checkpoints commit before the response; the messages are queued
+        # (write-behind) or commit with them, per MESSAGE_WRITE_ACK
+        await message_writer.save_turn(final_thread_id, request.message, response_text, uow=uow)
+        await message_writer.commit(uow)
+    
+    return ChatResponse(
+        thread_id=final_thread_id,
+        persona=final_thread.persona,
+        response=response_text,
+        created_at=datetime.now(),
+        cached=_is_cache_hit(result)
+    )
+
+
+async def _stream_turn(agent, request: ChatRequest, thread: Thread) -> AsyncIterator[str]:
+    """Run one agent turn, yielding SSE token frames and a final `done` frame"""
+    thread_id = str(thread.thread_id)
+    uow = db_adapter.unit_of_work(thread_id)
+    config = _turn_config(thread_id, uow)
+    initial_state = _build_initial_state(request, thread, stream=True)
+    streamed: list = []
+    result: Optional[Dict[str, Any]] = None
+    
+    async for event in agent.astream_events(initial_state, config=config, version="v2"):
+        kind = event["event"]
+        if kind == "on_chat_model_stream" and event.get("metadata", {}).get("langgraph_node") == "execute_persona":
+            # Only the persona reply is user-facing (not e.g. summarization calls)
+            text = _chunk_text(event["data"].get("chunk"))
+            if text:
+                streamed.append(text)
+                yield _sse("token", {"content": text})
+        elif kind == "on_chain_end" and not event.get("parent_ids"):
+            # Top-level graph run finished; its output is the final state
+            result = event["data"].get("output")
+    
+    if not isinstance(result, dict):
+        result = {"messages": [], "metadata": {}}
+    response_text = _extract_response_text(result) or "".join(streamed)
+    if response_text and not streamed:
+        # Nothing was generated token by token (e.g. a cached response); send it whole
+        yield _sse("token", {"content": response_text})
+    
+    # Save checkpoints and messages (per MESSAGE_WRITE_ACK) once the stream has completed
+    await message_writer.save_turn(thread_id, request.message, response_text, uow=uow)
+    await message_writer.commit(uow)
+    
+    response = ChatResponse(
+        thread_id=thread_id,
+        persona=thread.persona,
+        response=response_text,
+        created_at=datetime.now(),
+        cached=_is_cache_hit(result)
+    )
+    yield _sse("done", response.model_dump(mode="json"))
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat(
     request: ChatRequest,
@@ -29,123 +236,96 @@ async def chat(
     """
     try:
         logger.info(f"Received chat request from user {request.user_id}, thread_id: {request.thread_id}")
+        return await _run_turn(agent, request, ThreadManager())
+    except ChatbotException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in chat endpoint: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    agent = Depends(get_agent)
+):
+    """
+    Streaming chat endpoint (Server-Sent Events).
+    
+    Thread routing happens up front; tokens are flushed as `token` events while
+    the agent runs, and the messages are persisted once the stream completes.
+    The final `done` event carries the same payload as POST /chat.
+    """
+    try:
+        logger.info(f"Received streaming chat request from user {request.user_id}, thread_id: {request.thread_id}")
         
         thread_manager = ThreadManager()
-        target_persona: Optional[str] = None
-        final_thread_id: Optional[str] = None
-        current_thread = None
-        
-        # Get current thread if thread_id provided
-        if request.thread_id:
-            try:
-                current_thread = await thread_manager.get_thread(request.thread_id)
-                logger.info(f"Current thread persona: {current_thread.persona}")
-            except (ValueError, Exception) as e:
-                logger.warning(f"Thread {request.thread_id} not found or invalid: {str(e)}")
-                current_thread = None
-        
-        # Detect persona switch intent
-        detected_persona_switch = detect_persona_switch(request.message)
-        logger.info(f"Detected persona switch: {detected_persona_switch}")
-        
-        # Handle persona switching logic
-        if detected_persona_switch:
-            # A specific persona switch was requested
-            target_persona = detected_persona_switch
-            
-            # Check if we're already in a thread with this persona
-            if current_thread and current_thread.persona == target_persona:
-                # Already in the correct thread, continue using it
-                final_thread_id = str(current_thread.thread_id)
-                logger.info(f"Already in {target_persona} thread, continuing")
-            else:
-                # Need to switch - check if user already has an existing thread for this persona
-                existing_threads = await thread_manager.get_user_threads(request.user_id)
-                target_thread = next(
-                    (t for t in existing_threads if t.persona == target_persona),
-                    None
-                )
-                
-                if target_thread:
-                    # Switch to existing thread (long-term memory recall)
-                    final_thread_id = str(target_thread.thread_id)
-                    logger.info(f"Switching to existing {target_persona} thread: {final_thread_id}")
-                else:
-                    # Create NEW thread for this persona
-                    new_thread = await thread_manager.create_thread(
-                        user_id=request.user_id,
-                        persona=target_persona
-                    )
-                    final_thread_id = str(new_thread.thread_id)
-                    logger.info(f"Created new {target_persona} thread: {final_thread_id}")
-        else:
-            # No persona switch requested - continue in current context
-            if current_thread:
-                # Continue in existing thread
-                final_thread_id = str(current_thread.thread_id)
-                target_persona = current_thread.persona
-                logger.info(f"Continuing in existing {target_persona} thread: {final_thread_id}")
-            else:
-                # First time user, no thread, no specific persona -> Default
-                target_persona = DEFAULT_PERSONA
-                new_thread = await thread_manager.create_thread(
-                    user_id=request.user_id,
-                    persona=target_persona
-                )
-                final_thread_id = str(new_thread.thread_id)
-                logger.info(f"Created default {target_persona} thread for new user: {final_thread_id}")
-        
-        # Ensure we have a valid thread_id at this point
-        if not final_thread_id:
-            raise ValueError("Failed to determine thread_id")
-        
-        # Get the final thread to ensure it exists
-        final_thread = await thread_manager.get_thread(final_thread_id)
-        target_persona = final_thread.persona  # Use the thread's actual persona
-        
-        # Invoke LangGraph agent
-        from langchain_core.messages import HumanMessage
-        config = {"configurable": {"thread_id": final_thread_id}}
-        
-        # Prepare initial state
-        initial_state = {
-            "messages": [HumanMessage(content=request.message)],
-            "current_persona": target_persona,
-            "thread_id": final_thread_id,
-            "user_id": request.user_id,
-            "metadata": {}
-        }
-        
-        result = await agent.ainvoke(initial_state, config=config)
-        
-        # Extract response from agent result
-        messages = result.get("messages", [])
-        if messages:
-            last_message = messages[-1]
-            response_text = last_message.content if hasattr(last_message, 'content') else str(last_message)
-        else:
-            response_text = ""
-        
-        # Save message to database
-        await thread_manager.save_message(
-            thread_id=final_thread_id,
-            role="user",
-            content=request.message
-        )
-        await thread_manager.save_message(
-            thread_id=final_thread_id,
-            role="assistant",
-            content=response_text
-        )
-        
-        return ChatResponse(
-            thread_id=final_thread_id,
-            persona=target_persona,
-            response=response_text,
-            created_at=datetime.now()
-        )
-        
+        final_thread = await _resolve_thread(request, thread_manager)
+        final_thread_id = str(final_thread.thread_id)
     except Exception as e:
-        logger.error(f"Error in chat endpoint: {str(e)}", exc_info=True)
+        logger.error(f"Error in chat stream endpoint: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    
+    async def event_stream() -> AsyncIterator[str]:
+        yield _sse("metadata", {"thread_id": final_thread_id, "persona": final_thread.persona})
+        try:
+            async with thread_lock_manager.hold(final_thread_id):
+                async for frame in _stream_turn(agent, request, final_thread):
+                    yield frame
+        except ChatbotException as e:
+            yield _sse("error", {"error": e.message, "type": e.__class__.__name__})
+        except Exception as e:
+            logger.error(f"Error in chat stream: {str(e)}", exc_info=True)
+            yield _sse("error", {"error": f"Internal server error: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 
+@router.post("/chat/batch")
+async def chat_batch(
+    requests: List[ChatRequest],
+    agent = Depends(get_agent)
+):
+    """
+    Batch chat endpoint.
+    
+    Runs each request through the same routing + agent pipeline as POST /chat,
+    at most BATCH_MAX_CONCURRENCY at a time, and streams one NDJSON line per
+    item in completion order. Each line carries the item's `index`; a failed
+    item yields an error line without affecting the rest of the batch.
+    """
+    if len(requests) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(requests)} items (max {settings.BATCH_MAX_ITEMS})"
+        )
+    logger.info(f"Received chat batch with {len(requests)} item(s)")
+    
+    semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+    thread_manager = ThreadManager()
+    
+    async def run_item(index: int, item: ChatRequest) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                response = await _run_turn(agent, item, thread_manager, priority="batch")
+                return {"index": index, "status": "ok", "response": response.model_dump(mode="json")}
+            except Exception as e:
+                logger.error(f"Error in batch item {index}: {str(e)}")
+                message = e.message if isinstance(e, ChatbotException) else str(e)
+                return {"index": index, "status": "error", "error": message, "type": e.__class__.__name__}
+    
+    async def results() -> AsyncIterator[str]:
+        tasks = [asyncio.create_task(run_item(i, item)) for i, item in enumerate(requests)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished, default=str) + "\n"
+        finally:
+            # Client went away: don't keep burning LLM calls for it
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
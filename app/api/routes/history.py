@@ -2,6 +2,8 @@
 from fastapi import APIRouter, Query, HTTPException
 from app.models.schemas import ChatHistoryResponse, Thread, Message
 from app.services.memory.thread_manager import ThreadManager
+from app.services.memory.message_writer import message_writer
+from app.core.exceptions import ChatbotException, ThreadNotFoundException
 from app.core.logging import logger
 from typing import Optional
 
@@ -11,13 +13,17 @@ router = APIRouter()
 @router.get("/chat_history", response_model=ChatHistoryResponse)
 async def get_chat_history(
     user_id: str = Query(..., description="User identifier"),
-    thread_id: Optional[str] = Query(None, description="Optional thread identifier")
+    thread_id: Optional[str] = Query(None, description="Optional thread identifier"),
+    limit: Optional[int] = Query(None, ge=1, description="Page size (defaults to CHAT_HISTORY_PAGE_SIZE)"),
+    before: Optional[str] = Query(None, description="Cursor: return the page older than this"),
+    after: Optional[str] = Query(None, description="Cursor: return the page newer than this")
 ):
     """
-    Get chat history for a user.
+    Get chat history for a user, one page at a time.
     
-    If thread_id is provided, returns messages for that thread.
-    Otherwise, returns all threads for the user.
+    If thread_id is provided, returns that thread's messages (the latest
+    page by default, in chronological order). Otherwise, returns the
+    user's threads, most recently updated first.
     """
     try:
         logger.info(f"Fetching chat history for user {user_id}, thread {thread_id}")
@@ -25,9 +31,15 @@ async def get_chat_history(
         thread_manager = ThreadManager()
         
         if thread_id:
-            # Get messages for specific thread
-            messages = await thread_manager.get_thread_messages(thread_id)
-            thread = await thread_manager.get_thread(thread_id)
+            # Unknown threads are a 404, whatever the cursor
+            try:
+                thread = await thread_manager.get_thread(thread_id)
+            except ValueError:
+                raise ThreadNotFoundException(thread_id)
+            
+            # Get messages for specific thread (after any queued writes land)
+            await message_writer.flush()
+            page = await thread_manager.get_thread_messages_page(thread_id, limit=limit, before=before, after=after)
             
             return ChatHistoryResponse(
                 threads=[Thread(
@@ -43,12 +55,14 @@ async def get_chat_history(
                         content=msg.content,
                         created_at=msg.created_at
                     )
-                    for msg in messages
-                ]
+                    for msg in page.items
+                ],
+                older_cursor=page.older_cursor,
+                newer_cursor=page.newer_cursor
             )
         else:
-            # Get all threads for user
-            threads = await thread_manager.get_user_threads(user_id)
+            # Get a page of the user's threads
+            page = await thread_manager.get_user_threads_page(user_id, limit=limit, before=before, after=after)
             
             return ChatHistoryResponse(
                 threads=[
@@ -59,12 +73,15 @@ async def get_chat_history(
                         created_at=t.created_at,
                         updated_at=t.updated_at
                     )
-                    for t in threads
+                    for t in page.items
                 ],
-                messages=[]
+                messages=[],
+                older_cursor=page.older_cursor,
+                newer_cursor=page.newer_cursor
             )
             
+    except ChatbotException:
+        raise
     except Exception as e:
         logger.error(f"Error in chat_history endpoint: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-
@@ -1,6 +1,6 @@
 """Configuration management using Pydantic Settings"""
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Optional, Dict, Any, List
 import os
 
 
@@ -18,11 +18,35 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str = "chatbot_pass"
     POSTGRES_DB: str = "chatbot_db"
     
+    # PostgreSQL connection pool (per worker process)
+    DB_POOL_MIN_SIZE: int = 5
+    DB_POOL_MAX_SIZE: int = 20
+    DB_MAX_CONNECTIONS: Optional[int] = None  # server-wide budget; if set, split across WEB_CONCURRENCY workers
+    WEB_CONCURRENCY: int = 1  # worker processes sharing the database
+    DB_POOL_ACQUIRE_TIMEOUT: float = 10.0  # seconds to wait for a free connection (503 after that)
+    DB_COMMAND_TIMEOUT: float = 60.0  # seconds per statement
+    DB_STATEMENT_CACHE_SIZE: int = 1024  # prepared statements per connection (0 behind PgBouncer transaction pooling)
+    DB_MAX_CACHED_STATEMENT_LIFETIME: int = 300  # seconds before a cached statement is re-prepared
+    DB_MAX_INACTIVE_CONNECTION_LIFETIME: float = 300.0  # seconds before an idle connection is closed
+    DB_MAX_QUERIES: int = 50000  # queries before a connection is replaced
+    DB_POOL_WARMUP: bool = True  # prepare the hot statements on every new connection
+    
+    # PostgreSQL read replicas (JSON list of URLs); reads are spread across them
+    DATABASE_REPLICA_URLS: List[str] = []
+    DB_REPLICA_STICKY_SECONDS: float = 5.0  # reads of a just-written thread stay on the primary (> replica lag)
+    
     # SQLite Configuration (for Dev mode)
     SQLITE_DB_PATH: str = "chatbot.db"
+    SQLITE_READER_CONNECTIONS: int = 4  # pooled read-only connections (plus one writer)
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # wait this long on a locked database before failing
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # NORMAL is durable across app crashes in WAL mode
+    SQLITE_CACHE_SIZE_KB: int = 16384  # page cache per connection
+    SQLITE_MMAP_SIZE: int = 268435456  # bytes of the database file to memory-map
     
     # Cache Configuration
     CACHE_TYPE: str = "memory"  # "memory" or "redis"
+    CACHE_MEMORY_MAX_ENTRIES: int = 10000  # bound for the in-memory backend
+    CACHE_MEMORY_EVICT_TO: float = 0.9  # once full, evict LRU entries down to this fraction of the bound
     
     # Redis Configuration (for Docker mode)
     REDIS_HOST: str = "localhost"
@@ -30,9 +54,127 @@ class Settings(BaseSettings):
     REDIS_DB: int = 0
     REDIS_PASSWORD: Optional[str] = None
     
+    # Thread lookups
+    THREAD_CACHE_TTL: int = 300  # seconds; thread metadata and (user, persona) -> thread index
+    THREAD_CACHE_NEGATIVE_TTL: int = 30  # seconds to remember unknown thread IDs
+    
+    # Known-user fast path (skips user provisioning for users already seen)
+    KNOWN_USERS_MAX_ENTRIES: int = 100000  # in-process set, least recently seen evicted
+    USER_BLOOM_FILTER_ENABLED: bool = False  # share known users across workers via Redis
+    USER_BLOOM_FILTER_BITS: int = 16777216  # 2 MiB bitmap (~1% false positives at 1.7M users)
+    USER_BLOOM_FILTER_HASHES: int = 7
+    
+    # Per-thread request serialization
+    THREAD_LOCK_POLICY: str = "queue"  # "queue" (wait for the lock) or "reject" (409 if busy)
+    THREAD_LOCK_WAIT_TIMEOUT: float = 30.0  # max seconds to wait in "queue" mode
+    THREAD_LOCK_MAX_WAITERS: int = 8  # queued requests per thread before rejecting
+    THREAD_LOCK_TTL: float = 120.0  # seconds before an unrenewed Redis lock expires (renewed every TTL/3 while held)
+    
     # Anthropic API
     ANTHROPIC_API_KEY: str
     
+    # LLM Client Configuration
+    LLM_PROVIDER: str = "anthropic"  # "anthropic" or "fake" (local stand-in for load testing)
+    LLM_MODEL: str = "claude-sonnet-4-5-20250929"
+    LLM_TEMPERATURE: float = 0.7
+    LLM_REQUEST_TIMEOUT: float = 60.0  # seconds
+    LLM_MAX_CONNECTIONS: int = 100  # shared HTTP pool size across all LLM clients
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_KEEPALIVE_EXPIRY: float = 30.0  # seconds
+    LLM_WARMUP: bool = True  # open a connection to the API at startup
+    LLM_MAX_CONCURRENCY: int = 16  # in-flight LLM calls per process
+    LLM_QUEUE_TIMEOUT: float = 30.0  # max seconds a call waits for a slot
+    LLM_MAX_RETRIES: int = 3  # retries for 429/529/transient errors
+    LLM_RETRY_BASE_DELAY: float = 0.5  # seconds, doubled per attempt (with full jitter)
+    LLM_RETRY_MAX_DELAY: float = 20.0  # seconds; longer retry-after hints fail fast
+    
+    # LLM resilience (per-persona overrides via LLM_RESILIENCE_OVERRIDES, e.g.
+    # '{"investor": {"hedging_enabled": true, "call_timeout": 20}}')
+    LLM_CALL_TIMEOUT: float = 45.0  # seconds per attempt, counted as a breaker failure
+    CIRCUIT_BREAKER_ENABLED: bool = True
+    CIRCUIT_FAILURE_THRESHOLD: int = 5  # consecutive failures before opening
+    CIRCUIT_RECOVERY_SECONDS: float = 30.0  # open time before a half-open probe
+    CIRCUIT_HALF_OPEN_MAX_CALLS: int = 1  # concurrent probes while half-open
+    HEDGING_ENABLED: bool = False  # fire a backup request when the first is slow
+    HEDGE_PERCENTILE: float = 0.95  # latency percentile used as the hedge delay
+    HEDGE_MIN_DELAY: float = 1.0  # seconds; floor for the hedge delay
+    HEDGE_MIN_SAMPLES: int = 20  # latency samples needed before hedging starts
+    LLM_RESILIENCE_OVERRIDES: Dict[str, Dict[str, Any]] = {}
+    PROMPT_CACHING_ENABLED: bool = False  # mark system prompt and history prefix as cacheable
+    
+    # Fake LLM backend (LLM_PROVIDER=fake); distributions: fixed, normal, lognormal, exponential
+    FAKE_LLM_SEED: int = 0
+    FAKE_LLM_TTFT_MS: float = 300.0  # mean time to first token
+    FAKE_LLM_TTFT_STDDEV_MS: float = 100.0
+    FAKE_LLM_TTFT_DISTRIBUTION: str = "lognormal"
+    FAKE_LLM_TOKENS_PER_SEC: float = 60.0
+    FAKE_LLM_OUTPUT_TOKENS: float = 80.0  # mean reply length in tokens
+    FAKE_LLM_OUTPUT_TOKENS_STDDEV: float = 30.0
+    FAKE_LLM_OUTPUT_DISTRIBUTION: str = "normal"
+    FAKE_LLM_ERROR_RATE: float = 0.0  # fraction of calls that fail
+    FAKE_LLM_ERROR_STATUS: int = 529  # status code carried by injected errors
+    
+    # Response Cache (serves repeated turns without calling the LLM)
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_TTL: int = 3600  # seconds
+    RESPONSE_CACHE_MAX_HISTORY: int = 2  # only cache turns with at most this many prior messages
+    RESPONSE_CACHE_NEAR_DUPLICATE: bool = False  # also match paraphrases via MinHash similarity
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD: float = 0.8
+    RESPONSE_CACHE_INDEX_SIZE: int = 256  # near-duplicate candidates kept per (persona, history)
+    
+    # Conversation History Compaction
+    HISTORY_COMPACTION_ENABLED: bool = True
+    HISTORY_MAX_TURNS: int = 12  # compact once more turns than this are unsummarized
+    HISTORY_KEEP_TURNS: int = 6  # turns kept verbatim after compaction
+    HISTORY_TOKEN_BUDGET: int = 6000  # estimated tokens allowed for verbatim history
+    
+    # Chat history pagination (GET /api/chat_history)
+    CHAT_HISTORY_PAGE_SIZE: int = 50  # messages or threads per page by default
+    CHAT_HISTORY_MAX_PAGE_SIZE: int = 500
+    
+    # Write-behind message persistence and group commit of chat turns
+    MESSAGE_WRITE_BEHIND_ENABLED: bool = True  # False = each turn commits on its own, inline
+    # "enqueue": messages are acked once queued and flushed in the background
+    # (checkpoints still commit before the response); "flush": messages commit
+    # with the turn's checkpoints, grouped with concurrent turns
+    MESSAGE_WRITE_ACK: str = "enqueue"
+    MESSAGE_FLUSH_MAX_BATCH: int = 100  # rows/statements per flush transaction
+    MESSAGE_FLUSH_INTERVAL_MS: int = 50  # max time a queued message waits for a flush
+    MESSAGE_QUEUE_MAX_SIZE: int = 10000  # queued items before enqueue applies backpressure
+    MESSAGE_FLUSH_MAX_ATTEMPTS: int = 3  # tries per flush on transient errors (lost connection, locked database)
+    
+    # Checkpoint retention (only the latest checkpoint of a thread is ever loaded).
+    # A checkpoint is deleted once it is neither among its thread's latest
+    # CHECKPOINT_KEEP_LATEST nor younger than CHECKPOINT_MAX_AGE_HOURS
+    # (nor the base or an earlier delta a kept delta checkpoint replays from)
+    CHECKPOINT_KEEP_LATEST: int = 5  # per thread; at least 1
+    CHECKPOINT_MAX_AGE_HOURS: float = 24.0  # 0 = count-based only
+    CHECKPOINT_GC_ENABLED: bool = True  # run retention periodically in-process
+    CHECKPOINT_GC_INTERVAL_SECONDS: float = 3600.0
+    CHECKPOINT_GC_BATCH_SIZE: int = 500  # rows per DELETE (one short transaction each)
+    CHECKPOINT_GC_BATCH_PAUSE_MS: int = 50  # pause between deleting batches (rate limit)
+    CHECKPOINT_GC_THREADS_PER_SCAN: int = 1000  # thread ID range examined per step
+    
+    # Checkpoint storage. "delta" writes a full base snapshot every
+    # CHECKPOINT_DELTA_MAX_CHAIN checkpoints and, in between, only what changed
+    # since the parent (new messages, changed channels); loading replays the
+    # deltas since the last base. Rows of every mode and format stay readable
+    CHECKPOINT_STORAGE_MODE: str = "full"  # "full" or "delta"
+    CHECKPOINT_DELTA_MAX_CHAIN: int = 20  # checkpoints per base snapshot (bounds replay length)
+    CHECKPOINT_DELTA_CACHE_THREADS: int = 1000  # threads whose last state is kept decoded in memory (delta parent, load cache)
+    # "binary" is faithful (messages load back as message objects) and, with
+    # zlib, ~4x smaller than JSON, but decoding revives every message: ~3ms at
+    # 50 turns, ~16ms at 200 (scripts/bench_checkpoints.py) vs well under 1ms
+    # for JSON. Loads of the checkpoint this process wrote last skip the decode
+    CHECKPOINT_FORMAT: str = "binary"  # "binary" or "json" (lossy; readable by older releases)
+    CHECKPOINT_COMPRESSION: str = "zlib"  # "none", "zlib" or "zstd" (needs the zstandard package)
+    CHECKPOINT_COMPRESSION_LEVEL: Optional[int] = None  # unset = fast (zlib 1, zstd 3)
+    CHECKPOINT_COMPRESSION_MIN_BYTES: int = 1024  # smaller payloads are stored uncompressed
+    
+    # Batch Chat
+    BATCH_MAX_CONCURRENCY: int = 8  # items processed concurrently per batch request
+    BATCH_MAX_ITEMS: int = 1000
+    
     # Application Settings
     LOG_LEVEL: str = "INFO"
     DEBUG: bool = False
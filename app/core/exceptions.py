@@ -19,18 +19,53 @@ class DatabaseException(ChatbotException):
         super().__init__(message, status_code=500)
 
 
+class PoolTimeoutException(DatabaseException):
+    """No pooled database connection became free in time"""
+    def __init__(self, timeout: float):
+        super().__init__(f"Database busy: no connection available within {timeout:g}s")
+        self.status_code = 503
+
+
+class MigrationException(DatabaseException):
+    """A schema migration could not be applied"""
+    pass
+
+
 class LLMException(ChatbotException):
     """LLM API-related exceptions"""
     def __init__(self, message: str):
         super().__init__(message, status_code=503)
 
 
+class LLMCapacityException(LLMException):
+    """Rejected locally (admission queue full or timed out); says nothing about the provider"""
+    llm_retryable = False
+
+
+class CircuitOpenException(LLMException):
+    """LLM calls for a persona are short-circuited while its breaker is open"""
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"LLM temporarily unavailable for {name}, retry in {retry_in:.0f}s")
+
+
 class ThreadNotFoundException(ChatbotException):
     """Thread not found exception"""
     def __init__(self, thread_id: str):
         super().__init__(f"Thread {thread_id} not found", status_code=404)
 
 
+class ThreadBusyException(ChatbotException):
+    """Another request is already being processed on this thread"""
+    def __init__(self, thread_id: str):
+        super().__init__(f"Thread {thread_id} is busy processing another message", status_code=409)
+
+
+class InvalidCursorException(ChatbotException):
+    """A pagination cursor could not be decoded"""
+    def __init__(self, message: str = "Invalid pagination cursor"):
+        super().__init__(message, status_code=400)
+
+
 async def chatbot_exception_handler(request: Request, exc: ChatbotException) -> JSONResponse:
     """Handle custom chatbot exceptions"""
     return JSONResponse(
@@ -0,0 +1,114 @@
+"""In-process metrics registry (counters, gauges and latency histograms)"""
+from collections import deque
+from threading import Lock
+from typing import Dict, Deque, Optional, Any
+
+
+def _key(name: str, labels: Dict[str, Any]) -> str:
+    """Build a metric key such as `llm.requests{persona=mentor}`"""
+    if not labels:
+        return name
+    rendered = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+class _Histogram:
+    """Running count/sum plus a bounded window of recent samples for percentiles"""
+    
+    def __init__(self, window: int):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: Deque[float] = deque(maxlen=window)
+    
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+    
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[index]
+    
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "avg": round(self.total / self.count, 6) if self.count else 0.0,
+            "max": round(self.max, 6),
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """Process-local metrics, exposed through GET /metrics"""
+    
+    def __init__(self, window: int = 1024):
+        self._window = window
+        self._lock = Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._histograms: Dict[str, _Histogram] = {}
+    
+    def increment(self, name: str, value: float = 1, **labels):
+        """Increase a counter"""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def set_gauge(self, name: str, value: float, **labels):
+        """Set a gauge to its current value"""
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+    
+    def observe(self, name: str, value: float, **labels):
+        """Record a sample (e.g. a latency in seconds)"""
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self._window)
+            histogram.observe(value)
+    
+    def percentile(self, name: str, q: float, **labels) -> Optional[float]:
+        """Get a percentile over the recent samples of a histogram"""
+        with self._lock:
+            histogram = self._histograms.get(_key(name, labels))
+            return histogram.percentile(q) if histogram else None
+    
+    def sample_count(self, name: str, **labels) -> int:
+        """Get the number of recent samples held for a histogram"""
+        with self._lock:
+            histogram = self._histograms.get(_key(name, labels))
+            return len(histogram.samples) if histogram else 0
+    
+    def counter(self, name: str, **labels) -> float:
+        """Get the current value of a counter"""
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Get all metrics as a JSON-serializable dict"""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "histograms": {k: h.summary() for k, h in self._histograms.items()},
+            }
+    
+    def reset(self):
+        """Clear all metrics"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+# Global metrics instance
+metrics = MetricsRegistry()
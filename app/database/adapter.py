@@ -1,12 +1,49 @@
 """Database adapter supporting both SQLite and PostgreSQL"""
 import aiosqlite
 import asyncpg
-import re
+import asyncio
+import math
+import time
 from uuid import UUID
-from typing import Union, Optional, Any
-from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Union, Optional, Any, Awaitable, Callable, Iterable, List, Sequence, Tuple
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from app.database.queries import Statement, HOT_STATEMENTS, to_sqlite
 from app.core.config import settings
+from app.core.exceptions import PoolTimeoutException
+from app.core.metrics import metrics
 from app.core.logging import logger
+from app.services.cache.adapter import cache_adapter
+
+
+@lru_cache(maxsize=256)
+def _compile_adhoc(query: str, db_type: str) -> Tuple[str, bool]:
+    """Translate and classify SQL that isn't a registered Statement (once per distinct string)"""
+    is_write = query.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE"))
+    return (query if db_type == "postgresql" else to_sqlite(query)), is_write
+
+
+# Read-your-writes state for replica routing: the thread the current code is
+# working on (DatabaseAdapter.thread_scope), whether it has written yet, and
+# whether its reads must see the primary (DatabaseAdapter.primary_reads)
+_scope_thread: ContextVar[Optional[str]] = ContextVar("db_scope_thread", default=None)
+_wrote_in_context: ContextVar[bool] = ContextVar("db_wrote_in_context", default=False)
+_primary_only: ContextVar[bool] = ContextVar("db_primary_only", default=False)
+
+# Cache key marking a thread as recently written (shared by all workers)
+_STICKY_KEY = "db:sticky:{}"
+
+
+def _sqlite_value(value: Any) -> Any:
+    """Convert a query argument to what SQLite stores for it"""
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        # Same layout as CURRENT_TIMESTAMP, so string ordering stays chronological
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+    return value
 
 
 class DatabaseAdapter:
@@ -15,51 +52,157 @@ class DatabaseAdapter:
     def __init__(self):
         self._pool: Optional[Union[asyncpg.Pool, Any]] = None
         self.db_type = settings.DATABASE_TYPE
+        # SQLite "pool": one writer (SQLite allows a single writer at a time)
+        # plus a set of reader connections, all opened once and reused
+        self._sqlite_writer: Optional[aiosqlite.Connection] = None
+        self._sqlite_write_lock = asyncio.Lock()
+        self._sqlite_readers: Optional[asyncio.Queue] = None
+        self._sqlite_reader_connections: List[aiosqlite.Connection] = []
+        # PostgreSQL read replicas (DATABASE_REPLICA_URLS), used round-robin
+        self._replica_pools: List[asyncpg.Pool] = []
+        self._next_replica = 0
     
     async def create_pool(self):
         """Create database connection pool"""
         if self.db_type == "postgresql":
             try:
-                # Extract connection string from DATABASE_URL
-                db_url = settings.DATABASE_URL.replace("postgresql://", "").replace("postgresql+asyncpg://", "")
-                parts = db_url.split("@")
-                if len(parts) == 2:
-                    auth, host_db = parts
-                    user, password = auth.split(":")
-                    host, port_db = host_db.split("/")
-                    host, port = host.split(":")
-                    db_name = port_db
-                else:
-                    # Fallback to individual settings
-                    user = settings.POSTGRES_USER
-                    password = settings.POSTGRES_PASSWORD
-                    host = settings.POSTGRES_HOST
-                    port = settings.POSTGRES_PORT
-                    db_name = settings.POSTGRES_DB
-                
-                self._pool = await asyncpg.create_pool(
-                    host=host,
-                    port=int(port),
-                    user=user,
-                    password=password,
-                    database=db_name,
-                    min_size=5,
-                    max_size=20,
-                    command_timeout=60
+                self._pool = await self._create_pg_pool(settings.DATABASE_URL)
+                logger.info(
+                    f"PostgreSQL connection pool created "
+                    f"(min {self._pool.get_min_size()}, max {self._pool.get_max_size()})"
                 )
-                logger.info("PostgreSQL connection pool created")
+                self.pool_stats()
             except Exception as e:
                 logger.error(f"Failed to create PostgreSQL pool: {str(e)}")
                 raise
+            for url in settings.DATABASE_REPLICA_URLS:
+                try:
+                    self._replica_pools.append(await self._create_pg_pool(url))
+                except Exception as e:
+                    # Reads fall back to the primary; a missing replica isn't fatal
+                    logger.warning(f"Failed to create read replica pool: {str(e)}")
+            if self._replica_pools:
+                logger.info(f"Routing reads to {len(self._replica_pools)} read replica(s)")
         else:  # SQLite
-            # SQLite doesn't use a pool, but we'll create the connection file
             db_path = settings.SQLITE_DB_PATH
             import os
             os.makedirs(os.path.dirname(db_path) if os.path.dirname(db_path) else ".", exist_ok=True)
-            # Test connection
-            async with aiosqlite.connect(db_path) as conn:
-                await conn.execute("SELECT 1")
-            logger.info(f"SQLite database initialized at {db_path}")
+            try:
+                self._sqlite_writer = await self._open_sqlite_connection()
+                # WAL lets readers run concurrently with the writer; it is persistent per database file
+                await self._pragma(self._sqlite_writer, "PRAGMA journal_mode = WAL")
+                self._sqlite_readers = asyncio.Queue()
+                for _ in range(settings.SQLITE_READER_CONNECTIONS):
+                    reader = await self._open_sqlite_connection(readonly=True)
+                    self._sqlite_reader_connections.append(reader)
+                    self._sqlite_readers.put_nowait(reader)
+            except Exception as e:
+                logger.error(f"Failed to open SQLite connections: {str(e)}")
+                await self.close_pool()
+                raise
+            logger.info(
+                f"SQLite database initialized at {db_path} "
+                f"(1 writer, {settings.SQLITE_READER_CONNECTIONS} readers, WAL)"
+            )
+    
+    async def _create_pg_pool(self, url: Optional[str]) -> asyncpg.Pool:
+        """Open an asyncpg pool with the DB_* pool settings"""
+        return await asyncpg.create_pool(
+            **self._connect_kwargs(url),
+            min_size=min(settings.DB_POOL_MIN_SIZE, self._pool_max_size()),
+            max_size=self._pool_max_size(),
+            command_timeout=settings.DB_COMMAND_TIMEOUT,
+            statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+            max_cached_statement_lifetime=settings.DB_MAX_CACHED_STATEMENT_LIFETIME,
+            max_inactive_connection_lifetime=settings.DB_MAX_INACTIVE_CONNECTION_LIFETIME,
+            max_queries=settings.DB_MAX_QUERIES,
+            # Timestamps are naive UTC: NOW() must agree with app-supplied values
+            # (checkpoint and message created_at) whatever the server's zone
+            server_settings={"timezone": "UTC"},
+            init=self._init_connection if settings.DB_POOL_WARMUP else None
+        )
+    
+    @staticmethod
+    def _connect_kwargs(url: Optional[str]) -> dict:
+        """asyncpg connection arguments from a database URL (or the POSTGRES_* settings)"""
+        dsn = (url or "").replace("postgresql+asyncpg://", "postgresql://")
+        if dsn.startswith(("postgresql://", "postgres://")):
+            return {"dsn": dsn}
+        return {
+            "host": settings.POSTGRES_HOST,
+            "port": int(settings.POSTGRES_PORT),
+            "user": settings.POSTGRES_USER,
+            "password": settings.POSTGRES_PASSWORD,
+            "database": settings.POSTGRES_DB
+        }
+    
+    @staticmethod
+    def _pool_max_size() -> int:
+        """Connections this worker may open: its share of DB_MAX_CONNECTIONS, if set"""
+        if settings.DB_MAX_CONNECTIONS:
+            share = settings.DB_MAX_CONNECTIONS // max(1, settings.WEB_CONCURRENCY)
+            return max(1, min(settings.DB_POOL_MAX_SIZE, share))
+        return settings.DB_POOL_MAX_SIZE
+    
+    @staticmethod
+    async def _init_connection(connection):
+        """Prepare the hot statements on a new pooled connection (DB_POOL_WARMUP)"""
+        for statement in HOT_STATEMENTS:
+            try:
+                # Prepare into the connection's statement cache, which is what
+                # fetch()/execute() consult; the public prepare() bypasses it
+                await connection._prepare(statement.postgresql, use_cache=True)
+            except Exception as e:
+                # e.g. the schema doesn't exist yet on first startup
+                logger.debug(f"Skipping warm-up of {statement.name}: {str(e)}")
+    
+    def pool_stats(self) -> dict:
+        """Current pool occupancy, also published as db.pool.* gauges"""
+        if self.db_type == "postgresql":
+            if not self._pool:
+                return {}
+            size, idle = self._pool.get_size(), self._pool.get_idle_size()
+            stats = {"size": size, "idle": idle, "acquired": size - idle, "max_size": self._pool.get_max_size()}
+        else:
+            if self._sqlite_readers is None:
+                return {}
+            idle = self._sqlite_readers.qsize()
+            writer_busy = int(self._sqlite_write_lock.locked())
+            stats = {
+                "size": len(self._sqlite_reader_connections) + 1,
+                "idle": idle + 1 - writer_busy,
+                "acquired": len(self._sqlite_reader_connections) - idle + writer_busy,
+                "max_size": len(self._sqlite_reader_connections) + 1
+            }
+        for name, value in stats.items():
+            metrics.set_gauge(f"db.pool.{name}", value)
+        return stats
+    
+    @staticmethod
+    async def _pragma(connection: aiosqlite.Connection, statement: str):
+        """Run a PRAGMA and drain its result (an unfinished statement keeps its lock)"""
+        async with connection.execute(statement) as cursor:
+            await cursor.fetchall()
+    
+    async def _open_sqlite_connection(self, readonly: bool = False) -> aiosqlite.Connection:
+        """Open a SQLite connection with the tuned per-connection pragmas"""
+        connection = await aiosqlite.connect(settings.SQLITE_DB_PATH)
+        try:
+            for statement in (
+                "PRAGMA foreign_keys = ON",
+                f"PRAGMA busy_timeout = {int(settings.SQLITE_BUSY_TIMEOUT_MS)}",
+                f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}",
+                f"PRAGMA cache_size = -{int(settings.SQLITE_CACHE_SIZE_KB)}",
+                f"PRAGMA mmap_size = {int(settings.SQLITE_MMAP_SIZE)}",
+                "PRAGMA temp_store = MEMORY",
+            ):
+                await self._pragma(connection, statement)
+            if readonly:
+                await self._pragma(connection, "PRAGMA query_only = ON")
+        except Exception:
+            await connection.close()
+            raise
+        return connection
     
     async def close_pool(self):
         """Close database connection pool"""
@@ -67,6 +210,18 @@ class DatabaseAdapter:
             await self._pool.close()
             logger.info("PostgreSQL connection pool closed")
         self._pool = None
+        for replica in self._replica_pools:
+            await replica.close()
+        self._replica_pools = []
+        if self._sqlite_writer is not None:
+            async with self._sqlite_write_lock:
+                await self._sqlite_writer.close()
+                self._sqlite_writer = None
+            logger.info("SQLite connections closed")
+        for reader in self._sqlite_reader_connections:
+            await reader.close()
+        self._sqlite_readers = None
+        self._sqlite_reader_connections = []
     
     @asynccontextmanager
     async def get_connection(self):
@@ -74,86 +229,366 @@ class DatabaseAdapter:
         if self.db_type == "postgresql":
             if not self._pool:
                 raise RuntimeError("Database pool not initialized. Call create_pool() first.")
-            async with self._pool.acquire() as connection:
+            started = time.monotonic()
+            try:
+                connection = await self._pool.acquire(timeout=settings.DB_POOL_ACQUIRE_TIMEOUT)
+            except asyncio.TimeoutError:
+                metrics.increment("db.pool.acquire_timeouts")
+                logger.warning(f"Timed out waiting for a database connection ({self.pool_stats()})")
+                raise PoolTimeoutException(settings.DB_POOL_ACQUIRE_TIMEOUT)
+            metrics.observe("db.pool.acquire_wait_seconds", time.monotonic() - started)
+            self.pool_stats()
+            try:
                 yield connection
+            finally:
+                await self._pool.release(connection)
+                self.pool_stats()
         else:  # SQLite
-            # Enable WAL mode for better concurrency
-            async with aiosqlite.connect(settings.SQLITE_DB_PATH) as connection:
-                await connection.execute("PRAGMA foreign_keys = ON")
+            # A dedicated connection for callers that hold it across their own
+            # statements (schema setup, scripts); queries run through the
+            # adapter use the pooled connections below
+            connection = await self._open_sqlite_connection()
+            try:
                 yield connection
+            finally:
+                await connection.close()
     
-    def _convert_query_for_sqlite(self, query: str) -> str:
-        """Convert PostgreSQL query to SQLite-compatible query"""
-        sqlite_query = query
-        
-        # Convert PostgreSQL functions to SQLite equivalents
-        sqlite_query = sqlite_query.replace("NOW()", "CURRENT_TIMESTAMP")
-        sqlite_query = sqlite_query.replace("::jsonb", "")  # SQLite doesn't have jsonb type, just TEXT
-        
-        # Convert parameter placeholders ($1, $2, etc. to ?)
-        param_matches = list(re.finditer(r'\$(\d+)', sqlite_query))
-        if param_matches:
-            for match in reversed(param_matches):
-                sqlite_query = sqlite_query[:match.start()] + "?" + sqlite_query[match.end():]
+    @asynccontextmanager
+    async def _connection(self, readonly: bool = False):
+        """Connection for the adapter's own queries"""
+        if self.db_type == "postgresql":
+            if readonly and await self._use_replica():
+                connection = self._replica_connection()
+            else:
+                connection = self.get_connection()
+        else:
+            connection = self._sqlite_connection(readonly)
+        async with connection as conn:
+            yield conn
+    
+    @contextmanager
+    def thread_scope(self, thread_id: Any):
+        """
+        Tie the queries in this block to a thread for read-your-writes: once
+        the thread has been written, its reads stay on the primary for
+        DB_REPLICA_STICKY_SECONDS. The marker lives in the cache, so with
+        Redis every worker sees it.
+        """
+        token = _scope_thread.set(str(thread_id))
+        try:
+            yield
+        finally:
+            _scope_thread.reset(token)
+    
+    @contextmanager
+    def primary_reads(self):
+        """Serve every read in this block from the primary (state a write builds on)"""
+        token = _primary_only.set(True)
+        try:
+            yield
+        finally:
+            _primary_only.reset(token)
+    
+    async def mark_written(self, thread_id: Any = None):
+        """
+        Record a write: later reads in the same request, and reads of the
+        thread (given, or from thread_scope) for a while, go to the primary.
+        """
+        _wrote_in_context.set(True)
+        thread = str(thread_id) if thread_id is not None else _scope_thread.get()
+        if thread is None or not self._replica_pools:
+            return
+        ttl = max(1, math.ceil(settings.DB_REPLICA_STICKY_SECONDS))
+        await cache_adapter.set(_STICKY_KEY.format(thread), 1, ttl=ttl)
+    
+    async def _use_replica(self) -> bool:
+        """Whether a read in the current context may be served by a replica"""
+        if not self._replica_pools or _wrote_in_context.get() or _primary_only.get():
+            return False
+        thread = _scope_thread.get()
+        if thread is not None and await cache_adapter.get(_STICKY_KEY.format(thread)):
+            metrics.increment("db.replica.sticky_reads")
+            return False
+        return True
+    
+    @asynccontextmanager
+    async def _replica_connection(self):
+        """Borrow a connection from the next replica, falling back to the primary"""
+        pool = self._replica_pools[self._next_replica % len(self._replica_pools)]
+        self._next_replica += 1
+        try:
+            connection = await pool.acquire(timeout=settings.DB_POOL_ACQUIRE_TIMEOUT)
+        except (asyncio.TimeoutError, OSError, asyncpg.PostgresError) as e:
+            metrics.increment("db.replica.fallbacks")
+            logger.warning(f"Read replica unavailable, reading from primary: {str(e)}")
+            async with self.get_connection() as connection:
+                yield connection
+            return
+        metrics.increment("db.replica.reads")
+        try:
+            yield connection
+        finally:
+            await pool.release(connection)
+    
+    @asynccontextmanager
+    async def _sqlite_connection(self, readonly: bool = False):
+        """Borrow a pooled SQLite connection: a reader, or the (exclusive) writer"""
+        if self._sqlite_writer is None:
+            # Pool not created (e.g. one-off scripts)
+            async with self.get_connection() as connection:
+                yield connection
+        elif readonly:
+            started = time.monotonic()
+            connection = await self._sqlite_readers.get()
+            metrics.observe("db.pool.acquire_wait_seconds", time.monotonic() - started)
+            try:
+                yield connection
+            finally:
+                self._sqlite_readers.put_nowait(connection)
+        else:
+            started = time.monotonic()
+            async with self._sqlite_write_lock:
+                metrics.observe("db.pool.acquire_wait_seconds", time.monotonic() - started)
+                try:
+                    yield self._sqlite_writer
+                finally:
+                    if self._sqlite_writer.in_transaction:
+                        # Never hand the shared writer to the next caller mid-transaction
+                        await self._sqlite_writer.rollback()
+    
+    def _prepare(self, query: Union[Statement, str], args: Sequence[Any]) -> Tuple[str, Sequence[Any], bool]:
+        """Resolve the dialect SQL, driver args and read/write kind for a query"""
+        if isinstance(query, Statement):
+            sql, is_write = query.sql_for(self.db_type), query.is_write
+        else:
+            sql, is_write = _compile_adhoc(query, self.db_type)
+        if self.db_type != "postgresql":
+            args = [_sqlite_value(arg) for arg in args]
+        return sql, args, is_write
+    
+    async def _execute_on(self, conn, sql: str, args: Sequence[Any], mode: str):
+        """Run prepared SQL on a connection; mode is "one", "many" or "command" (no commit)"""
+        if self.db_type == "postgresql":
+            if mode == "one":
+                return await conn.fetchrow(sql, *args)
+            if mode == "many":
+                return await conn.fetch(sql, *args)
+            return await conn.execute(sql, *args)
         
-        return sqlite_query
+        cursor = await conn.execute(sql, args)
+        # FIX: Fetch BEFORE commit to handle RETURNING
+        if mode == "one":
+            row = await cursor.fetchone()
+            if not row:
+                return None
+            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+            return dict(zip(columns, row))
+        rows = await cursor.fetchall()
+        if mode == "many":
+            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+            return [dict(zip(columns, row)) for row in rows]
+        return cursor.rowcount if hasattr(cursor, 'rowcount') else 0
+    
+    async def _execute_many_on(self, conn, query: Union[Statement, str], args_list: Iterable[Sequence[Any]]):
+        """Run one statement for every argument tuple on a connection (no commit)"""
+        sql, _, _ = self._prepare(query, ())
+        if self.db_type == "postgresql":
+            await conn.executemany(sql, args_list)
+        else:
+            await conn.executemany(sql, [[_sqlite_value(arg) for arg in args] for args in args_list])
     
-    async def execute_query(self, query: str, *args):
+    async def _copy_on(self, conn, table: str, columns: Sequence[str], records: Iterable[Sequence[Any]]) -> int:
+        """Bulk-load rows on a connection: COPY on PostgreSQL, executemany on SQLite (no commit)"""
+        if self.db_type == "postgresql":
+            status = await conn.copy_records_to_table(table, records=records, columns=list(columns))
+            # Status tag is "COPY <n>"
+            return int(status.split()[-1])
+        rows = [[_sqlite_value(value) for value in record] for record in records]
+        placeholders = ", ".join("?" for _ in columns)
+        await conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+        return len(rows)
+    
+    async def _execute(self, query: Union[Statement, str], args: Sequence[Any], mode: str):
+        """Run one statement on its own connection, committing SQLite writes"""
+        sql, args, is_write = self._prepare(query, args)
+        if mode == "command":
+            is_write = True
+        async with self._connection(readonly=not is_write) as conn:
+            result = await self._execute_on(conn, sql, args, mode)
+            if is_write and self.db_type != "postgresql":
+                await conn.commit()
+        if is_write:
+            await self.mark_written()
+        return result
+    
+    async def execute_query(self, query: Union[Statement, str], *args):
         """Execute a SELECT query"""
-        async with self.get_connection() as conn:
-            if self.db_type == "postgresql":
-                return await conn.fetch(query, *args)
-            else:  # SQLite
-                sqlite_query = self._convert_query_for_sqlite(query)
-                sqlite_args = [str(arg) if isinstance(arg, UUID) else arg for arg in args]
-                cursor = await conn.execute(sqlite_query, sqlite_args)
-                rows = await cursor.fetchall()
-                columns = [desc[0] for desc in cursor.description] if cursor.description else []
-                return [dict(zip(columns, row)) for row in rows]
-    
-    async def execute_command(self, query: str, *args):
+        return await self._execute(query, args, "many")
+    
+    async def execute_command(self, query: Union[Statement, str], *args):
         """Execute an INSERT/UPDATE/DELETE command"""
-        async with self.get_connection() as conn:
-            if self.db_type == "postgresql":
-                return await conn.execute(query, *args)
-            else:  # SQLite
-                sqlite_query = self._convert_query_for_sqlite(query)
-                sqlite_args = [str(arg) if isinstance(arg, UUID) else arg for arg in args]
-                cursor = await conn.execute(sqlite_query, sqlite_args)
-                
-                # FIX: Consume results (if RETURNING is used) before committing
-                await cursor.fetchall()
-                
-                await conn.commit()
-                return cursor.rowcount if hasattr(cursor, 'rowcount') else 0
+        return await self._execute(query, args, "command")
     
-    async def fetchrow(self, query: str, *args):
+    async def fetchrow(self, query: Union[Statement, str], *args):
         """Fetch a single row"""
-        async with self.get_connection() as conn:
-            if self.db_type == "postgresql":
-                return await conn.fetchrow(query, *args)
-            else:  # SQLite
-                sqlite_query = self._convert_query_for_sqlite(query)
-                sqlite_args = [str(arg) if isinstance(arg, UUID) else arg for arg in args]
-                
-                cursor = await conn.execute(sqlite_query, sqlite_args)
-                
-                # FIX: Fetch BEFORE commit to handle RETURNING
-                row = await cursor.fetchone()
-                
-                # Only commit if it's a write operation
-                query_upper = sqlite_query.strip().upper()
-                if any(query_upper.startswith(cmd) for cmd in ('INSERT', 'UPDATE', 'DELETE')):
-                    await conn.commit()
-                
-                if not row:
-                    return None
-                columns = [desc[0] for desc in cursor.description] if cursor.description else []
-                return dict(zip(columns, row))
-    
-    async def fetch(self, query: str, *args):
+        return await self._execute(query, args, "one")
+    
+    async def execute_batch(self, commands: List[Tuple[Union[Statement, str], Sequence[Any]]]):
+        """Execute several INSERT/UPDATE/DELETE commands in a single transaction"""
+        async with self.transaction() as tx:
+            for query, args in commands:
+                await tx.execute_command(query, *args)
+    
+    async def execute_many(self, query: Union[Statement, str], args_list: Iterable[Sequence[Any]]):
+        """Execute one INSERT/UPDATE/DELETE for each argument tuple, in a single transaction"""
+        async with self.transaction() as tx:
+            await tx.execute_many(query, args_list)
+    
+    async def copy_records(self, table: str, columns: Sequence[str], records: Iterable[Sequence[Any]]) -> int:
+        """
+        Bulk-insert rows into `table` in a single transaction and return the
+        row count. Uses COPY on PostgreSQL, so there is no ON CONFLICT: any
+        duplicate key fails the whole batch. `table` and `columns` are
+        interpolated into the SQL and must never come from user input.
+        """
+        async with self.transaction() as tx:
+            return await tx.copy_records(table, columns, records)
+    
+    async def fetch(self, query: Union[Statement, str], *args):
         """Fetch multiple rows"""
         return await self.execute_query(query, *args)
+    
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        Pin one connection and run everything issued through the yielded
+        Transaction as a single unit: committed on exit, rolled back on error.
+        
+        On SQLite this holds the writer, so don't call db_adapter write
+        methods inside the block; pass the transaction down instead.
+        """
+        async with self._connection() as conn:
+            tx = Transaction(self, conn)
+            if self.db_type == "postgresql":
+                async with conn.transaction():
+                    yield tx
+            else:  # SQLite
+                # IMMEDIATE takes the write lock up front rather than failing on upgrade later
+                await conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield tx
+                except BaseException:
+                    await conn.rollback()
+                    raise
+                await conn.commit()
+        await self.mark_written()
+        for callback in tx.callbacks:
+            await callback()
+    
+    def unit_of_work(self, thread_id: Any = None) -> "UnitOfWork":
+        """Start collecting writes to commit later in one transaction (for `thread_id`, if given)"""
+        return UnitOfWork(self, thread_id)
+    
+    async def run(self, statement: Statement, *args):
+        """Execute a registered statement according to its expected cardinality"""
+        if statement.cardinality == "one":
+            return await self.fetchrow(statement, *args)
+        if statement.cardinality == "many":
+            return await self.fetch(statement, *args)
+        return await self.execute_command(statement, *args)
+
+
+class Transaction:
+    """Queries issued through this object share one connection and one commit"""
+    
+    def __init__(self, adapter: DatabaseAdapter, connection: Any):
+        self._adapter = adapter
+        self.connection = connection
+        self.callbacks: List[Callable[[], Awaitable[Any]]] = []
+        self._savepoints = 0
+    
+    async def _execute(self, query: Union[Statement, str], args: Sequence[Any], mode: str):
+        sql, args, _ = self._adapter._prepare(query, args)
+        return await self._adapter._execute_on(self.connection, sql, args, mode)
+    
+    async def execute_query(self, query: Union[Statement, str], *args):
+        return await self._execute(query, args, "many")
+    
+    async def fetch(self, query: Union[Statement, str], *args):
+        return await self._execute(query, args, "many")
+    
+    async def fetchrow(self, query: Union[Statement, str], *args):
+        return await self._execute(query, args, "one")
+    
+    async def execute_command(self, query: Union[Statement, str], *args):
+        return await self._execute(query, args, "command")
+    
+    async def execute_many(self, query: Union[Statement, str], args_list: Iterable[Sequence[Any]]):
+        await self._adapter._execute_many_on(self.connection, query, args_list)
+    
+    async def copy_records(self, table: str, columns: Sequence[str], records: Iterable[Sequence[Any]]) -> int:
+        return await self._adapter._copy_on(self.connection, table, columns, records)
+    
+    def on_commit(self, callback: Callable[[], Awaitable[Any]]):
+        """Run `callback` only once the transaction has committed (e.g. cache updates)"""
+        self.callbacks.append(callback)
+    
+    @asynccontextmanager
+    async def savepoint(self):
+        """Nested block that can fail without aborting the whole transaction"""
+        if self._adapter.db_type == "postgresql":
+            async with self.connection.transaction():
+                yield
+            return
+        self._savepoints += 1
+        name = f"sp_{self._savepoints}"
+        await self.connection.execute(f"SAVEPOINT {name}")
+        try:
+            yield
+        except BaseException:
+            await self.connection.execute(f"ROLLBACK TO {name}")
+            await self.connection.execute(f"RELEASE {name}")
+            raise
+        await self.connection.execute(f"RELEASE {name}")
+
+
+class UnitOfWork:
+    """
+    Buffers the writes of one logical operation (e.g. a chat turn's
+    checkpoints and messages) and commits them in a single transaction.
+    
+    Writes are queued, not executed, so nothing is held open while the
+    operation runs; only statements whose results aren't needed belong here.
+    """
+    
+    def __init__(self, adapter: DatabaseAdapter, thread_id: Any = None):
+        self._adapter = adapter
+        self.thread_id = thread_id
+        self._commands: List[Tuple[Union[Statement, str], Sequence[Any]]] = []
+        self._callbacks: List[Callable[[], Awaitable[Any]]] = []
+    
+    def __len__(self) -> int:
+        return len(self._commands)
+    
+    def add(self, query: Union[Statement, str], *args):
+        self._commands.append((query, args))
+    
+    def on_commit(self, callback: Callable[[], Awaitable[Any]]):
+        self._callbacks.append(callback)
+    
+    async def commit(self, execute: Optional[Callable[[List[Tuple[Union[Statement, str], Sequence[Any]]]], Awaitable[Any]]] = None):
+        """
+        Execute all buffered writes in one transaction. `execute` replaces
+        execute_batch, e.g. to commit together with other units of work.
+        """
+        commands, self._commands = self._commands, []
+        callbacks, self._callbacks = self._callbacks, []
+        if commands:
+            await (execute or self._adapter.execute_batch)(commands)
+            if self.thread_id is not None:
+                await self._adapter.mark_written(self.thread_id)
+        for callback in callbacks:
+            await callback()
 
 
 # Global adapter instance
@@ -38,7 +38,10 @@ CREATE TABLE IF NOT EXISTS checkpoints (
 
 -- Indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_threads_user_id ON threads(user_id);
+CREATE INDEX IF NOT EXISTS idx_threads_user_persona ON threads(user_id, persona, updated_at DESC);
+CREATE INDEX IF NOT EXISTS idx_threads_user_updated ON threads(user_id, updated_at DESC, thread_id DESC);
 CREATE INDEX IF NOT EXISTS idx_messages_thread_id ON messages(thread_id);
+CREATE INDEX IF NOT EXISTS idx_messages_thread_created ON messages(thread_id, created_at, message_id);
 CREATE INDEX IF NOT EXISTS idx_checkpoints_thread_id ON checkpoints(thread_id);
 CREATE INDEX IF NOT EXISTS idx_checkpoints_created_at ON checkpoints(created_at DESC);
 
@@ -0,0 +1,2 @@
+-- Serves GET_LATEST_CHECKPOINT and checkpoint retention from the index
+CREATE INDEX IF NOT EXISTS idx_checkpoints_thread_recency ON checkpoints(thread_id, created_at DESC, checkpoint_id DESC);
@@ -0,0 +1,3 @@
+-- Delta-encoded checkpoints: every checkpoint of a delta chain records the
+-- full base snapshot it replays from (NULL for full snapshots)
+ALTER TABLE checkpoints ADD COLUMN IF NOT EXISTS base_id UUID;
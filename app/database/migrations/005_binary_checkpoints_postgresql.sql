@@ -0,0 +1,4 @@
+-- Binary checkpoints: new rows are stored in data (a versioned, optionally
+-- compressed encoding); state only holds rows written as JSON before
+ALTER TABLE checkpoints ADD COLUMN IF NOT EXISTS data BYTEA;
+ALTER TABLE checkpoints ALTER COLUMN state DROP NOT NULL;
@@ -0,0 +1,22 @@
+-- Binary checkpoints: new rows are stored in data (a versioned, optionally
+-- compressed encoding); state only holds rows written as JSON before.
+-- SQLite can't drop NOT NULL in place, so the table is rebuilt
+CREATE TABLE checkpoints_new (
+    checkpoint_id TEXT PRIMARY KEY,
+    thread_id TEXT NOT NULL,
+    state TEXT, -- legacy JSON checkpoints
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    base_id TEXT,
+    data BLOB,
+    FOREIGN KEY (thread_id) REFERENCES threads(thread_id) ON DELETE CASCADE
+);
+
+INSERT INTO checkpoints_new (checkpoint_id, thread_id, state, created_at, base_id)
+SELECT checkpoint_id, thread_id, state, created_at, base_id FROM checkpoints;
+
+DROP TABLE checkpoints;
+ALTER TABLE checkpoints_new RENAME TO checkpoints;
+
+CREATE INDEX IF NOT EXISTS idx_checkpoints_thread_id ON checkpoints(thread_id);
+CREATE INDEX IF NOT EXISTS idx_checkpoints_created_at ON checkpoints(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_checkpoints_thread_recency ON checkpoints(thread_id, created_at DESC, checkpoint_id DESC);
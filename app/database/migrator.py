@@ -0,0 +1,190 @@
+"""Versioned schema migrations tracked in a schema_migrations table"""
+import hashlib
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List
+from app.database.adapter import db_adapter, DatabaseAdapter
+from app.database.queries import to_sqlite
+from app.core.exceptions import MigrationException
+from app.core.logging import logger
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+# <version>_<name>[_sqlite|_postgresql].sql; an unsuffixed file serves both
+# dialects unless a dialect-specific file exists for the same version
+_FILENAME = re.compile(r"^(\d+)_(.+?)(?:_(sqlite|postgresql))?\.sql$")
+
+# Arbitrary constant: serializes migrations across workers starting together (PostgreSQL)
+_ADVISORY_LOCK_ID = 7_263_401
+
+CREATE_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        checksum TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT NOW()
+    );
+"""
+GET_APPLIED_MIGRATIONS = "SELECT version, checksum FROM schema_migrations;"
+RECORD_MIGRATION = "INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3);"
+
+
+def split_sqlite_script(sql: str) -> List[str]:
+    """Split a script into complete statements (sqlite3 knows where they end)"""
+    statements, buffer = [], ""
+    for line in sql.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer.strip())
+            buffer = ""
+    if any(line.strip() and not line.strip().startswith("--") for line in buffer.splitlines()):
+        raise MigrationException(f"Incomplete SQL statement at end of script: {buffer.strip()[:100]}")
+    return statements
+
+
+class Migration:
+    """One versioned migration file"""
+    
+    def __init__(self, version: int, name: str, path: Path):
+        self.version = version
+        self.name = name
+        self.path = path
+        self.sql = path.read_text()
+        self.checksum = hashlib.sha256(self.sql.encode()).hexdigest()
+    
+    def __repr__(self) -> str:
+        return f"Migration({self.version}, {self.name!r})"
+
+
+class MigrationRunner:
+    """
+    Applies pending migrations in version order, each in its own transaction
+    together with its schema_migrations row.
+    
+    Startup cost once everything is applied is a single SELECT of the
+    recorded versions. An applied file whose checksum has changed is
+    reported but not re-run; schema changes go in a new version.
+    """
+    
+    def __init__(self, adapter: DatabaseAdapter = db_adapter, directory: Path = MIGRATIONS_DIR):
+        self._adapter = adapter
+        self._directory = directory
+    
+    def discover(self) -> List[Migration]:
+        """Migrations for the adapter's dialect, in version order"""
+        dialect = "postgresql" if self._adapter.db_type == "postgresql" else "sqlite"
+        candidates: Dict[int, Dict[str, Path]] = {}
+        for path in self._directory.glob("*.sql"):
+            match = _FILENAME.match(path.name)
+            if not match:
+                logger.warning(f"Ignoring migration file with unexpected name: {path.name}")
+                continue
+            version, _, file_dialect = match.groups()
+            candidates.setdefault(int(version), {})[file_dialect or "any"] = path
+        migrations = []
+        for version in sorted(candidates):
+            path = candidates[version].get(dialect) or candidates[version].get("any")
+            if path is None:
+                continue  # only provided for the other dialect
+            name = _FILENAME.match(path.name).group(2)
+            migrations.append(Migration(version, name, path))
+        return migrations
+    
+    def _pending(self, migrations: List[Migration], applied: Dict[int, str]) -> List[Migration]:
+        for migration in migrations:
+            checksum = applied.get(migration.version)
+            if checksum is not None and checksum != migration.checksum:
+                logger.warning(
+                    f"Migration {migration.path.name} changed after it was applied "
+                    f"(recorded checksum {checksum[:12]}, file {migration.checksum[:12]})"
+                )
+        return [m for m in migrations if m.version not in applied]
+    
+    async def migrate(self) -> List[Migration]:
+        """Apply pending migrations; returns the ones applied by this call"""
+        migrations = self.discover()
+        if self._adapter.db_type == "postgresql":
+            applied = await self._migrate_postgresql(migrations)
+        else:
+            applied = await self._migrate_sqlite(migrations)
+        if applied:
+            logger.info(f"Applied {len(applied)} migration(s), schema at version {applied[-1].version}")
+        else:
+            logger.debug("Database schema is up to date")
+        return applied
+    
+    async def _migrate_postgresql(self, migrations: List[Migration]) -> List[Migration]:
+        async with self._adapter.get_connection() as conn:
+            await conn.execute(CREATE_MIGRATIONS_TABLE)
+            rows = await conn.fetch(GET_APPLIED_MIGRATIONS)
+            if not self._pending(migrations, {row["version"]: row["checksum"] for row in rows}):
+                return []
+            
+            await conn.execute("SELECT pg_advisory_lock($1)", _ADVISORY_LOCK_ID)
+            try:
+                # Another worker may have migrated while we waited for the lock
+                rows = await conn.fetch(GET_APPLIED_MIGRATIONS)
+                applied = {row["version"] for row in rows}
+                done = []
+                for migration in migrations:
+                    if migration.version in applied:
+                        continue
+                    started = time.monotonic()
+                    try:
+                        async with conn.transaction():
+                            # Simple-query protocol: the whole file runs as one script
+                            await conn.execute(migration.sql)
+                            await conn.execute(RECORD_MIGRATION, migration.version, migration.name, migration.checksum)
+                    except Exception as e:
+                        raise MigrationException(f"Migration {migration.path.name} failed: {str(e)}") from e
+                    logger.info(f"Applied migration {migration.path.name} in {time.monotonic() - started:.2f}s")
+                    done.append(migration)
+                return done
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", _ADVISORY_LOCK_ID)
+    
+    async def _migrate_sqlite(self, migrations: List[Migration]) -> List[Migration]:
+        async with self._adapter.get_connection() as conn:
+            await conn.execute(to_sqlite(CREATE_MIGRATIONS_TABLE))
+            await conn.commit()
+            async with conn.execute(GET_APPLIED_MIGRATIONS) as cursor:
+                applied = {version: checksum for version, checksum in await cursor.fetchall()}
+            pending = self._pending(migrations, applied)
+            if not pending:
+                return []
+            
+            # Tables are created before the ones they reference; can't change inside a transaction
+            await conn.execute("PRAGMA foreign_keys = OFF")
+            done = []
+            try:
+                for migration in pending:
+                    started = time.monotonic()
+                    await conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        # Another process may have applied it since we looked
+                        async with conn.execute(
+                            "SELECT 1 FROM schema_migrations WHERE version = ?", (migration.version,)
+                        ) as cursor:
+                            if await cursor.fetchone():
+                                await conn.rollback()
+                                continue
+                        for statement in split_sqlite_script(migration.sql):
+                            await conn.execute(statement)
+                        await conn.execute(
+                            to_sqlite(RECORD_MIGRATION), (migration.version, migration.name, migration.checksum)
+                        )
+                        await conn.commit()
+                    except Exception as e:
+                        await conn.rollback()
+                        raise MigrationException(f"Migration {migration.path.name} failed: {str(e)}") from e
+                    logger.info(f"Applied migration {migration.path.name} in {time.monotonic() - started:.2f}s")
+                    done.append(migration)
+            finally:
+                await conn.execute("PRAGMA foreign_keys = ON")
+            return done
+
+
+# Global migration runner instance
+migration_runner = MigrationRunner()
@@ -1,80 +1,294 @@
-"""Raw SQL queries"""
-from typing import Optional
+"""SQL statements, pre-translated for each supported database"""
+import re
+from typing import Dict, Optional
+
+_PLACEHOLDER = re.compile(r"\$(\d+)")
+_CAST = re.compile(r"::(jsonb|uuid|timestamp)\b")
+
+
+def to_sqlite(query: str) -> str:
+    """Convert PostgreSQL query to SQLite-compatible query"""
+    sqlite_query = query.replace("NOW()", "CURRENT_TIMESTAMP")
+    # SQLite has no jsonb/uuid/timestamp types (just TEXT), so casts are dropped
+    sqlite_query = _CAST.sub("", sqlite_query)
+    # $n -> ?n keeps explicit numbering, so a parameter can be reused or out of order
+    return _PLACEHOLDER.sub(r"?\1", sqlite_query)
+
+
+class Statement:
+    """
+    A named statement with its per-dialect SQL and execution metadata.
+    
+    kind: "read" or "write" (writes commit, and use the SQLite writer)
+    cardinality: "one", "many" or "none" rows expected back
+    """
+    
+    def __init__(self, name: str, sql: str, kind: str = "read", cardinality: str = "many", sqlite: Optional[str] = None):
+        self.name = name
+        self.kind = kind
+        self.is_write = kind == "write"
+        self.cardinality = cardinality
+        self.returning = "RETURNING" in sql.upper()
+        self.postgresql = sql
+        self.sqlite = to_sqlite(sqlite if sqlite is not None else sql)
+        QUERIES[name] = self
+    
+    def sql_for(self, db_type: str) -> str:
+        return self.postgresql if db_type == "postgresql" else self.sqlite
+    
+    def __str__(self) -> str:
+        return self.postgresql
+    
+    def __repr__(self) -> str:
+        return f"Statement({self.name!r}, kind={self.kind!r}, cardinality={self.cardinality!r})"
+
+
+# Registry of all named statements
+QUERIES: Dict[str, Statement] = {}
 
 # User queries
-CREATE_USER = """
+CREATE_USER = Statement("CREATE_USER", """
+    INSERT INTO users (user_id, created_at)
+    VALUES ($1, NOW())
+    ON CONFLICT (user_id) DO NOTHING
+    RETURNING user_id, created_at;
+""", kind="write", cardinality="one")
+
+# "Create if missing, return the row". PostgreSQL does it in one round trip with
+# a data-modifying CTE, so existing users aren't rewritten. SQLite has no DML in
+# CTEs: its variant returns nothing for an existing user, and callers look the
+# user up first so existing users never take the single writer.
+UPSERT_USER = Statement("UPSERT_USER", """
+    WITH inserted AS (
+        INSERT INTO users (user_id, created_at)
+        VALUES ($1, NOW())
+        ON CONFLICT (user_id) DO NOTHING
+        RETURNING user_id, created_at
+    )
+    SELECT user_id, created_at FROM inserted
+    UNION ALL
+    SELECT user_id, created_at FROM users WHERE user_id = $1
+    LIMIT 1;
+""", kind="write", cardinality="one", sqlite="""
     INSERT INTO users (user_id, created_at)
     VALUES ($1, NOW())
     ON CONFLICT (user_id) DO NOTHING
     RETURNING user_id, created_at;
-"""
+""")
+
+# Provision without reading the row back (bulk ingest runs it via executemany)
+PROVISION_USER = Statement("PROVISION_USER", """
+    INSERT INTO users (user_id, created_at)
+    VALUES ($1, NOW())
+    ON CONFLICT (user_id) DO NOTHING;
+""", kind="write", cardinality="none")
 
-GET_USER = """
+GET_USER = Statement("GET_USER", """
     SELECT user_id, created_at
     FROM users
     WHERE user_id = $1;
-"""
+""", kind="read", cardinality="one")
 
 # Thread queries
-CREATE_THREAD = """
+CREATE_THREAD = Statement("CREATE_THREAD", """
     INSERT INTO threads (thread_id, user_id, persona, created_at, updated_at)
     VALUES ($1, $2, $3, NOW(), NOW())
     RETURNING thread_id, user_id, persona, created_at, updated_at;
-"""
+""", kind="write", cardinality="one")
+
+# Column order for bulk thread loads (DatabaseAdapter.copy_records)
+THREAD_COLUMNS = ("thread_id", "user_id", "persona", "created_at", "updated_at")
 
-GET_THREAD = """
+GET_THREAD = Statement("GET_THREAD", """
     SELECT thread_id, user_id, persona, created_at, updated_at
     FROM threads
     WHERE thread_id = $1;
-"""
+""", kind="read", cardinality="one")
 
-GET_USER_THREADS = """
+GET_USER_THREADS = Statement("GET_USER_THREADS", """
     SELECT thread_id, user_id, persona, created_at, updated_at
     FROM threads
     WHERE user_id = $1
     ORDER BY updated_at DESC;
-"""
+""", kind="read", cardinality="many")
+
+GET_USER_THREAD_BY_PERSONA = Statement("GET_USER_THREAD_BY_PERSONA", """
+    SELECT thread_id, user_id, persona, created_at, updated_at
+    FROM threads
+    WHERE user_id = $1 AND persona = $2
+    ORDER BY updated_at DESC
+    LIMIT 1;
+""", kind="read", cardinality="one")
+
+# Keyset pages of a user's threads, newest first. The cursor is the
+# (updated_at, thread_id) of the last row seen; "newer" pages are read in
+# ascending order and reversed by the caller
+GET_USER_THREADS_NEWEST = Statement("GET_USER_THREADS_NEWEST", """
+    SELECT thread_id, user_id, persona, created_at, updated_at
+    FROM threads
+    WHERE user_id = $1
+    ORDER BY updated_at DESC, thread_id DESC
+    LIMIT $2;
+""", kind="read", cardinality="many")
+
+GET_USER_THREADS_OLDER = Statement("GET_USER_THREADS_OLDER", """
+    SELECT thread_id, user_id, persona, created_at, updated_at
+    FROM threads
+    WHERE user_id = $1 AND (updated_at, thread_id) < ($2::timestamp, $3::uuid)
+    ORDER BY updated_at DESC, thread_id DESC
+    LIMIT $4;
+""", kind="read", cardinality="many")
+
+GET_USER_THREADS_NEWER = Statement("GET_USER_THREADS_NEWER", """
+    SELECT thread_id, user_id, persona, created_at, updated_at
+    FROM threads
+    WHERE user_id = $1 AND (updated_at, thread_id) > ($2::timestamp, $3::uuid)
+    ORDER BY updated_at ASC, thread_id ASC
+    LIMIT $4;
+""", kind="read", cardinality="many")
 
-UPDATE_THREAD_PERSONA = """
+UPDATE_THREAD_PERSONA = Statement("UPDATE_THREAD_PERSONA", """
     UPDATE threads
     SET persona = $1, updated_at = NOW()
     WHERE thread_id = $2
     RETURNING thread_id, user_id, persona, created_at, updated_at;
-"""
+""", kind="write", cardinality="one")
 
 # Message queries
-CREATE_MESSAGE = """
+CREATE_MESSAGE = Statement("CREATE_MESSAGE", """
     INSERT INTO messages (message_id, thread_id, role, content, created_at)
     VALUES ($1, $2, $3, $4, NOW())
     RETURNING message_id, thread_id, role, content, created_at;
-"""
+""", kind="write", cardinality="one")
+
+# Multi-row form of CREATE_MESSAGE used by the message writer; the caller
+# supplies created_at so the rows of a turn keep their order
+CREATE_MESSAGES_PREFIX = "INSERT INTO messages (message_id, thread_id, role, content, created_at) VALUES "
+CREATE_MESSAGES_COLUMNS = 5
+
+# Column order for bulk message loads (DatabaseAdapter.copy_records)
+MESSAGE_COLUMNS = ("message_id", "thread_id", "role", "content", "created_at")
 
-GET_THREAD_MESSAGES = """
+GET_THREAD_MESSAGES = Statement("GET_THREAD_MESSAGES", """
     SELECT message_id, thread_id, role, content, created_at
     FROM messages
     WHERE thread_id = $1
     ORDER BY created_at ASC;
-"""
+""", kind="read", cardinality="many")
+
+# Keyset pages of a thread's messages on (created_at, message_id), same
+# scheme as the thread pages above
+GET_THREAD_MESSAGES_NEWEST = Statement("GET_THREAD_MESSAGES_NEWEST", """
+    SELECT message_id, thread_id, role, content, created_at
+    FROM messages
+    WHERE thread_id = $1
+    ORDER BY created_at DESC, message_id DESC
+    LIMIT $2;
+""", kind="read", cardinality="many")
+
+GET_THREAD_MESSAGES_OLDER = Statement("GET_THREAD_MESSAGES_OLDER", """
+    SELECT message_id, thread_id, role, content, created_at
+    FROM messages
+    WHERE thread_id = $1 AND (created_at, message_id) < ($2::timestamp, $3::uuid)
+    ORDER BY created_at DESC, message_id DESC
+    LIMIT $4;
+""", kind="read", cardinality="many")
+
+GET_THREAD_MESSAGES_NEWER = Statement("GET_THREAD_MESSAGES_NEWER", """
+    SELECT message_id, thread_id, role, content, created_at
+    FROM messages
+    WHERE thread_id = $1 AND (created_at, message_id) > ($2::timestamp, $3::uuid)
+    ORDER BY created_at ASC, message_id ASC
+    LIMIT $4;
+""", kind="read", cardinality="many")
 
-# Checkpoint queries
-CREATE_CHECKPOINT = """
-    INSERT INTO checkpoints (checkpoint_id, thread_id, state, created_at)
-    VALUES ($1, $2, $3::jsonb, NOW())
-    RETURNING checkpoint_id, thread_id, state, created_at;
-"""
+# Checkpoint queries (created_at is supplied by the caller and strictly
+# increasing per process, so "latest" is unambiguous within a transaction).
+# base_id is set on delta checkpoints: the full snapshot their chain starts from.
+# A row holds its record in data (binary) or, for the JSON format, in state
+CREATE_CHECKPOINT = Statement("CREATE_CHECKPOINT", """
+    INSERT INTO checkpoints (checkpoint_id, thread_id, state, created_at, base_id, data)
+    VALUES ($1, $2, $3::jsonb, $4, $5::uuid, $6)
+    RETURNING checkpoint_id, thread_id, created_at, base_id;
+""", kind="write", cardinality="one")
 
-GET_LATEST_CHECKPOINT = """
-    SELECT checkpoint_id, thread_id, state, created_at
+GET_LATEST_CHECKPOINT = Statement("GET_LATEST_CHECKPOINT", """
+    SELECT checkpoint_id, thread_id, state, data, created_at, base_id
     FROM checkpoints
     WHERE thread_id = $1
-    ORDER BY created_at DESC
+    ORDER BY created_at DESC, checkpoint_id DESC
     LIMIT 1;
-"""
+""", kind="read", cardinality="one")
+
+# A delta chain: its base snapshot and every delta replayed on top of it
+GET_CHECKPOINT_CHAIN = Statement("GET_CHECKPOINT_CHAIN", """
+    SELECT checkpoint_id, state, data
+    FROM checkpoints
+    WHERE thread_id = $1 AND (checkpoint_id = $2::uuid OR base_id = $2::uuid);
+""", kind="read", cardinality="many")
 
-GET_ALL_CHECKPOINTS = """
-    SELECT checkpoint_id, thread_id, state, created_at
+GET_ALL_CHECKPOINTS = Statement("GET_ALL_CHECKPOINTS", """
+    SELECT checkpoint_id, thread_id, state, data, created_at
     FROM checkpoints
     WHERE thread_id = $1
     ORDER BY created_at ASC;
-"""
+""", kind="read", cardinality="many")
+
+# Checkpoint retention: walk threads in ID order, then delete the expired
+# checkpoints of one ID range in bounded batches
+GET_THREAD_ID_RANGE = Statement("GET_THREAD_ID_RANGE", """
+    SELECT thread_id
+    FROM threads
+    WHERE thread_id > $1
+    ORDER BY thread_id
+    LIMIT $2;
+""", kind="read", cardinality="many")
+
+# Deletes (up to $5) checkpoints of threads in ($1, $2] that are neither among
+# their thread's $3 latest nor newer than $4, nor part of the delta chain
+# (base plus deltas) of one that is kept; returns each row's stored size
+DELETE_EXPIRED_CHECKPOINTS = Statement("DELETE_EXPIRED_CHECKPOINTS", """
+    WITH ranked AS (
+        SELECT checkpoint_id, created_at, COALESCE(base_id, checkpoint_id) AS chain,
+               ROW_NUMBER() OVER (PARTITION BY thread_id ORDER BY created_at DESC, checkpoint_id DESC) AS recency
+        FROM checkpoints
+        WHERE thread_id > $1 AND thread_id <= $2
+    ), kept AS (
+        SELECT chain FROM ranked WHERE recency <= $3 OR created_at >= $4
+    )
+    DELETE FROM checkpoints
+    WHERE checkpoint_id IN (
+        SELECT checkpoint_id FROM ranked
+        WHERE chain NOT IN (SELECT chain FROM kept)
+        LIMIT $5
+    )
+    RETURNING COALESCE(pg_column_size(state), 0) + COALESCE(pg_column_size(data), 0) AS bytes;
+""", kind="write", cardinality="many", sqlite="""
+    WITH ranked AS (
+        SELECT checkpoint_id, created_at, COALESCE(base_id, checkpoint_id) AS chain,
+               ROW_NUMBER() OVER (PARTITION BY thread_id ORDER BY created_at DESC, checkpoint_id DESC) AS recency
+        FROM checkpoints
+        WHERE thread_id > $1 AND thread_id <= $2
+    ), kept AS (
+        SELECT chain FROM ranked WHERE recency <= $3 OR created_at >= $4
+    )
+    DELETE FROM checkpoints
+    WHERE checkpoint_id IN (
+        SELECT checkpoint_id FROM ranked
+        WHERE chain NOT IN (SELECT chain FROM kept)
+        LIMIT $5
+    )
+    RETURNING COALESCE(length(CAST(state AS BLOB)), 0) + COALESCE(length(data), 0) AS bytes;
+""")
 
+# Statements on the request path, prepared up front on every new PostgreSQL
+# connection when DB_POOL_WARMUP is set
+HOT_STATEMENTS = (
+    UPSERT_USER,
+    CREATE_THREAD,
+    GET_THREAD,
+    GET_USER_THREAD_BY_PERSONA,
+    GET_THREAD_MESSAGES,
+    CREATE_CHECKPOINT,
+    GET_LATEST_CHECKPOINT,
+)
@@ -17,6 +17,7 @@ class ChatResponse(BaseModel):
     persona: str = Field(..., description="Current persona")
     response: str = Field(..., description="Assistant response")
     created_at: datetime = Field(..., description="Response timestamp")
+    cached: bool = Field(False, description="Whether the response was served from the response cache")
 
 
 class Message(BaseModel):
@@ -39,6 +40,8 @@ class ChatHistoryResponse(BaseModel):
     """Chat history response model"""
     threads: List[Thread] = Field(..., description="List of threads")
     messages: List[Message] = Field(default_factory=list, description="Messages for specific thread")
+    older_cursor: Optional[str] = Field(None, description="Pass as `before` to get the previous (older) page")
+    newer_cursor: Optional[str] = Field(None, description="Pass as `after` to get the next (newer) page")
 
 
 class ErrorResponse(BaseModel):
@@ -1,7 +1,7 @@
 """LangGraph state graph definition"""
 from langgraph.graph import StateGraph, END
 from app.services.agent.state import AgentState
-from app.services.agent.nodes import route_persona, execute_persona, save_context
+from app.services.agent.nodes import route_persona, compact_history, execute_persona, save_context
 from app.services.memory.checkpointer import DatabaseCheckpointer
 from app.core.logging import logger
 
@@ -17,6 +17,7 @@ def create_agent():
         
         # Add nodes
         workflow.add_node("route_persona", route_persona)
+        workflow.add_node("compact_history", compact_history)
         workflow.add_node("execute_persona", execute_persona)
         workflow.add_node("save_context", save_context)
         
@@ -24,7 +25,8 @@ def create_agent():
         workflow.set_entry_point("route_persona")
         
         # Add edges
-        workflow.add_edge("route_persona", "execute_persona")
+        workflow.add_edge("route_persona", "compact_history")
+        workflow.add_edge("compact_history", "execute_persona")
         workflow.add_edge("execute_persona", "save_context")
         workflow.add_edge("save_context", END)
         
@@ -0,0 +1,61 @@
+"""Token-budgeted conversation history helpers"""
+from typing import Any, List, Sequence
+from langchain_core.messages import HumanMessage
+
+
+def message_text(message: Any) -> str:
+    """Get the text content of a message object or dict"""
+    content = message.get("content", "") if isinstance(message, dict) else getattr(message, "content", message)
+    if isinstance(content, list):
+        return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return str(content)
+
+
+def message_role(message: Any) -> str:
+    """Get the role of a message ("user" or "assistant")"""
+    if isinstance(message, dict):
+        return message.get("role", "")
+    return "user" if isinstance(message, HumanMessage) else "assistant"
+
+
+def estimate_tokens(message: Any) -> int:
+    """Cheap token estimate (~4 characters per token plus per-message overhead)"""
+    return len(message_text(message)) // 4 + 4
+
+
+def window_start(messages: Sequence[Any], start: int, max_turns: int, token_budget: int) -> int:
+    """
+    Find the index of the oldest message kept verbatim.
+    
+    Walks back from the newest message keeping whole turns (a turn starts at a
+    user message) while at most `max_turns` turns and `token_budget` tokens are
+    used. The newest turn is always kept. Never returns less than `start`.
+    """
+    tokens = 0
+    turns = 0
+    keep_from = len(messages)
+    for index in range(len(messages) - 1, start - 1, -1):
+        tokens += estimate_tokens(messages[index])
+        if message_role(messages[index]) != "user":
+            continue
+        turns += 1
+        if turns > 1 and (turns > max_turns or tokens > token_budget):
+            break
+        keep_from = index
+    return max(start, min(keep_from, len(messages) - 1)) if messages else start
+
+
+def needs_compaction(messages: Sequence[Any], start: int, max_turns: int, token_budget: int) -> bool:
+    """Check whether the unsummarized history has outgrown its budget"""
+    pending = messages[start:]
+    turns = sum(1 for msg in pending if message_role(msg) == "user")
+    return turns > max_turns or sum(estimate_tokens(msg) for msg in pending) > token_budget
+
+
+def format_transcript(messages: Sequence[Any]) -> str:
+    """Render messages as a plain-text transcript for the summarizer"""
+    lines: List[str] = []
+    for msg in messages:
+        speaker = "User" if message_role(msg) == "user" else "Advisor"
+        lines.append(f"{speaker}: {message_text(msg)}")
+    return "\n".join(lines)
@@ -1,9 +1,17 @@
 """Agent nodes (persona logic)"""
 from typing import Dict, Any
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk
 from app.services.agent.state import AgentState
-from app.services.agent.prompts import PERSONAS, DEFAULT_PERSONA
-from app.services.llm.claude import create_claude_llm
+from app.services.agent.prompts import PERSONAS, DEFAULT_PERSONA, SUMMARY_PROMPT
+from app.services.agent.history import window_start, needs_compaction, format_transcript, message_text
+from app.services.llm.registry import llm_registry
+from app.services.llm.limiter import llm_limiter, mark_not_retryable
+from app.services.llm.resilience import llm_caller
+from app.services.cache.response_cache import response_cache
+from app.services.llm.prompt_cache import build_system_message, mark_cache_breakpoint, extract_usage
+from app.core.metrics import metrics
+from app.core.exceptions import LLMException
+from app.core.config import settings
 from app.core.logging import logger
 
 
@@ -14,21 +22,75 @@ async def route_persona(state: AgentState) -> Dict[str, Any]:
     return {"current_persona": persona}
 
 
+async def compact_history(state: AgentState) -> Dict[str, Any]:
+    """Fold turns that fall outside the verbatim window into the running summary"""
+    if not settings.HISTORY_COMPACTION_ENABLED:
+        return {}
+    
+    messages = state.get("messages", [])
+    summary_index = min(state.get("summary_index", 0), len(messages))
+    if not needs_compaction(messages, summary_index, settings.HISTORY_MAX_TURNS, settings.HISTORY_TOKEN_BUDGET):
+        return {}
+    
+    keep_from = window_start(messages, summary_index, settings.HISTORY_KEEP_TURNS, settings.HISTORY_TOKEN_BUDGET)
+    if keep_from <= summary_index:
+        return {}
+    
+    # Update the summary incrementally: previous summary + newly evicted turns only
+    from langchain_core.messages import SystemMessage
+    previous_summary = state.get("summary", "")
+    transcript = format_transcript(messages[summary_index:keep_from])
+    try:
+        llm = llm_registry.get("summarizer", temperature=0.0)
+        summary_messages = [
+            SystemMessage(content=SUMMARY_PROMPT),
+            HumanMessage(content=f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}")
+        ]
+        response = await llm_limiter.run(
+            lambda: llm.ainvoke(summary_messages),
+            priority=(state.get("metadata") or {}).get("priority", "interactive")
+        )
+        summary = response.content if hasattr(response, 'content') else str(response)
+    except Exception as e:
+        # Keep the full history this turn rather than lose context
+        logger.warning(f"History compaction failed, sending full history: {str(e)}")
+        return {}
+    
+    logger.info(f"Compacted {keep_from - summary_index} message(s) into summary")
+    return {"summary": summary, "summary_index": keep_from}
+
+
 async def execute_persona(state: AgentState) -> Dict[str, Any]:
     """Execute persona-specific logic and generate response"""
     persona = state.get("current_persona", DEFAULT_PERSONA)
     messages = state.get("messages", [])
     
-    # Get persona-specific system prompt
+    # Serve repeated turns (e.g. the same opening question on a fresh thread) from cache
+    metadata = state.get("metadata") or {}
+    summary = state.get("summary", "")
+    prior_messages = messages[:-1]
+    user_message = message_text(messages[-1]) if messages else ""
+    use_response_cache = bool(messages) and response_cache.enabled_for(prior_messages)
+    if use_response_cache:
+        cached = await response_cache.lookup(persona, user_message, prior_messages, summary)
+        if cached is not None:
+            logger.info(f"Serving cached response for persona {persona}")
+            return {
+                "messages": messages + [AIMessage(content=cached)],
+                "metadata": {**metadata, "response_cache_hit": True}
+            }
+    
+    # Get persona-specific system prompt (plus the running summary, if any)
     system_prompt = PERSONAS.get(persona, PERSONAS[DEFAULT_PERSONA])
+    cache_prompt = settings.PROMPT_CACHING_ENABLED
     
-    # Create LLM with system prompt
-    from langchain_core.messages import SystemMessage
-    llm = create_claude_llm()
+    # Get the pooled LLM client for this persona
+    llm = llm_registry.get(persona)
     
     # Prepare messages with system prompt
-    formatted_messages = [SystemMessage(content=system_prompt)]
-    for msg in messages:
+    # Only the turns not covered by the summary are sent verbatim
+    formatted_messages = [build_system_message(system_prompt, summary, cache_prompt)]
+    for msg in messages[state.get("summary_index", 0):]:
         if isinstance(msg, (HumanMessage, AIMessage)):
             formatted_messages.append(msg)
         elif isinstance(msg, dict):
@@ -38,22 +100,71 @@ async def execute_persona(state: AgentState) -> Dict[str, Any]:
             elif msg.get("role") == "assistant":
                 formatted_messages.append(AIMessage(content=msg.get("content", "")))
     
-    # Generate response
+    if cache_prompt and len(formatted_messages) > 1:
+        # Cache the history prefix up to and including the newest message
+        formatted_messages[-1] = mark_cache_breakpoint(formatted_messages[-1])
+    
+    # Generate response (streamed token by token when the caller asked for it,
+    # so astream_events can surface each chunk as it arrives)
+    stream = metadata.get("stream", False)
+    
+    async def generate():
+        if not stream:
+            return await llm.ainvoke(formatted_messages)
+        response = AIMessageChunk(content="")
+        try:
+            async for chunk in llm.astream(formatted_messages):
+                response = response + chunk
+        except Exception as e:
+            if response.content:
+                # Tokens already reached the client; a retry would repeat them
+                raise mark_not_retryable(e)
+            raise
+        return response
+    
     try:
-        response = await llm.ainvoke(formatted_messages)
+        # Circuit breaker + per-attempt timeout, then admission control (caps
+        # in-flight calls, queues by priority, retries 429/529). Streamed calls
+        # are never hedged: a backup request would emit duplicate tokens.
+        response = await llm_caller.call(
+            persona,
+            generate,
+            priority=metadata.get("priority", "interactive"),
+            allow_hedge=not stream
+        )
         response_content = response.content if hasattr(response, 'content') else str(response)
         
         # Add response to messages
         new_messages = messages + [AIMessage(content=response_content)]
         
-        logger.info(f"Generated response for persona {persona}")
-        return {"messages": new_messages}
+        if use_response_cache:
+            await response_cache.store(persona, user_message, prior_messages, response_content, summary)
+        
+        usage = extract_usage(response)
+        _record_usage(persona, usage)
+        logger.info(
+            f"Generated response for persona {persona} "
+            f"(input={usage['input_tokens']}, output={usage['output_tokens']}, "
+            f"cache_read={usage['cache_read_input_tokens']}, cache_write={usage['cache_creation_input_tokens']})"
+        )
+        return {"messages": new_messages, "metadata": {**metadata, "usage": usage, "response_cache_hit": False}}
+    except LLMException:
+        # Capacity / rate-limit exhaustion and open circuits are surfaced to the
+        # caller (503), not disguised as an assistant reply
+        raise
     except Exception as e:
         logger.error(f"Error generating response: {str(e)}")
         error_message = AIMessage(content=f"I apologize, but I encountered an error: {str(e)}")
         return {"messages": messages + [error_message]}
 
 
+def _record_usage(persona: str, usage: Dict[str, int]):
+    """Add per-request token counts to the metrics registry"""
+    for name, value in usage.items():
+        metrics.increment(f"llm.{name}", value, persona=persona)
+    metrics.increment("llm.requests", persona=persona)
+
+
 async def save_context(state: AgentState) -> Dict[str, Any]:
     """Save context/state (handled by checkpointer)"""
     logger.debug("Context saved via checkpointer")
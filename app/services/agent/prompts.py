@@ -27,3 +27,7 @@ IMPORTANT: Keep your responses concise and focused. Aim for 2-4 sentences per re
 
 DEFAULT_PERSONA = "business_expert"
 
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an AI advisor.
+Update the existing summary with the new messages below. Preserve facts about the user, their goals, decisions made and open questions.
+Drop small talk. Write in third person, at most 200 words, and return only the updated summary."""
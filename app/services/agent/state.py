@@ -12,4 +12,9 @@ class AgentState(TypedDict):
     current_persona: str
     thread_id: str
     user_id: str
-    metadata: Dict[str, Any]
\ No newline at end of file
+    metadata: Dict[str, Any]
+    
+    # Rolling summary of the turns folded out of the verbatim history;
+    # messages[:summary_index] are covered by the summary
+    summary: str
+    summary_index: int
\ No newline at end of file
@@ -1,16 +1,38 @@
 """Cache adapter supporting both in-memory and Redis"""
-from typing import Optional, Any
+from typing import Optional, Any, List
+from collections import OrderedDict
 import json
+import time
 from app.core.config import settings
 from app.core.logging import logger
 
 
+# Delete the lock key only if it still holds our token (atomic compare-and-delete)
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Push the lock key's expiry out only if it still holds our token (atomic compare-and-extend)
+_EXTEND_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
 class CacheAdapter:
     """Adapter for caching operations supporting in-memory and Redis"""
     
     def __init__(self):
         self.cache_type = settings.CACHE_TYPE
-        self._memory_cache: dict = {}
+        # key -> (value, expires_at or None), least recently used first
+        self._memory_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        # lock key -> (token, expires_at); kept apart so eviction never drops a held lock
+        self._memory_locks: dict = {}
         self._redis_client: Optional[Any] = None
     
     async def initialize(self):
@@ -29,11 +51,11 @@ class CacheAdapter:
             except ImportError:
                 logger.warning("redis package not installed, falling back to in-memory cache")
                 self.cache_type = "memory"
-                self._memory_cache = {}
+                self._memory_cache = OrderedDict()
             except Exception as e:
                 logger.warning(f"Failed to connect to Redis: {str(e)}, falling back to in-memory cache")
                 self.cache_type = "memory"
-                self._memory_cache = {}
+                self._memory_cache = OrderedDict()
         else:
             logger.info("Using in-memory cache")
     
@@ -52,7 +74,15 @@ class CacheAdapter:
                     return json.loads(value)
                 return None
             else:
-                return self._memory_cache.get(key)
+                entry = self._memory_cache.get(key)
+                if entry is None:
+                    return None
+                value, expires_at = entry
+                if expires_at is not None and expires_at <= time.monotonic():
+                    self._memory_cache.pop(key, None)
+                    return None
+                self._memory_cache.move_to_end(key)
+                return value
         except Exception as e:
             logger.error(f"Error getting cache key {key}: {str(e)}")
             return None
@@ -67,10 +97,24 @@ class CacheAdapter:
                 else:
                     await self._redis_client.set(key, serialized)
             else:
-                self._memory_cache[key] = value
+                expires_at = time.monotonic() + ttl if ttl else None
+                self._memory_cache.pop(key, None)
+                self._memory_cache[key] = (value, expires_at)
+                if len(self._memory_cache) > settings.CACHE_MEMORY_MAX_ENTRIES:
+                    self._evict_memory_entries()
         except Exception as e:
             logger.error(f"Error setting cache key {key}: {str(e)}")
     
+    def _evict_memory_entries(self):
+        """
+        Drop least recently used entries down to the low-water mark, so a full
+        cache evicts in batches rather than on every set. Expired entries are
+        dropped lazily by get (or evicted here once they are the oldest).
+        """
+        low_water = int(settings.CACHE_MEMORY_MAX_ENTRIES * settings.CACHE_MEMORY_EVICT_TO)
+        while len(self._memory_cache) > low_water:
+            self._memory_cache.popitem(last=False)
+    
     async def delete(self, key: str):
         """Delete key from cache"""
         try:
@@ -81,6 +125,63 @@ class CacheAdapter:
         except Exception as e:
             logger.error(f"Error deleting cache key {key}: {str(e)}")
     
+    async def acquire_lock(self, key: str, token: str, ttl_ms: int) -> bool:
+        """Try to take a lock key (SET NX PX); returns True if acquired"""
+        if self.cache_type == "redis" and self._redis_client:
+            return bool(await self._redis_client.set(key, token, nx=True, px=ttl_ms))
+        entry = self._memory_locks.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            return False
+        self._memory_locks[key] = (token, time.monotonic() + ttl_ms / 1000)
+        return True
+    
+    async def release_lock(self, key: str, token: str) -> bool:
+        """Release a lock key only if it is still held with `token`"""
+        if self.cache_type == "redis" and self._redis_client:
+            released = await self._redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, key, token)
+            return bool(released)
+        entry = self._memory_locks.get(key)
+        if entry is not None and entry[0] == token:
+            del self._memory_locks[key]
+            return True
+        return False
+    
+    async def extend_lock(self, key: str, token: str, ttl_ms: int) -> bool:
+        """Reset a held lock's TTL to `ttl_ms`; False if it is no longer held with `token`"""
+        if self.cache_type == "redis" and self._redis_client:
+            extended = await self._redis_client.eval(_EXTEND_LOCK_SCRIPT, 1, key, token, ttl_ms)
+            return bool(extended)
+        entry = self._memory_locks.get(key)
+        if entry is None or entry[0] != token or entry[1] <= time.monotonic():
+            return False
+        self._memory_locks[key] = (token, time.monotonic() + ttl_ms / 1000)
+        return True
+    
+    async def bloom_contains(self, key: str, offsets: List[int]) -> bool:
+        """Check whether all bits are set in a Redis bitmap (False without Redis)"""
+        if not (self.cache_type == "redis" and self._redis_client):
+            return False
+        try:
+            pipe = self._redis_client.pipeline(transaction=False)
+            for offset in offsets:
+                pipe.getbit(key, offset)
+            return all(await pipe.execute())
+        except Exception as e:
+            logger.error(f"Error checking bloom filter {key}: {str(e)}")
+            return False
+    
+    async def bloom_add(self, key: str, offsets: List[int]):
+        """Set bits in a Redis bitmap (no-op without Redis)"""
+        if not (self.cache_type == "redis" and self._redis_client):
+            return
+        try:
+            pipe = self._redis_client.pipeline(transaction=False)
+            for offset in offsets:
+                pipe.setbit(key, offset, 1)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error updating bloom filter {key}: {str(e)}")
+    
     async def clear(self):
         """Clear all cache"""
         try:
@@ -88,6 +189,7 @@ class CacheAdapter:
                 await self._redis_client.flushdb()
             else:
                 self._memory_cache.clear()
+                self._memory_locks.clear()
         except Exception as e:
             logger.error(f"Error clearing cache: {str(e)}")
 
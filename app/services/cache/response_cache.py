@@ -0,0 +1,131 @@
+"""Response cache for repeated (persona, history prefix, message) turns"""
+import hashlib
+import re
+from typing import Any, List, Optional, Sequence, Tuple
+from app.services.cache.adapter import cache_adapter
+from app.services.agent.history import message_role, message_text
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.logging import logger
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_NUM_PERMUTATIONS = 64
+_SHINGLE_SIZE = 4
+
+
+def _permutations() -> List[Tuple[int, int]]:
+    """Fixed (a, b) pairs for the universal hash family h(x) = (a*x + b) mod p"""
+    pairs = []
+    for i in range(_NUM_PERMUTATIONS):
+        digest = hashlib.blake2b(f"minhash-{i}".encode(), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], "big") % (_MERSENNE_PRIME - 1) + 1
+        b = int.from_bytes(digest[8:], "big") % _MERSENNE_PRIME
+        pairs.append((a, b))
+    return pairs
+
+
+_PERMUTATIONS = _permutations()
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace"""
+    text = re.sub(r"[^\w\s]", " ", message.lower())
+    return " ".join(text.split())
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+
+def history_fingerprint(prior_messages: Sequence[Any], summary: str = "") -> str:
+    """Hash of the conversation before the current message"""
+    hasher = hashlib.sha256(summary.encode())
+    for msg in prior_messages:
+        hasher.update(b"\x1e" + message_role(msg).encode() + b"\x1f" + message_text(msg).encode())
+    return hasher.hexdigest()[:32]
+
+
+def minhash_signature(text: str) -> List[int]:
+    """MinHash signature over character shingles of normalized text"""
+    padded = f" {text} "
+    shingles = {padded[i:i + _SHINGLE_SIZE] for i in range(max(1, len(padded) - _SHINGLE_SIZE + 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big") for s in shingles]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def estimated_similarity(left: Sequence[int], right: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    if not left or len(left) != len(right):
+        return 0.0
+    return sum(1 for x, y in zip(left, right) if x == y) / len(left)
+
+
+class ResponseCache:
+    """Caches assistant replies keyed on persona, prior history and the normalized message"""
+    
+    PREFIX = "response_cache"
+    
+    def enabled_for(self, prior_messages: Sequence[Any]) -> bool:
+        """Check whether a turn with this much history is eligible for caching"""
+        return settings.RESPONSE_CACHE_ENABLED and len(prior_messages) <= settings.RESPONSE_CACHE_MAX_HISTORY
+    
+    def _keys(self, persona: str, message: str, prior_messages: Sequence[Any], summary: str) -> Tuple[str, str, str]:
+        normalized = normalize_message(message)
+        history_hash = history_fingerprint(prior_messages, summary)
+        key = f"{self.PREFIX}:{persona}:{history_hash}:{_digest(normalized)}"
+        index_key = f"{self.PREFIX}_index:{persona}:{history_hash}"
+        return normalized, key, index_key
+    
+    async def lookup(
+        self,
+        persona: str,
+        message: str,
+        prior_messages: Sequence[Any],
+        summary: str = ""
+    ) -> Optional[str]:
+        """Get a cached reply for an identical (or, optionally, near-identical) turn"""
+        normalized, key, index_key = self._keys(persona, message, prior_messages, summary)
+        
+        entry = await cache_adapter.get(key)
+        if entry:
+            metrics.increment("response_cache.hits", mode="exact", persona=persona)
+            return entry.get("response")
+        
+        if settings.RESPONSE_CACHE_NEAR_DUPLICATE:
+            signature = minhash_signature(normalized)
+            best_key, best_score = None, 0.0
+            for candidate in await cache_adapter.get(index_key) or []:
+                score = estimated_similarity(signature, candidate.get("signature", []))
+                if score > best_score:
+                    best_key, best_score = candidate.get("key"), score
+            if best_key and best_score >= settings.RESPONSE_CACHE_SIMILARITY_THRESHOLD:
+                entry = await cache_adapter.get(best_key)
+                if entry:
+                    logger.debug(f"Near-duplicate response cache hit (similarity {best_score:.2f})")
+                    metrics.increment("response_cache.hits", mode="near", persona=persona)
+                    return entry.get("response")
+        
+        metrics.increment("response_cache.misses", persona=persona)
+        return None
+    
+    async def store(
+        self,
+        persona: str,
+        message: str,
+        prior_messages: Sequence[Any],
+        response: str,
+        summary: str = ""
+    ):
+        """Cache a reply for this turn"""
+        normalized, key, index_key = self._keys(persona, message, prior_messages, summary)
+        ttl = settings.RESPONSE_CACHE_TTL
+        await cache_adapter.set(key, {"response": response}, ttl=ttl)
+        
+        if settings.RESPONSE_CACHE_NEAR_DUPLICATE:
+            index = [c for c in await cache_adapter.get(index_key) or [] if c.get("key") != key]
+            index.append({"key": key, "signature": minhash_signature(normalized)})
+            await cache_adapter.set(index_key, index[-settings.RESPONSE_CACHE_INDEX_SIZE:], ttl=ttl)
+
+
+# Global response cache instance
+response_cache = ResponseCache()
@@ -1,20 +1,40 @@
 """Claude API wrapper"""
+from typing import Optional
+import anthropic
+import httpx
 from langchain_anthropic import ChatAnthropic
 from app.core.config import settings
 from app.core.logging import logger
 
 
-def create_claude_llm(temperature: float = 0.7) -> ChatAnthropic:
-    """Create and configure Claude LLM instance"""
+def create_claude_llm(
+    temperature: float = 0.7,
+    model: Optional[str] = None,
+    http_client: Optional[httpx.AsyncClient] = None
+) -> ChatAnthropic:
+    """Create and configure Claude LLM instance (optionally on a shared HTTP pool)"""
     try:
         llm = ChatAnthropic(
-            # UPDATED: Using the active Claude Sonnet 4.5 model
-            model="claude-sonnet-4-5-20250929",
+            model=model or settings.LLM_MODEL,
             temperature=temperature,
-            anthropic_api_key=settings.ANTHROPIC_API_KEY
+            anthropic_api_key=settings.ANTHROPIC_API_KEY,
+            timeout=settings.LLM_REQUEST_TIMEOUT,
+            max_retries=0  # retries are handled by the admission controller (llm_limiter)
         )
-        logger.info("Claude LLM instance created successfully")
+        if http_client is not None:
+            # ChatAnthropic builds its own AsyncAnthropic (and HTTP pool); swap in one
+            # that shares the process-wide pool. The field is private on the pydantic
+            # v1 model, so it has to bypass __setattr__.
+            object.__setattr__(llm, "_async_client", anthropic.AsyncAnthropic(
+                api_key=settings.ANTHROPIC_API_KEY,
+                base_url=llm.anthropic_api_url,
+                max_retries=llm.max_retries,
+                timeout=settings.LLM_REQUEST_TIMEOUT,
+                default_headers=llm.default_headers,
+                http_client=http_client
+            ))
+        logger.debug(f"Claude LLM instance created (model={llm.model}, temperature={temperature})")
         return llm
     except Exception as e:
         logger.error(f"Failed to create Claude LLM: {str(e)}")
-        raise
\ No newline at end of file
+        raise
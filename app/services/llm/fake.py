@@ -0,0 +1,162 @@
+"""Deterministic local stand-in for the Claude backend (load and latency testing)"""
+import asyncio
+import itertools
+import math
+import random
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.pydantic_v1 import PrivateAttr
+
+_VOCABULARY = (
+    "the market team product customers growth strategy build focus revenue "
+    "risk plan users feedback iterate scale capital runway hire measure "
+    "value pricing launch learn test signal retention channel cost"
+).split()
+
+
+class FakeLLMError(Exception):
+    """Injected upstream failure; carries an HTTP-like status code"""
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        self.status_code = status_code
+        self.retry_after = retry_after
+        super().__init__(f"Injected fake LLM error (status {status_code})")
+
+
+def sample(rng: random.Random, distribution: str, mean: float, stddev: float) -> float:
+    """Draw a non-negative sample with the given mean from a named distribution"""
+    if mean <= 0:
+        return 0.0
+    if distribution == "fixed" or stddev <= 0:
+        return mean
+    if distribution == "normal":
+        return max(0.0, rng.gauss(mean, stddev))
+    if distribution == "exponential":
+        return rng.expovariate(1.0 / mean)
+    if distribution == "lognormal":
+        sigma2 = math.log(1 + (stddev / mean) ** 2)
+        return rng.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+    raise ValueError(f"Unknown distribution: {distribution}")
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that fabricates replies locally with configurable latency.
+    
+    The reply is seeded from `seed` and the prompt, so the same prompt always
+    produces the same text. Timings and injected errors are drawn per call
+    (seeded from `seed` and the model's call count): a run is reproducible,
+    but a retried or hedged call can succeed where the first one failed.
+    """
+    
+    seed: int = 0
+    ttft_ms: float = 300.0
+    ttft_stddev_ms: float = 100.0
+    ttft_distribution: str = "lognormal"
+    tokens_per_second: float = 60.0
+    output_tokens: float = 80.0
+    output_tokens_stddev: float = 30.0
+    output_distribution: str = "normal"
+    error_rate: float = 0.0
+    error_status: int = 529
+    _calls: Any = PrivateAttr(default_factory=itertools.count)
+    
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+    
+    def _plan(self, messages: List[BaseMessage]):
+        """Decide (deterministically) the reply, this call's timings and whether it fails"""
+        prompt = "\x1e".join(str(m.content) for m in messages)
+        rng = random.Random(f"{self.seed}:{prompt}")
+        call_rng = random.Random(f"{self.seed}:call:{next(self._calls)}")
+        ttft = sample(call_rng, self.ttft_distribution, self.ttft_ms, self.ttft_stddev_ms) / 1000
+        failed = call_rng.random() < self.error_rate
+        length = max(1, int(round(sample(rng, self.output_distribution, self.output_tokens, self.output_tokens_stddev))))
+        tokens = [rng.choice(_VOCABULARY) for _ in range(length)]
+        tokens = [tokens[0]] + [f" {t}" for t in tokens[1:]]
+        input_tokens = len(prompt) // 4
+        return ttft, tokens, failed, input_tokens
+    
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+    
+    def _message(self, tokens: List[str], input_tokens: int) -> AIMessage:
+        return AIMessage(
+            content="".join(tokens),
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": len(tokens),
+                "total_tokens": input_tokens + len(tokens)
+            },
+            response_metadata={"usage": {"input_tokens": input_tokens, "output_tokens": len(tokens)}}
+        )
+    
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        ttft, tokens, failed, input_tokens = self._plan(messages)
+        time.sleep(ttft)
+        if failed:
+            raise FakeLLMError(self.error_status)
+        time.sleep(self._token_delay() * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=self._message(tokens, input_tokens))])
+    
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        ttft, tokens, failed, input_tokens = self._plan(messages)
+        await asyncio.sleep(ttft)
+        if failed:
+            raise FakeLLMError(self.error_status)
+        await asyncio.sleep(self._token_delay() * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=self._message(tokens, input_tokens))])
+    
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        ttft, tokens, failed, input_tokens = self._plan(messages)
+        time.sleep(ttft)
+        if failed:
+            raise FakeLLMError(self.error_status)
+        for index, token in enumerate(tokens):
+            if index:
+                time.sleep(self._token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+    
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        ttft, tokens, failed, input_tokens = self._plan(messages)
+        await asyncio.sleep(ttft)
+        if failed:
+            raise FakeLLMError(self.error_status)
+        for index, token in enumerate(tokens):
+            if index:
+                await asyncio.sleep(self._token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
@@ -0,0 +1,153 @@
+"""LLM admission control: concurrency cap, priority queue and 429/529-aware retries"""
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+from app.core.config import settings
+from app.core.exceptions import LLMException, LLMCapacityException
+from app.core.metrics import metrics
+from app.core.logging import logger
+
+T = TypeVar("T")
+
+# Lower value = served first
+PRIORITIES = {"interactive": 0, "batch": 10}
+
+# Rate limited / overloaded / transient upstream failures
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+def mark_not_retryable(exc: BaseException) -> BaseException:
+    """Flag an error as unsafe to retry (e.g. tokens were already streamed)"""
+    exc.llm_retryable = False
+    return exc
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None and getattr(exc, "response", None) is not None:
+        status = getattr(exc.response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Check whether an LLM error is worth retrying"""
+    if getattr(exc, "llm_retryable", True) is False:
+        return False
+    if _status_code(exc) in RETRYABLE_STATUS_CODES:
+        return True
+    # Connection failures / timeouts raised by the Anthropic SDK
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Get the server-requested delay (seconds) from a retry-after header, if any"""
+    explicit = getattr(exc, "retry_after", None)
+    if explicit is not None:
+        return float(explicit)
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMAdmissionController:
+    """
+    Caps in-flight LLM calls process-wide. Callers over the cap wait in a
+    priority queue (interactive before batch, FIFO within a priority), and
+    retryable failures are retried with jittered exponential backoff.
+    """
+    
+    def __init__(self):
+        self._in_flight = 0
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+    
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, future in self._queue if not future.done())
+    
+    def _report(self):
+        metrics.set_gauge("llm.in_flight", self._in_flight)
+        metrics.set_gauge("llm.queue_depth", self.queue_depth)
+    
+    async def _acquire(self, priority: str):
+        started = time.monotonic()
+        rank = PRIORITIES.get(priority, PRIORITIES["interactive"])
+        if self._in_flight < settings.LLM_MAX_CONCURRENCY and not self.queue_depth:
+            self._in_flight += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queue, (rank, next(self._sequence), future))
+            self._report()
+            try:
+                # A releasing caller hands its slot over by resolving the future
+                await asyncio.wait_for(asyncio.shield(future), timeout=settings.LLM_QUEUE_TIMEOUT)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if future.done() and not future.cancelled():
+                    self._release()  # slot was handed over as we gave up
+                else:
+                    future.cancel()
+                self._report()
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                metrics.increment("llm.rejected", reason="queue_timeout", priority=priority)
+                raise LLMCapacityException("LLM capacity exhausted, please retry shortly")
+        metrics.observe("llm.queue_wait_seconds", time.monotonic() - started, priority=priority)
+        self._report()
+    
+    def _release(self):
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                future.set_result(None)  # slot passes straight to the next waiter
+                self._report()
+                return
+        self._in_flight -= 1
+        self._report()
+    
+    async def run(self, call: Callable[[], Awaitable[T]], priority: str = "interactive") -> T:
+        """Run an LLM call under admission control, retrying retryable failures"""
+        attempt = 0
+        while True:
+            await self._acquire(priority)
+            try:
+                return await call()
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if attempt >= settings.LLM_MAX_RETRIES:
+                    metrics.increment("llm.retries_exhausted", status=_status_code(e))
+                    raise LLMException(f"LLM unavailable after {attempt + 1} attempts: {str(e)}") from e
+                delay = retry_after(e)
+                if delay is None:
+                    cap = min(settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * (2 ** attempt))
+                    delay = random.uniform(0, cap)
+                elif delay > settings.LLM_RETRY_MAX_DELAY:
+                    raise LLMException(f"LLM rate limited, retry after {delay:.0f}s") from e
+                attempt += 1
+                metrics.increment("llm.retries", status=_status_code(e))
+                logger.warning(f"LLM call failed ({str(e)}), retry {attempt}/{settings.LLM_MAX_RETRIES} in {delay:.2f}s")
+            finally:
+                self._release()
+            # Back off without holding a slot
+            await asyncio.sleep(delay)
+
+
+# Global admission controller
+llm_limiter = LLMAdmissionController()
@@ -0,0 +1,61 @@
+"""Anthropic prompt-caching helpers"""
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import BaseMessage, SystemMessage
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def _text_blocks(content: Any) -> List[Dict[str, Any]]:
+    """Normalize message content into a list of content blocks"""
+    if isinstance(content, str):
+        return [{"type": "text", "text": content}]
+    return [dict(block) if isinstance(block, dict) else {"type": "text", "text": str(block)} for block in content]
+
+
+def build_system_message(persona_prompt: str, summary: Optional[str], cache: bool) -> SystemMessage:
+    """
+    Build the system message for a persona turn.
+    
+    With caching on, the persona prompt (identical on every turn) and the running
+    summary (changes only on compaction) are separate cacheable blocks.
+    """
+    if not cache:
+        if summary:
+            return SystemMessage(content=f"{persona_prompt}\n\nSummary of the earlier conversation:\n{summary}")
+        return SystemMessage(content=persona_prompt)
+    
+    blocks = [{"type": "text", "text": persona_prompt, "cache_control": CACHE_CONTROL}]
+    if summary:
+        blocks.append({
+            "type": "text",
+            "text": f"Summary of the earlier conversation:\n{summary}",
+            "cache_control": CACHE_CONTROL
+        })
+    return SystemMessage(content=blocks)
+
+
+def mark_cache_breakpoint(message: BaseMessage) -> BaseMessage:
+    """
+    Return a copy of `message` whose last block is a cache breakpoint.
+    
+    Placed on the newest message, the prefix written to the cache this turn is
+    the stable prefix of the next turn's prompt.
+    """
+    blocks = _text_blocks(message.content)
+    if not blocks:
+        return message
+    blocks[-1]["cache_control"] = CACHE_CONTROL
+    return message.copy(update={"content": blocks})
+
+
+def extract_usage(response: Any) -> Dict[str, int]:
+    """Read input/output and cache read/write token counts from a model response"""
+    metadata = getattr(response, "response_metadata", None) or {}
+    usage = dict(metadata.get("usage") or {})
+    usage_metadata = getattr(response, "usage_metadata", None) or {}
+    return {
+        "input_tokens": usage.get("input_tokens", usage_metadata.get("input_tokens", 0)) or 0,
+        "output_tokens": usage.get("output_tokens", usage_metadata.get("output_tokens", 0)) or 0,
+        "cache_read_input_tokens": usage.get("cache_read_input_tokens") or 0,
+        "cache_creation_input_tokens": usage.get("cache_creation_input_tokens") or 0,
+    }
@@ -0,0 +1,31 @@
+"""LLM provider selection"""
+from typing import Optional
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from app.core.config import settings
+
+
+def create_llm(
+    temperature: float = 0.7,
+    model: Optional[str] = None,
+    http_client: Optional[httpx.AsyncClient] = None
+) -> BaseChatModel:
+    """Create a chat model for the configured LLM_PROVIDER ("anthropic" or "fake")"""
+    if settings.LLM_PROVIDER == "anthropic":
+        from app.services.llm.claude import create_claude_llm
+        return create_claude_llm(temperature=temperature, model=model, http_client=http_client)
+    if settings.LLM_PROVIDER == "fake":
+        from app.services.llm.fake import FakeChatModel
+        return FakeChatModel(
+            seed=settings.FAKE_LLM_SEED,
+            ttft_ms=settings.FAKE_LLM_TTFT_MS,
+            ttft_stddev_ms=settings.FAKE_LLM_TTFT_STDDEV_MS,
+            ttft_distribution=settings.FAKE_LLM_TTFT_DISTRIBUTION,
+            tokens_per_second=settings.FAKE_LLM_TOKENS_PER_SEC,
+            output_tokens=settings.FAKE_LLM_OUTPUT_TOKENS,
+            output_tokens_stddev=settings.FAKE_LLM_OUTPUT_TOKENS_STDDEV,
+            output_distribution=settings.FAKE_LLM_OUTPUT_DISTRIBUTION,
+            error_rate=settings.FAKE_LLM_ERROR_RATE,
+            error_status=settings.FAKE_LLM_ERROR_STATUS
+        )
+    raise ValueError(f"Unknown LLM_PROVIDER: {settings.LLM_PROVIDER}")
@@ -0,0 +1,89 @@
+"""Process-wide registry of long-lived LLM clients"""
+import asyncio
+from typing import Dict, Optional, Tuple
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from app.services.llm.provider import create_llm
+from app.core.config import settings
+from app.core.logging import logger
+
+ClientKey = Tuple[str, float, str]
+
+
+class LLMClientRegistry:
+    """
+    Holds one LLM client per (model, temperature, persona), all sharing a single
+    size-bounded HTTP connection pool so requests reuse warm keep-alive connections.
+    """
+    
+    def __init__(self):
+        self._clients: Dict[ClientKey, BaseChatModel] = {}
+        self._http_client: Optional[httpx.AsyncClient] = None
+    
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Get (or lazily create) the shared HTTP connection pool"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY
+                ),
+                timeout=settings.LLM_REQUEST_TIMEOUT
+            )
+        return self._http_client
+    
+    def get(
+        self,
+        persona: str,
+        temperature: Optional[float] = None,
+        model: Optional[str] = None
+    ) -> BaseChatModel:
+        """Get the client for a persona, creating it on first use"""
+        key = (
+            model or settings.LLM_MODEL,
+            settings.LLM_TEMPERATURE if temperature is None else temperature,
+            persona
+        )
+        llm = self._clients.get(key)
+        if llm is None:
+            llm = create_llm(
+                temperature=key[1],
+                model=key[0],
+                http_client=self._get_http_client()
+            )
+            self._clients[key] = llm
+            logger.info(f"Registered LLM client for persona {persona} (model={key[0]}, temperature={key[1]})")
+        return llm
+    
+    async def initialize(self, personas=()):
+        """Create clients for the known personas and warm up the connection pool"""
+        for persona in personas:
+            self.get(persona)
+        if settings.LLM_WARMUP:
+            await self._warm_up()
+        logger.info(f"LLM client registry initialized with {len(self._clients)} client(s)")
+    
+    async def _warm_up(self):
+        """Open a connection (DNS + TLS) to the API so the first request doesn't pay for it"""
+        llm = next(iter(self._clients.values()), None)
+        base_url = getattr(llm, "anthropic_api_url", None)
+        if not base_url:
+            return
+        try:
+            await asyncio.wait_for(self._get_http_client().head(base_url), timeout=5)
+            logger.info("LLM connection pool warmed up")
+        except Exception as e:
+            logger.warning(f"LLM connection warm-up failed: {str(e)}")
+    
+    async def close(self):
+        """Drop all clients and close the shared connection pool"""
+        self._clients.clear()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+            logger.info("LLM connection pool closed")
+
+
+# Global registry instance
+llm_registry = LLMClientRegistry()
@@ -0,0 +1,200 @@
+"""Circuit breaker and hedged requests for the LLM call path"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+from pydantic import BaseModel
+from app.services.llm.limiter import llm_limiter, is_retryable
+from app.core.config import settings
+from app.core.exceptions import LLMException, LLMCapacityException, CircuitOpenException
+from app.core.metrics import metrics
+from app.core.logging import logger
+
+T = TypeVar("T")
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class ResilienceConfig(BaseModel):
+    """Effective resilience settings for one persona"""
+    call_timeout: float
+    circuit_breaker_enabled: bool
+    failure_threshold: int
+    recovery_seconds: float
+    half_open_max_calls: int
+    hedging_enabled: bool
+    hedge_percentile: float
+    hedge_min_delay: float
+    hedge_min_samples: int
+
+
+def resilience_config(persona: str) -> ResilienceConfig:
+    """Global defaults merged with LLM_RESILIENCE_OVERRIDES[persona]"""
+    defaults = {
+        "call_timeout": settings.LLM_CALL_TIMEOUT,
+        "circuit_breaker_enabled": settings.CIRCUIT_BREAKER_ENABLED,
+        "failure_threshold": settings.CIRCUIT_FAILURE_THRESHOLD,
+        "recovery_seconds": settings.CIRCUIT_RECOVERY_SECONDS,
+        "half_open_max_calls": settings.CIRCUIT_HALF_OPEN_MAX_CALLS,
+        "hedging_enabled": settings.HEDGING_ENABLED,
+        "hedge_percentile": settings.HEDGE_PERCENTILE,
+        "hedge_min_delay": settings.HEDGE_MIN_DELAY,
+        "hedge_min_samples": settings.HEDGE_MIN_SAMPLES,
+    }
+    return ResilienceConfig(**{**defaults, **settings.LLM_RESILIENCE_OVERRIDES.get(persona, {})})
+
+
+def is_upstream_failure(exc: BaseException) -> bool:
+    """
+    Errors that say the upstream is unhealthy (vs. e.g. a bad request). Local
+    rejections (our own queue or breaker) say nothing about the provider.
+    """
+    if isinstance(exc, (LLMCapacityException, CircuitOpenException)):
+        return False
+    return isinstance(exc, (LLMException, asyncio.TimeoutError)) or is_retryable(exc)
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker: opens after `failure_threshold` consecutive
+    upstream failures, fails fast while open, then lets a limited number of
+    probe calls through (half-open) once `recovery_seconds` have passed.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+    
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"Circuit for {self.name}: {self.state} -> {state}")
+            if state == OPEN:
+                metrics.increment("llm.circuit_opened", persona=self.name)
+        self.state = state
+        metrics.set_gauge("llm.circuit_state", _STATE_GAUGE[state], persona=self.name)
+    
+    def before_call(self, config: ResilienceConfig):
+        """Admit a call or raise CircuitOpenException"""
+        if self.state == OPEN:
+            remaining = self.opened_at + config.recovery_seconds - time.monotonic()
+            if remaining > 0:
+                metrics.increment("llm.circuit_rejected", persona=self.name)
+                raise CircuitOpenException(self.name, remaining)
+            self._set_state(HALF_OPEN)
+            self.probes = 0
+        if self.state == HALF_OPEN:
+            if self.probes >= config.half_open_max_calls:
+                metrics.increment("llm.circuit_rejected", persona=self.name)
+                raise CircuitOpenException(self.name, config.recovery_seconds)
+            self.probes += 1
+    
+    def record_success(self):
+        self.failures = 0
+        self.probes = 0
+        self._set_state(CLOSED)
+    
+    def record_failure(self, config: ResilienceConfig):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= config.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.probes = 0
+            self._set_state(OPEN)
+    
+    def record_neutral(self):
+        """A call finished without telling us anything about upstream health"""
+        if self.state == HALF_OPEN:
+            self.probes = max(0, self.probes - 1)
+
+
+class ResilientLLMCaller:
+    """Wraps LLM calls with per-persona circuit breakers, timeouts and hedging"""
+    
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+    
+    def breaker(self, persona: str) -> CircuitBreaker:
+        if persona not in self._breakers:
+            self._breakers[persona] = CircuitBreaker(persona)
+        return self._breakers[persona]
+    
+    def _hedge_delay(self, persona: str, config: ResilienceConfig) -> Optional[float]:
+        """Delay before firing a backup request, from the persona's recent latency"""
+        if metrics.sample_count("llm.latency_seconds", persona=persona) < config.hedge_min_samples:
+            return None
+        percentile = metrics.percentile("llm.latency_seconds", config.hedge_percentile, persona=persona)
+        return max(config.hedge_min_delay, percentile or 0.0)
+    
+    async def call(
+        self,
+        persona: str,
+        factory: Callable[[], Awaitable[T]],
+        priority: str = "interactive",
+        allow_hedge: bool = True
+    ) -> T:
+        """
+        Run an LLM call for `persona` through the breaker and admission control.
+        
+        `allow_hedge` must be False for calls with side effects (e.g. streaming
+        tokens to a client), since a hedged call runs the factory twice.
+        """
+        config = resilience_config(persona)
+        breaker = self.breaker(persona) if config.circuit_breaker_enabled else None
+        if breaker:
+            breaker.before_call(config)
+        
+        async def attempt() -> T:
+            return await llm_limiter.run(
+                lambda: asyncio.wait_for(factory(), timeout=config.call_timeout),
+                priority=priority
+            )
+        
+        started = time.monotonic()
+        try:
+            delay = self._hedge_delay(persona, config) if (allow_hedge and config.hedging_enabled) else None
+            result = await (self._hedged(attempt, delay, persona) if delay is not None else attempt())
+        except Exception as e:
+            if breaker:
+                if is_upstream_failure(e):
+                    breaker.record_failure(config)
+                else:
+                    breaker.record_neutral()
+            if isinstance(e, asyncio.TimeoutError):
+                raise LLMException(f"LLM call timed out after {config.call_timeout:.0f}s") from e
+            raise
+        
+        metrics.observe("llm.latency_seconds", time.monotonic() - started, persona=persona)
+        if breaker:
+            breaker.record_success()
+        return result
+    
+    async def _hedged(self, attempt: Callable[[], Awaitable[T]], delay: float, persona: str) -> T:
+        """Start a second attempt if the first hasn't finished after `delay`; first success wins"""
+        primary = asyncio.ensure_future(attempt())
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        
+        metrics.increment("llm.hedges_fired", persona=persona)
+        backup = asyncio.ensure_future(attempt())
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        metrics.increment("llm.hedges_won", persona=persona, winner="backup" if task is backup else "primary")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in (primary, backup):
+                if not task.done():
+                    task.cancel()
+
+
+# Global resilient caller
+llm_caller = ResilientLLMCaller()
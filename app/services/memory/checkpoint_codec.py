@@ -0,0 +1,101 @@
+"""Versioned binary encoding for stored checkpoints"""
+import json
+import zlib
+from typing import Any, Mapping, Optional
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from app.core.config import settings
+from app.core.logging import logger
+
+try:
+    import zstandard
+except ImportError:  # optional; zlib is used instead
+    zstandard = None
+
+# Header of every encoded record: format version, compression, length of the
+# serde type tag; then the tag and the (possibly compressed) payload
+FORMAT_VERSION = 1
+_COMPRESSION_IDS = {"none": 0, "zlib": 1, "zstd": 2}
+_COMPRESSION_NAMES = {value: key for key, value in _COMPRESSION_IDS.items()}
+_DEFAULT_LEVELS = {"zlib": 1, "zstd": 3}
+
+
+class CheckpointCodec:
+    """
+    Encodes checkpoint storage records for the checkpoints.data column.
+    
+    Records are serialized with a LangGraph serde (msgpack with extension
+    types by default), so messages and other LangChain objects load back as
+    the objects that were saved. Payloads of at least `min_bytes` are
+    compressed when that makes them smaller. The header makes each row
+    self-describing: changing the settings never affects reading old rows.
+    """
+    
+    def __init__(
+        self,
+        serde: Optional[SerializerProtocol] = None,
+        compression: Optional[str] = None,
+        level: Optional[int] = None,
+        min_bytes: Optional[int] = None
+    ):
+        self.serde = serde or JsonPlusSerializer()
+        compression = compression or settings.CHECKPOINT_COMPRESSION
+        if compression not in _COMPRESSION_IDS:
+            raise ValueError(f"Unknown checkpoint compression: {compression!r}")
+        if compression == "zstd" and zstandard is None:
+            logger.warning("zstandard package not installed, compressing checkpoints with zlib")
+            compression = "zlib"
+        self.compression = compression
+        self.level = level if level is not None else settings.CHECKPOINT_COMPRESSION_LEVEL
+        if self.level is None:
+            # Checkpoints are written on every step: favour speed over ratio
+            self.level = _DEFAULT_LEVELS.get(compression)
+        self.min_bytes = min_bytes if min_bytes is not None else settings.CHECKPOINT_COMPRESSION_MIN_BYTES
+        self._zstd_compressor = None
+        if compression == "zstd":
+            self._zstd_compressor = zstandard.ZstdCompressor(level=self.level)
+    
+    def _compress(self, payload: bytes) -> bytes:
+        if self.compression == "zstd":
+            return self._zstd_compressor.compress(payload)
+        return zlib.compress(payload, self.level)
+    
+    def encode(self, record: Any) -> bytes:
+        """Serialize a storage record to its header-tagged binary form"""
+        type_tag, payload = self.serde.dumps_typed(record)
+        compression = "none"
+        if self.compression != "none" and len(payload) >= self.min_bytes:
+            compressed = self._compress(payload)
+            if len(compressed) < len(payload):
+                payload, compression = compressed, self.compression
+        tag = type_tag.encode()
+        return bytes((FORMAT_VERSION, _COMPRESSION_IDS[compression], len(tag))) + tag + payload
+    
+    def decode(self, data: bytes) -> Any:
+        """Inverse of encode, for any compression and this format version"""
+        data = bytes(data)
+        version, compression_id, tag_length = data[0], data[1], data[2]
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported checkpoint format version: {version}")
+        compression = _COMPRESSION_NAMES.get(compression_id)
+        type_tag = data[3:3 + tag_length].decode()
+        payload = data[3 + tag_length:]
+        if compression == "zlib":
+            payload = zlib.decompress(payload)
+        elif compression == "zstd":
+            if zstandard is None:
+                raise ValueError("Checkpoint is zstd-compressed but the zstandard package is not installed")
+            payload = zstandard.ZstdDecompressor().decompress(payload)
+        elif compression != "none":
+            raise ValueError(f"Unknown checkpoint compression id: {compression_id}")
+        return self.serde.loads_typed((type_tag, payload))
+    
+    def decode_row(self, row: Mapping[str, Any]) -> Any:
+        """Storage record of a checkpoints row: binary `data`, or legacy JSON `state`"""
+        if row["data"] is not None:
+            return self.decode(row["data"])
+        return json.loads(row["state"])
+
+
+# Global checkpoint codec instance (LangGraph's default serde)
+checkpoint_codec = CheckpointCodec()
@@ -0,0 +1,115 @@
+"""Checkpoint retention: batched deletion of checkpoints no longer needed"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from uuid import UUID, uuid4
+from app.database.adapter import db_adapter
+from app.database.queries import GET_THREAD_ID_RANGE, DELETE_EXPIRED_CHECKPOINTS
+from app.services.cache.adapter import cache_adapter
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.logging import logger
+
+GC_LOCK_KEY = "lock:checkpoint_gc"
+
+
+class CheckpointGC:
+    """
+    Deletes checkpoints outside the retention policy.
+    
+    Threads are walked in ID ranges; each DELETE removes at most
+    CHECKPOINT_GC_BATCH_SIZE rows in its own short transaction, with a pause
+    between batches, so chat traffic is never blocked for long. Runs are
+    serialized through a cache lock (shared across workers with Redis).
+    """
+    
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """Start periodic retention runs"""
+        if not settings.CHECKPOINT_GC_ENABLED or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Checkpoint GC scheduled every {settings.CHECKPOINT_GC_INTERVAL_SECONDS:g}s")
+    
+    async def close(self):
+        """Stop periodic runs (a batch in progress is rolled back)"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.CHECKPOINT_GC_INTERVAL_SECONDS)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Checkpoint GC failed: {str(e)}")
+    
+    async def run_once(
+        self,
+        keep_latest: Optional[int] = None,
+        max_age_hours: Optional[float] = None
+    ) -> Optional[dict]:
+        """
+        Apply the retention policy once. Returns the rows and bytes reclaimed,
+        or None if another run holds the lock.
+        """
+        keep_latest = max(1, keep_latest if keep_latest is not None else settings.CHECKPOINT_KEEP_LATEST)
+        max_age_hours = max_age_hours if max_age_hours is not None else settings.CHECKPOINT_MAX_AGE_HOURS
+        if max_age_hours > 0:
+            cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=max_age_hours)
+        else:
+            cutoff = datetime.max
+        
+        token = str(uuid4())
+        # Generous TTL: a crashed run releases the lock eventually
+        if not await cache_adapter.acquire_lock(GC_LOCK_KEY, token, int(settings.CHECKPOINT_GC_INTERVAL_SECONDS * 1000)):
+            logger.info("Checkpoint GC already running elsewhere, skipping")
+            return None
+        
+        started = time.monotonic()
+        report = {"rows": 0, "bytes": 0, "threads_scanned": 0, "batches": 0}
+        try:
+            lower = UUID(int=0)
+            while True:
+                threads = await db_adapter.fetch(GET_THREAD_ID_RANGE, lower, settings.CHECKPOINT_GC_THREADS_PER_SCAN)
+                if not threads:
+                    break
+                upper = threads[-1]["thread_id"]
+                report["threads_scanned"] += len(threads)
+                while True:
+                    deleted = await db_adapter.fetch(
+                        DELETE_EXPIRED_CHECKPOINTS, lower, upper, keep_latest, cutoff, settings.CHECKPOINT_GC_BATCH_SIZE
+                    )
+                    if deleted:
+                        report["batches"] += 1
+                        report["rows"] += len(deleted)
+                        report["bytes"] += sum(row["bytes"] or 0 for row in deleted)
+                        await asyncio.sleep(settings.CHECKPOINT_GC_BATCH_PAUSE_MS / 1000)
+                    if len(deleted) < settings.CHECKPOINT_GC_BATCH_SIZE:
+                        break
+                lower = upper
+        finally:
+            await cache_adapter.release_lock(GC_LOCK_KEY, token)
+            report["seconds"] = round(time.monotonic() - started, 3)
+            metrics.increment("checkpoint_gc.rows_deleted", report["rows"])
+            metrics.increment("checkpoint_gc.bytes_reclaimed", report["bytes"])
+            metrics.observe("checkpoint_gc.run_seconds", report["seconds"])
+        
+        logger.info(
+            f"Checkpoint GC deleted {report['rows']} checkpoints ({report['bytes']} bytes) "
+            f"across {report['threads_scanned']} threads in {report['seconds']}s"
+        )
+        return report
+
+
+# Global checkpoint GC instance
+checkpoint_gc = CheckpointGC()
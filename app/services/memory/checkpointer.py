@@ -1,19 +1,137 @@
 """Custom database checkpointer for LangGraph (supports SQLite and PostgreSQL)"""
 import json
+import weakref
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from uuid import uuid4, UUID
 from typing import Optional, Dict, Any, Sequence
 from langchain_core.runnables import RunnableConfig
 from langgraph.checkpoint.base import BaseCheckpointSaver, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.serde.base import SerializerProtocol
 from app.database.adapter import db_adapter
-from app.database.queries import CREATE_CHECKPOINT, GET_LATEST_CHECKPOINT
+from app.database.queries import CREATE_CHECKPOINT, GET_LATEST_CHECKPOINT, GET_CHECKPOINT_CHAIN
+from app.services.memory.checkpoint_codec import CheckpointCodec, checkpoint_codec
+from app.core.config import settings
+from app.core.metrics import metrics
 from app.core.logging import logger
 
+_last_timestamp = datetime.min
+
+# Checkpoint keys whose values are dicts diffed key by key in delta mode
+_NESTED_KEYS = ("channel_values", "channel_versions", "versions_seen")
+_MISSING = object()
+
+
+def _next_timestamp() -> datetime:
+    """
+    Current UTC time, strictly increasing within the process. A turn's
+    checkpoints commit in one transaction, where NOW() would tie them.
+    """
+    global _last_timestamp
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    _last_timestamp = max(now, _last_timestamp + timedelta(microseconds=1))
+    return _last_timestamp
+
+
+def diff_state(old: Dict[str, Any], new: Dict[str, Any], nested: Sequence[str] = _NESTED_KEYS) -> Dict[str, Any]:
+    """
+    What changed from `old` to `new` (both decoded checkpoints). Lists that
+    only grew (the message history) store just the appended items.
+    """
+    delta: Dict[str, Any] = {}
+    removed = [key for key in old if key not in new]
+    if removed:
+        delta["unset"] = removed
+    for key, value in new.items():
+        previous = old.get(key, _MISSING)
+        if previous == value:
+            continue
+        if key in nested and isinstance(previous, dict) and isinstance(value, dict):
+            delta.setdefault("nested", {})[key] = diff_state(previous, value, ())
+        elif (
+            isinstance(previous, list) and isinstance(value, list)
+            and len(value) > len(previous) and value[:len(previous)] == previous
+        ):
+            delta.setdefault("append", {})[key] = value[len(previous):]
+        else:
+            delta.setdefault("set", {})[key] = value
+    return delta
+
+
+def apply_delta(state: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of diff_state: a new dict, `state` is left untouched"""
+    result = dict(state)
+    for key in delta.get("unset", ()):
+        result.pop(key, None)
+    result.update(delta.get("set", {}))
+    for key, items in delta.get("append", {}).items():
+        result[key] = result.get(key, []) + items
+    for key, sub_delta in delta.get("nested", {}).items():
+        result[key] = apply_delta(result.get(key) or {}, sub_delta)
+    return result
+
+
+class _ChainHead:
+    """The newest committed checkpoint of a thread seen by this process, decoded"""
+
+    __slots__ = ("checkpoint_id", "base_id", "depth", "state", "metadata")
+
+    def __init__(self, checkpoint_id: UUID, base_id: UUID, depth: int, state: Dict[str, Any], metadata: Any = None):
+        self.checkpoint_id = checkpoint_id
+        self.base_id = base_id
+        self.depth = depth
+        self.state = state
+        self.metadata = metadata
+
+
+# Per-thread parent for the next delta, and the decoded state a load can reuse
+# while it is still the thread's latest row; shared by every checkpointer
+# instance (one is created per request); bounded LRU of decoded states
+_chain_heads: "OrderedDict[UUID, _ChainHead]" = OrderedDict()
+
+# Heads written inside a unit of work that hasn't committed yet: later steps of
+# the same turn may diff against them, since they commit (or fail) together
+_pending_heads: "weakref.WeakKeyDictionary[Any, Dict[UUID, _ChainHead]]" = weakref.WeakKeyDictionary()
+
+
+def _snapshot(checkpoint: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy of a checkpoint's containers, so later steps can't change a chain
+    head; values are replaced between steps, never mutated (as in LangGraph)
+    """
+    return {key: dict(value) if isinstance(value, dict) else value for key, value in checkpoint.items()}
+
+
+def _remember_head(thread_id: UUID, head: _ChainHead):
+    _chain_heads[thread_id] = head
+    _chain_heads.move_to_end(thread_id)
+    while len(_chain_heads) > settings.CHECKPOINT_DELTA_CACHE_THREADS:
+        _chain_heads.popitem(last=False)
+
+
 class DatabaseCheckpointer(BaseCheckpointSaver):
     """
     Database-based checkpointer for LangGraph state.
     Implements the async interface (aget_tuple, aput, aput_writes) required by LangGraph.
+
+    With CHECKPOINT_STORAGE_MODE="delta" a checkpoint is stored as the
+    difference from its parent, the thread's last committed checkpoint
+    (loaded at the start of the turn or written by this process). Deltas
+    carry their chain's base_id, so loading fetches one chain and replays
+    it; a thread with no known parent, or whose chain has reached
+    CHECKPOINT_DELTA_MAX_CHAIN, gets a full base snapshot instead.
+
+    Records are stored with CheckpointCodec (binary, optionally compressed)
+    unless CHECKPOINT_FORMAT="json"; rows of either format load. Decoding a
+    binary record revives every message object, so the last state of each
+    thread is kept decoded (CHECKPOINT_DELTA_CACHE_THREADS) and a load whose
+    latest row is that checkpoint skips the decode and the chain fetch.
     """
 
+    def __init__(self, *, serde: Optional[SerializerProtocol] = None, codec: Optional[CheckpointCodec] = None):
+        super().__init__(serde=serde)
+        self.codec = codec or (CheckpointCodec(self.serde) if serde is not None else checkpoint_codec)
+
     async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
         """Asynchronously retrieve a checkpoint tuple."""
         try:
@@ -27,16 +145,39 @@ class DatabaseCheckpointer(BaseCheckpointSaver):
                 logger.warning(f"Invalid UUID format for thread_id: {thread_id}")
                 return None
 
-            row = await db_adapter.fetchrow(GET_LATEST_CHECKPOINT, thread_uuid)
-            
-            if not row:
-                return None
+            # Always from the primary: the next step's write builds on this state,
+            # and another worker may have written the thread moments ago
+            with db_adapter.primary_reads():
+                row = await db_adapter.fetchrow(GET_LATEST_CHECKPOINT, thread_uuid)
+                if not row:
+                    _chain_heads.pop(thread_uuid, None)
+                    return None
+                checkpoint_id = UUID(str(row["checkpoint_id"]))
+                head = _chain_heads.get(thread_uuid)
+                if head is not None and head.checkpoint_id == checkpoint_id:
+                    metrics.increment("checkpoint.decode_cache_hits")
+                    _chain_heads.move_to_end(thread_uuid)
+                    return CheckpointTuple(
+                        config=config,
+                        checkpoint=head.state,
+                        metadata=head.metadata or {},
+                        parent_config=None,
+                        pending_writes=[]
+                    )
+                chain = None
+                if row["base_id"] is not None:
+                    chain = await db_adapter.fetch(GET_CHECKPOINT_CHAIN, thread_uuid, UUID(str(row["base_id"])))
 
             try:
-                saved_data = json.loads(row["state"])
+                saved_data = self.codec.decode_row(row)
+                if chain is not None:
+                    saved_data = self._replay(saved_data, chain)
             except json.JSONDecodeError:
                 logger.error(f"Failed to decode state JSON for thread {thread_id}")
                 return None
+            except KeyError as e:
+                logger.error(f"Incomplete checkpoint chain for thread {thread_id}: missing {str(e)}")
+                return None
 
             if isinstance(saved_data, dict) and "checkpoint" in saved_data and "metadata" in saved_data:
                 checkpoint = saved_data["checkpoint"]
@@ -45,6 +186,11 @@ class DatabaseCheckpointer(BaseCheckpointSaver):
                 checkpoint = saved_data
                 metadata = {}
 
+            # LangGraph copies a loaded checkpoint before changing it, so the
+            # same dict can serve as the parent of the next delta and be reused
+            base_id = UUID(str(row["base_id"])) if row["base_id"] is not None else checkpoint_id
+            _remember_head(thread_uuid, _ChainHead(checkpoint_id, base_id, saved_data.get("depth", 0), checkpoint, metadata))
+
             return CheckpointTuple(
                 config=config,
                 checkpoint=checkpoint,
@@ -57,6 +203,66 @@ class DatabaseCheckpointer(BaseCheckpointSaver):
             logger.error(f"Error loading checkpoint tuple: {str(e)}")
             return None
 
+    def _replay(self, saved_data: Dict[str, Any], chain: Sequence[Any]) -> Dict[str, Any]:
+        """Rebuild a delta record's full state from the rows of its chain"""
+        rows = {str(row["checkpoint_id"]): row for row in chain}
+        pending = []
+        while "delta" in saved_data:
+            pending.append(saved_data)
+            saved_data = self.codec.decode_row(rows[saved_data["parent_id"]])
+        checkpoint = saved_data["checkpoint"]
+        for record in reversed(pending):
+            checkpoint = apply_delta(checkpoint, record["delta"])
+        latest = pending[0]
+        return {"checkpoint": checkpoint, "metadata": latest.get("metadata", {}), "depth": latest["depth"]}
+
+    def _encode(
+        self,
+        thread_uuid: UUID,
+        checkpoint_id: UUID,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        unit_of_work: Any = None
+    ):
+        """Stored record (JSON state or binary data), base_id and chain head for a new checkpoint"""
+        delta_mode = settings.CHECKPOINT_STORAGE_MODE == "delta"
+        if settings.CHECKPOINT_FORMAT == "json":
+            if not delta_mode:
+                # JSON rows are cheap to load; not worth a round trip to cache
+                return self._serialize({"checkpoint": checkpoint, "metadata": metadata}), None, None
+            # Diff the JSON form, which is what gets stored and loaded back
+            state = json.loads(json.dumps(checkpoint, default=str))
+            metadata = json.loads(json.dumps(metadata, default=str))
+        else:
+            state = _snapshot(checkpoint)
+        if not delta_mode:
+            head = _ChainHead(checkpoint_id, checkpoint_id, 0, state, metadata)
+            return self._serialize({"checkpoint": checkpoint, "metadata": metadata}), None, head
+
+        parent = None
+        if unit_of_work is not None:
+            parent = _pending_heads.get(unit_of_work, {}).get(thread_uuid)
+        if parent is None:
+            parent = _chain_heads.get(thread_uuid)
+        if parent is None or parent.depth + 1 >= settings.CHECKPOINT_DELTA_MAX_CHAIN:
+            head = _ChainHead(checkpoint_id, checkpoint_id, 0, state, metadata)
+            return self._serialize({"checkpoint": state, "metadata": metadata}), None, head
+
+        head = _ChainHead(checkpoint_id, parent.base_id, parent.depth + 1, state, metadata)
+        record = {
+            "delta": diff_state(parent.state, state),
+            "parent_id": str(parent.checkpoint_id),
+            "depth": head.depth,
+            "metadata": metadata,
+        }
+        return self._serialize(record), parent.base_id, head
+
+    def _serialize(self, record: Dict[str, Any]):
+        """(state, data) column values for a storage record"""
+        if settings.CHECKPOINT_FORMAT == "json":
+            return json.dumps(record, default=str), None
+        return None, self.codec.encode(record)
+
     async def aput(
         self,
         config: RunnableConfig,
@@ -74,19 +280,33 @@ class DatabaseCheckpointer(BaseCheckpointSaver):
             thread_uuid = UUID(thread_id) if isinstance(thread_id, str) else thread_id
             checkpoint_id = uuid4()
 
-            storage_record = {
-                "checkpoint": checkpoint,
-                "metadata": metadata,
-            }
-            
-            state_json = json.dumps(storage_record, default=str)
+            unit_of_work = config["configurable"].get("unit_of_work")
+            (state_json, data), base_id, head = self._encode(thread_uuid, checkpoint_id, checkpoint, metadata, unit_of_work)
 
-            await db_adapter.execute_command(
-                CREATE_CHECKPOINT,
-                checkpoint_id,
-                thread_uuid,
-                state_json
-            )
+            # When the caller runs the turn as a unit of work, the write is
+            # buffered and committed with the rest of the turn. A new chain
+            # head is only shared beyond the turn once it has committed
+            created_at = _next_timestamp()
+            if unit_of_work is not None:
+                unit_of_work.add(CREATE_CHECKPOINT, checkpoint_id, thread_uuid, state_json, created_at, base_id, data)
+                if head is not None:
+                    _pending_heads.setdefault(unit_of_work, {})[thread_uuid] = head
+                    async def remember():
+                        _remember_head(thread_uuid, head)
+                    unit_of_work.on_commit(remember)
+            else:
+                await db_adapter.execute_command(
+                    CREATE_CHECKPOINT,
+                    checkpoint_id,
+                    thread_uuid,
+                    state_json,
+                    created_at,
+                    base_id,
+                    data
+                )
+                await db_adapter.mark_written(thread_uuid)
+                if head is not None:
+                    _remember_head(thread_uuid, head)
 
             logger.debug(f"Checkpoint saved for thread {thread_id}")
             
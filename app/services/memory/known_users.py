@@ -0,0 +1,68 @@
+"""Set of users already provisioned in the database"""
+import hashlib
+from collections import OrderedDict
+from typing import List
+from uuid import UUID
+from app.services.cache.adapter import cache_adapter
+from app.core.config import settings
+from app.core.metrics import metrics
+
+BLOOM_KEY = "known_users_bloom"
+
+
+def bloom_offsets(user_id: UUID, bits: int, hashes: int) -> List[int]:
+    """Bit positions for a user (double hashing over one SHA-256 digest)"""
+    digest = hashlib.sha256(user_id.bytes).digest()
+    h1 = int.from_bytes(digest[:8], "big")
+    h2 = int.from_bytes(digest[8:16], "big") | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+class KnownUsers:
+    """
+    Remembers which users exist so thread creation can skip provisioning.
+    
+    Each worker keeps a bounded LRU set. With USER_BLOOM_FILTER_ENABLED and a
+    Redis cache, workers also share a Bloom filter, so a user provisioned on
+    one worker is known to the others. A Bloom filter can report false
+    positives; callers must handle a missing user (FK violation) by
+    provisioning and retrying.
+    """
+    
+    def __init__(self):
+        self._local: "OrderedDict[UUID, None]" = OrderedDict()
+    
+    async def contains(self, user_id: UUID) -> bool:
+        if user_id in self._local:
+            self._local.move_to_end(user_id)
+            metrics.increment("known_users.hits", source="local")
+            return True
+        if settings.USER_BLOOM_FILTER_ENABLED and await cache_adapter.bloom_contains(
+            BLOOM_KEY, bloom_offsets(user_id, settings.USER_BLOOM_FILTER_BITS, settings.USER_BLOOM_FILTER_HASHES)
+        ):
+            self._remember(user_id)
+            metrics.increment("known_users.hits", source="bloom")
+            return True
+        metrics.increment("known_users.misses")
+        return False
+    
+    async def add(self, user_id: UUID):
+        self._remember(user_id)
+        if settings.USER_BLOOM_FILTER_ENABLED:
+            await cache_adapter.bloom_add(
+                BLOOM_KEY, bloom_offsets(user_id, settings.USER_BLOOM_FILTER_BITS, settings.USER_BLOOM_FILTER_HASHES)
+            )
+    
+    def discard(self, user_id: UUID):
+        """Forget a user locally (e.g. after a Bloom false positive)"""
+        self._local.pop(user_id, None)
+    
+    def _remember(self, user_id: UUID):
+        self._local[user_id] = None
+        self._local.move_to_end(user_id)
+        while len(self._local) > settings.KNOWN_USERS_MAX_ENTRIES:
+            self._local.popitem(last=False)
+
+
+# Global known-users instance
+known_users = KnownUsers()
@@ -0,0 +1,243 @@
+"""Write-behind persistence of chat messages and group commit of turns"""
+import asyncio
+import sqlite3
+import time
+import asyncpg
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional, Sequence, Tuple
+from uuid import UUID, uuid4
+from app.database.adapter import db_adapter, UnitOfWork
+from app.database.queries import CREATE_MESSAGES_PREFIX, CREATE_MESSAGES_COLUMNS
+from app.core.config import settings
+from app.core.exceptions import PoolTimeoutException
+from app.core.metrics import metrics
+from app.core.logging import logger
+
+# (message_id, thread_id, role, content, created_at)
+MessageRecord = Tuple[UUID, UUID, str, str, datetime]
+# The buffered writes of one turn's unit of work
+Commands = List[Tuple[Any, Sequence[Any]]]
+# A queued item: message rows to merge into multi-row INSERTs, a unit of
+# work's statements, and the future of a caller waiting for the commit
+QueueItem = Tuple[List[MessageRecord], Commands, Optional[asyncio.Future]]
+
+
+def build_insert(records: List[MessageRecord]) -> Tuple[str, list]:
+    """Build one multi-row INSERT for a batch of message records"""
+    groups, args = [], []
+    for i, record in enumerate(records):
+        base = i * CREATE_MESSAGES_COLUMNS
+        groups.append("(" + ", ".join(f"${base + j + 1}" for j in range(CREATE_MESSAGES_COLUMNS)) + ")")
+        message_id, thread_id, role, content, created_at = record
+        if db_adapter.db_type != "postgresql":
+            # Same layout as CURRENT_TIMESTAMP, so string ordering stays chronological
+            created_at = created_at.strftime("%Y-%m-%d %H:%M:%S.%f")
+        args.extend([message_id, thread_id, role, content, created_at])
+    return CREATE_MESSAGES_PREFIX + ", ".join(groups), args
+
+
+# Failures worth retrying: the same writes may well succeed a moment later
+_TRANSIENT_ERRORS = (
+    asyncpg.PostgresConnectionError,
+    asyncpg.TransactionRollbackError,  # serialization failure, deadlock
+    asyncpg.TooManyConnectionsError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.InterfaceError,
+    PoolTimeoutException,
+    asyncio.TimeoutError,
+    OSError,
+)
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether a failed write may succeed if retried (not e.g. an integrity error)"""
+    if isinstance(error, sqlite3.OperationalError):
+        message = str(error).lower()
+        return "locked" in message or "busy" in message
+    return isinstance(error, _TRANSIENT_ERRORS)
+
+
+def _item_size(item: QueueItem) -> int:
+    """Rows or statements an item adds to a flush"""
+    return len(item[0]) + len(item[1])
+
+
+class MessageWriter:
+    """
+    Queues chat writes and commits them in batches from a background task.
+    
+    With MESSAGE_WRITE_ACK="enqueue" a turn's messages are write-behind: the
+    response returns once they are queued, and they are flushed as multi-row
+    INSERTs when MESSAGE_FLUSH_MAX_BATCH rows are pending or
+    MESSAGE_FLUSH_INTERVAL_MS has passed (a crash can lose that window). The
+    turn's checkpoints still commit before the response, since the thread's
+    next turn, possibly on another worker, builds on them. With "flush" the
+    messages commit in the turn's unit of work and callers wait for it; turns
+    finishing while a commit is in flight share the next transaction.
+    """
+    
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    async def start(self):
+        """Start the background committer"""
+        if not settings.MESSAGE_WRITE_BEHIND_ENABLED or self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.MESSAGE_QUEUE_MAX_SIZE)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Message writer started (ack after {settings.MESSAGE_WRITE_ACK})")
+    
+    async def close(self):
+        """Commit everything still queued and stop the background committer"""
+        if not self.running:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Message writer stopped")
+    
+    async def flush(self):
+        """Wait until everything queued so far has been written"""
+        if self.running:
+            # An empty item with a waiting caller: its batch is committed without delay
+            await self._put(([], [], asyncio.get_running_loop().create_future()))
+    
+    @property
+    def _write_behind(self) -> bool:
+        return self.running and settings.MESSAGE_WRITE_ACK == "enqueue"
+    
+    async def save_turn(self, thread_id: str, user_message: str, response_text: str, uow: Optional[UnitOfWork] = None):
+        """
+        Persist the user message and assistant reply for a completed turn.
+        
+        Messages are queued when write-behind is on; otherwise, with `uow`,
+        they are added to it and commit together with the rest of the turn
+        (e.g. its checkpoints).
+        """
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        records = [
+            (uuid4(), UUID(thread_id), "user", user_message, now),
+            # Nudge the reply after the question so ordering by created_at is stable
+            (uuid4(), UUID(thread_id), "assistant", response_text, now + timedelta(microseconds=1)),
+        ]
+        if self._write_behind:
+            await self._put((records, [], None))
+            return
+        query, args = build_insert(records)
+        if uow is not None:
+            uow.add(query, *args)
+        elif self.running:
+            await self._put((records, [], asyncio.get_running_loop().create_future()))
+        else:
+            # Write-behind disabled (or not started, e.g. in scripts): write inline
+            await db_adapter.execute_command(query, *args)
+            await db_adapter.mark_written(thread_id)
+    
+    async def commit(self, uow: UnitOfWork):
+        """Commit a turn's unit of work, sharing the transaction with concurrent turns"""
+        if not self.running or self._write_behind:
+            # Only checkpoints are left in it: commit them right away
+            await uow.commit()
+            return
+        await uow.commit(self._enqueue)
+    
+    async def _enqueue(self, commands: Commands):
+        """Queue one turn's writes and wait until they are committed"""
+        await self._put(([], commands, asyncio.get_running_loop().create_future()))
+    
+    async def _put(self, item: QueueItem):
+        await self._queue.put(item)
+        metrics.set_gauge("message_writer.queue_depth", self._queue.qsize())
+        if item[2] is not None:
+            await item[2]
+    
+    async def _run(self):
+        """
+        Drain the queue in batches until cancelled. Write-behind rows wait up
+        to MESSAGE_FLUSH_INTERVAL_MS for company; once a caller is waiting,
+        whatever is already queued is committed straight away.
+        """
+        interval = settings.MESSAGE_FLUSH_INTERVAL_MS / 1000
+        while True:
+            batch = [await self._queue.get()]
+            size = _item_size(batch[0])
+            deadline = time.monotonic() + interval
+            while size < settings.MESSAGE_FLUSH_MAX_BATCH:
+                if not self._queue.empty():
+                    item = self._queue.get_nowait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or any(done is not None for _, _, done in batch):
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                batch.append(item)
+                size += _item_size(item)
+            
+            try:
+                await self._commit(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+                metrics.set_gauge("message_writer.queue_depth", self._queue.qsize())
+    
+    async def _commit(self, batch: List[QueueItem]):
+        """
+        Write a batch in one transaction. Transient failures are retried; any
+        other failure splits the batch at once, so only the offending turn fails.
+        """
+        records = [record for item, _, _ in batch for record in item]
+        commands = [command for _, turn, _ in batch for command in turn] + [
+            build_insert(records[i:i + settings.MESSAGE_FLUSH_MAX_BATCH])
+            for i in range(0, len(records), settings.MESSAGE_FLUSH_MAX_BATCH)
+        ]
+        started = time.monotonic()
+        error: Optional[Exception] = None
+        for attempt in range(settings.MESSAGE_FLUSH_MAX_ATTEMPTS if commands else 0):
+            try:
+                await db_adapter.execute_batch(commands)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                logger.warning(f"Message flush failed (attempt {attempt + 1}): {str(e)}")
+                if not is_transient(e) or attempt + 1 == settings.MESSAGE_FLUSH_MAX_ATTEMPTS:
+                    break
+                await asyncio.sleep(0.1 * 2 ** attempt)
+        
+        if error is not None and len(batch) > 1 and not is_transient(error):
+            # Don't let one bad turn (e.g. its thread was deleted) sink the whole batch
+            for item in batch:
+                await self._commit([item])
+            return
+        
+        if error is None:
+            for thread_id in {record[1] for record in records}:
+                await db_adapter.mark_written(thread_id)
+            metrics.observe("message_writer.flush_seconds", time.monotonic() - started)
+            metrics.increment("message_writer.rows_written", len(records))
+        elif records:
+            logger.error(f"Dropping {len(records)} message(s) after repeated flush failures: {str(error)}")
+            metrics.increment("message_writer.rows_dropped", len(records))
+        
+        for _, _, done in batch:
+            if done is not None and not done.done():
+                if error is None:
+                    done.set_result(None)
+                else:
+                    done.set_exception(error)
+
+
+# Global message writer instance
+message_writer = MessageWriter()
@@ -0,0 +1,46 @@
+"""Opaque keyset cursors for paginated history"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Generic, List, Optional, Tuple, TypeVar
+from uuid import UUID
+from app.database.adapter import db_adapter
+from app.core.exceptions import InvalidCursorException
+
+T = TypeVar("T")
+
+
+def encode_cursor(timestamp: Any, row_id: Any) -> str:
+    """Encode a (timestamp, id) sort key as an opaque URL-safe cursor"""
+    value = timestamp.isoformat() if isinstance(timestamp, datetime) else str(timestamp)
+    raw = json.dumps([value, str(row_id)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, UUID]:
+    """Decode a cursor back into query arguments for the keyset comparison"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, row_id = json.loads(raw)
+        row_id = UUID(row_id)
+        if db_adapter.db_type == "postgresql":
+            return datetime.fromisoformat(value), row_id
+        # SQLite compares the stored TEXT, so the value goes back exactly as read
+        return str(value), row_id
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidCursorException() from e
+
+
+class Page(Generic[T]):
+    """
+    One page of a keyset-paginated list.
+    
+    older_cursor / newer_cursor are set when more rows exist in that
+    direction; pass them back as `before` / `after` to fetch the next page.
+    """
+    
+    def __init__(self, items: List[T], older_cursor: Optional[str] = None, newer_cursor: Optional[str] = None):
+        self.items = items
+        self.older_cursor = older_cursor
+        self.newer_cursor = newer_cursor
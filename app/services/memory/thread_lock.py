@@ -0,0 +1,122 @@
+"""Per-thread request serialization (in-process, plus Redis when available)"""
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+from uuid import uuid4
+from app.services.cache.adapter import cache_adapter
+from app.core.config import settings
+from app.core.exceptions import ThreadBusyException
+from app.core.metrics import metrics
+from app.core.logging import logger
+
+
+class ThreadLockManager:
+    """
+    Ensures only one turn runs per thread at a time, so concurrent requests
+    can't both load the same checkpoint and overwrite each other's turn.
+    
+    Requests on the same worker queue on an asyncio.Lock. When the cache
+    backend is Redis, the holder also takes a Redis lock so workers on
+    other processes/hosts are serialized too. The Redis lock is renewed
+    every THREAD_LOCK_TTL/3 while held, so a long turn (retries, hedging,
+    a slow stream consumer) can't outlive it.
+    """
+    
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._waiters: Dict[str, int] = {}
+    
+    @asynccontextmanager
+    async def hold(self, thread_id: str):
+        """Hold the lock for a thread for the duration of the block"""
+        started = time.monotonic()
+        deadline = started + settings.THREAD_LOCK_WAIT_TIMEOUT
+        await self._acquire_local(thread_id, deadline)
+        try:
+            token = watchdog = None
+            if cache_adapter.cache_type == "redis":
+                token = await self._acquire_distributed(thread_id, deadline)
+                watchdog = asyncio.create_task(self._renew(thread_id, token))
+            metrics.observe("thread_lock.wait_seconds", time.monotonic() - started)
+            try:
+                yield
+            finally:
+                if token is not None:
+                    watchdog.cancel()
+                    await cache_adapter.release_lock(self._key(thread_id), token)
+        finally:
+            self._release_local(thread_id)
+    
+    @staticmethod
+    def _key(thread_id: str) -> str:
+        return f"thread_lock:{thread_id}"
+    
+    def _reject(self, thread_id: str, reason: str):
+        logger.warning(f"Rejecting request on busy thread {thread_id}: {reason}")
+        metrics.increment("thread_lock.rejected", reason=reason)
+        raise ThreadBusyException(thread_id)
+    
+    async def _acquire_local(self, thread_id: str, deadline: float):
+        lock = self._locks.setdefault(thread_id, asyncio.Lock())
+        if lock.locked():
+            if settings.THREAD_LOCK_POLICY == "reject":
+                self._reject(thread_id, "busy")
+            if self._waiters.get(thread_id, 0) >= settings.THREAD_LOCK_MAX_WAITERS:
+                self._reject(thread_id, "queue_full")
+        
+        self._waiters[thread_id] = self._waiters.get(thread_id, 0) + 1
+        try:
+            await asyncio.wait_for(lock.acquire(), timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            self._reject(thread_id, "timeout")
+        finally:
+            self._waiters[thread_id] -= 1
+            if not self._waiters[thread_id]:
+                del self._waiters[thread_id]
+            if not lock.locked() and thread_id not in self._waiters:
+                self._locks.pop(thread_id, None)
+    
+    def _release_local(self, thread_id: str):
+        lock = self._locks.get(thread_id)
+        if lock is None:
+            return
+        lock.release()
+        if thread_id not in self._waiters:
+            self._locks.pop(thread_id, None)
+    
+    async def _renew(self, thread_id: str, token: str):
+        """Keep extending a held distributed lock until cancelled"""
+        ttl_ms = int(settings.THREAD_LOCK_TTL * 1000)
+        while True:
+            await asyncio.sleep(settings.THREAD_LOCK_TTL / 3)
+            try:
+                extended = await cache_adapter.extend_lock(self._key(thread_id), token, ttl_ms)
+            except Exception as e:
+                logger.warning(f"Failed to renew lock for thread {thread_id}: {str(e)}")
+                continue
+            if not extended:
+                # Expired (e.g. Redis unreachable for a whole TTL); another worker may hold it now
+                logger.error(f"Lost distributed lock for thread {thread_id} mid-turn")
+                metrics.increment("thread_lock.lost")
+                return
+    
+    async def _acquire_distributed(self, thread_id: str, deadline: float) -> str:
+        token = uuid4().hex
+        ttl_ms = int(settings.THREAD_LOCK_TTL * 1000)
+        delay = 0.02
+        while True:
+            if await cache_adapter.acquire_lock(self._key(thread_id), token, ttl_ms):
+                return token
+            if settings.THREAD_LOCK_POLICY == "reject":
+                self._reject(thread_id, "busy")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._reject(thread_id, "timeout")
+            await asyncio.sleep(min(remaining, delay * random.uniform(0.5, 1.5)))
+            delay = min(delay * 2, 0.5)
+
+
+# Global thread lock manager
+thread_lock_manager = ThreadLockManager()
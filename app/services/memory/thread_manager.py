@@ -1,14 +1,24 @@
 """Thread CRUD operations"""
+import sqlite3
 from uuid import uuid4, UUID, uuid5, NAMESPACE_DNS
-from typing import List, Optional
-from datetime import datetime
-from app.database.adapter import db_adapter
+from typing import Iterable, List, Optional
+from datetime import datetime, timedelta, timezone
+from contextlib import nullcontext
+import asyncpg
+from app.database.adapter import db_adapter, Transaction
 from app.database.queries import (
-    CREATE_USER, GET_USER,
-    CREATE_THREAD, GET_THREAD, GET_USER_THREADS, UPDATE_THREAD_PERSONA,
-    CREATE_MESSAGE, GET_THREAD_MESSAGES
+    GET_USER, UPSERT_USER, PROVISION_USER,
+    CREATE_THREAD, THREAD_COLUMNS, GET_THREAD, GET_USER_THREADS, GET_USER_THREAD_BY_PERSONA, UPDATE_THREAD_PERSONA,
+    GET_USER_THREADS_NEWEST, GET_USER_THREADS_OLDER, GET_USER_THREADS_NEWER,
+    CREATE_MESSAGE, MESSAGE_COLUMNS, GET_THREAD_MESSAGES,
+    GET_THREAD_MESSAGES_NEWEST, GET_THREAD_MESSAGES_OLDER, GET_THREAD_MESSAGES_NEWER
 )
 from app.models.database import User, Thread, Message
+from app.services.cache.adapter import cache_adapter
+from app.services.memory.known_users import known_users
+from app.services.memory.pagination import Page, encode_cursor, decode_cursor
+from app.core.exceptions import InvalidCursorException
+from app.core.metrics import metrics
 from app.core.logging import logger
 from app.core.config import settings
 
@@ -49,43 +59,131 @@ def _normalize_user_id(user_id: str) -> UUID:
     return _to_uuid(user_id)
 
 
+def _persona_thread_key(user_id: UUID, persona: str) -> str:
+    """Cache key for the (user, persona) -> thread_id index"""
+    return f"thread_by_persona:{user_id}:{persona}"
+
+
+def _thread_key(thread_id: UUID) -> str:
+    """Cache key for thread metadata"""
+    return f"thread:{thread_id}"
+
+
+def _thread_to_cache(thread: Thread) -> dict:
+    """Serialize a Thread for cache_adapter (JSON-safe)"""
+    def _ts(value):
+        return value.isoformat() if isinstance(value, datetime) else value
+    return {
+        "thread_id": str(thread.thread_id),
+        "user_id": str(thread.user_id),
+        "persona": thread.persona,
+        "created_at": _ts(thread.created_at),
+        "updated_at": _ts(thread.updated_at)
+    }
+
+
+def _thread_from_cache(data: dict) -> Thread:
+    """Rebuild a Thread from its cached form"""
+    def _ts(value):
+        try:
+            return datetime.fromisoformat(value) if isinstance(value, str) else value
+        except ValueError:
+            return value
+    return Thread(
+        thread_id=UUID(data["thread_id"]),
+        user_id=UUID(data["user_id"]),
+        persona=data["persona"],
+        created_at=_ts(data["created_at"]),
+        updated_at=_ts(data["updated_at"])
+    )
+
+
+def _thread_from_row(row) -> Thread:
+    """Build a Thread model from a threads row"""
+    return Thread(
+        thread_id=_to_uuid(row["thread_id"]),
+        user_id=_to_uuid(row["user_id"]),
+        persona=row["persona"],
+        created_at=row["created_at"],
+        updated_at=row["updated_at"]
+    )
+
+
+def _message_from_row(row) -> Message:
+    """Build a Message model from a messages row"""
+    return Message(
+        message_id=_to_uuid(row["message_id"]),
+        thread_id=_to_uuid(row["thread_id"]),
+        role=row["role"],
+        content=row["content"],
+        created_at=row["created_at"]
+    )
+
+
+def _page_size(limit: Optional[int]) -> int:
+    """Requested page size, defaulted and capped"""
+    return max(1, min(limit or settings.CHAT_HISTORY_PAGE_SIZE, settings.CHAT_HISTORY_MAX_PAGE_SIZE))
+
+
+async def _keyset_page(newest, older, newer, scope: tuple, limit: int, before: Optional[str], after: Optional[str]):
+    """
+    Fetch one keyset page (limit + 1 rows, to see whether more exist).
+    
+    Returns (rows newest first, more_older, more_newer).
+    """
+    if before and after:
+        raise InvalidCursorException("Pass either before or after, not both")
+    if after:
+        rows = await db_adapter.fetch(newer, *scope, *decode_cursor(after), limit + 1)
+        return list(reversed(rows[:limit])), True, len(rows) > limit
+    if before:
+        rows = await db_adapter.fetch(older, *scope, *decode_cursor(before), limit + 1)
+        return rows[:limit], len(rows) > limit, True
+    rows = await db_adapter.fetch(newest, *scope, limit + 1)
+    return rows[:limit], len(rows) > limit, False
+
+
+def _cursors(rows, more_older: bool, more_newer: bool, key) -> dict:
+    """older/newer cursors for a page of rows (newest first)"""
+    return {
+        "older_cursor": encode_cursor(*key(rows[-1])) if rows and more_older else None,
+        "newer_cursor": encode_cursor(*key(rows[0])) if rows and more_newer else None
+    }
+
+
+async def _after_commit(tx: Optional[Transaction], callback):
+    """Run `callback` now, or only once `tx` has committed"""
+    if tx is None:
+        await callback()
+    else:
+        tx.on_commit(callback)
+
+
 class ThreadManager:
     """Manages thread and message operations"""
     
-    async def create_user(self, user_id: str) -> User:
+    async def create_user(self, user_id: str, tx: Optional[Transaction] = None) -> User:
         """Create a new user if not exists"""
+        db = tx or db_adapter
         try:
             # Normalize user_id to UUID (handles non-UUID strings like "user_123")
             normalized_user_id = _normalize_user_id(user_id)
             
-            # Try to get user first (check if exists)
-            row = await db_adapter.fetchrow(GET_USER, normalized_user_id)
-            if row:
-                # User already exists, return it
-                return User(
-                    user_id=_to_uuid(row["user_id"]),
-                    created_at=row["created_at"]
-                )
-            
-            # User doesn't exist, create it
-            # Note: For SQLite, ON CONFLICT DO NOTHING with RETURNING returns no rows on conflict
-            # So we try to insert, and if it returns None, we fetch the user
-            row = await db_adapter.fetchrow(CREATE_USER, normalized_user_id)
-            
-            if row:
-                # User was created successfully
-                return User(
-                    user_id=_to_uuid(row["user_id"]),
-                    created_at=row["created_at"]
-                )
-            
-            # INSERT returned None (ON CONFLICT DO NOTHING in SQLite doesn't return rows)
-            # This means user was created but RETURNING didn't work, or there was a race condition
-            # Fetch the user to verify it exists
-            row = await db_adapter.fetchrow(GET_USER, normalized_user_id)
+            if db_adapter.db_type == "postgresql":
+                # One round trip: insert if missing, return the row either way
+                row = await db.fetchrow(UPSERT_USER, normalized_user_id)
+            else:
+                # Read first: existing users shouldn't queue for SQLite's single writer
+                row = await db.fetchrow(GET_USER, normalized_user_id)
+                if not row:
+                    row = await db.fetchrow(UPSERT_USER, normalized_user_id)
+            if not row:
+                # Lost a race with a concurrent insert that committed after our snapshot
+                row = await db.fetchrow(GET_USER, normalized_user_id)
             if not row:
                 raise ValueError(f"Failed to create user: {user_id} (user not found after creation attempt)")
             
+            await _after_commit(tx, lambda: known_users.add(normalized_user_id))
             return User(
                 user_id=_to_uuid(row["user_id"]),
                 created_at=row["created_at"]
@@ -94,56 +192,86 @@ class ThreadManager:
             logger.error(f"Error creating user: {str(e)}")
             raise
     
-    async def create_thread(self, user_id: str, persona: str) -> Thread:
+    async def ensure_user(self, user_id: str, tx: Optional[Transaction] = None) -> UUID:
+        """Make sure a user exists, skipping the DB for users already provisioned"""
+        normalized_user_id = _normalize_user_id(user_id)
+        if await known_users.contains(normalized_user_id):
+            return normalized_user_id
+        user = await self.create_user(user_id, tx=tx)
+        return user.user_id
+    
+    async def create_thread(self, user_id: str, persona: str, tx: Optional[Transaction] = None) -> Thread:
         """Create a new thread"""
+        db = tx or db_adapter
         try:
-            # Ensure user exists first (this will create it if needed)
-            user = await self.create_user(user_id)
-            
-            # Use the normalized user_id from the created user object to ensure consistency
-            normalized_user_id = user.user_id  # This is already a UUID object
+            # Ensure user exists first (free for users we've already provisioned)
+            normalized_user_id = await self.ensure_user(user_id, tx=tx)
             
             logger.debug(f"Creating thread for user_id: {normalized_user_id}, persona: {persona}")
             
             thread_id = uuid4()
-            row = await db_adapter.fetchrow(
-                CREATE_THREAD,
-                thread_id,
-                normalized_user_id,  # Use UUID object directly
-                persona
-            )
+            try:
+                # Savepoint so a failed INSERT doesn't abort the caller's transaction (PostgreSQL)
+                async with (tx.savepoint() if tx else nullcontext()):
+                    row = await db.fetchrow(CREATE_THREAD, thread_id, normalized_user_id, persona)
+            except (asyncpg.ForeignKeyViolationError, sqlite3.IntegrityError):
+                # The known-users set was wrong (Bloom false positive, or the user
+                # was deleted): provision for real and retry once
+                known_users.discard(normalized_user_id)
+                await self.create_user(user_id, tx=tx)
+                row = await db.fetchrow(CREATE_THREAD, thread_id, normalized_user_id, persona)
             
             if not row:
                 raise ValueError(f"Failed to create thread: no row returned")
             
-            return Thread(
-                thread_id=_to_uuid(row["thread_id"]),
-                user_id=_to_uuid(row["user_id"]),
-                persona=row["persona"],
-                created_at=row["created_at"],
-                updated_at=row["updated_at"]
-            )
+            thread = _thread_from_row(row)
+            await db_adapter.mark_written(thread.thread_id)
+            
+            async def update_cache():
+                await self._cache_thread(thread)
+                # The new thread is now the most recent one for this persona
+                await cache_adapter.set(
+                    _persona_thread_key(thread.user_id, persona),
+                    str(thread.thread_id),
+                    ttl=settings.THREAD_CACHE_TTL
+                )
+            
+            await _after_commit(tx, update_cache)
+            return thread
         except Exception as e:
             logger.error(f"Error creating thread: {str(e)}")
             raise
     
     async def get_thread(self, thread_id: str) -> Thread:
-        """Get thread by ID"""
+        """Get thread by ID (served from the thread metadata cache when possible)"""
         try:
-            row = await db_adapter.fetchrow(GET_THREAD, UUID(thread_id))
+            key = _thread_key(UUID(thread_id))
+            cached = await cache_adapter.get(key)
+            if cached is not None:
+                if cached.get("missing"):
+                    metrics.increment("thread_cache.negative_hits")
+                    raise ValueError(f"Thread {thread_id} not found")
+                metrics.increment("thread_cache.hits")
+                return _thread_from_cache(cached)
+            
+            metrics.increment("thread_cache.misses")
+            with db_adapter.thread_scope(thread_id):
+                row = await db_adapter.fetchrow(GET_THREAD, UUID(thread_id))
             if not row:
+                # Remember unknown IDs briefly so bad/stale thread_ids don't hit the DB every time
+                await cache_adapter.set(key, {"missing": True}, ttl=settings.THREAD_CACHE_NEGATIVE_TTL)
                 raise ValueError(f"Thread {thread_id} not found")
-            return Thread(
-                thread_id=_to_uuid(row["thread_id"]),
-                user_id=_to_uuid(row["user_id"]),
-                persona=row["persona"],
-                created_at=row["created_at"],
-                updated_at=row["updated_at"]
-            )
+            thread = _thread_from_row(row)
+            await self._cache_thread(thread)
+            return thread
         except Exception as e:
             logger.error(f"Error getting thread: {str(e)}")
             raise
     
+    async def _cache_thread(self, thread: Thread):
+        """Write-through: store the current metadata for a thread"""
+        await cache_adapter.set(_thread_key(thread.thread_id), _thread_to_cache(thread), ttl=settings.THREAD_CACHE_TTL)
+    
     async def get_user_threads(self, user_id: str) -> List[Thread]:
         """Get all threads for a user"""
         try:
@@ -164,36 +292,91 @@ class ThreadManager:
             logger.error(f"Error getting user threads: {str(e)}")
             raise
     
-    async def update_thread_persona(self, thread_id: str, persona: str) -> Thread:
+    async def get_user_threads_page(
+        self,
+        user_id: str,
+        limit: Optional[int] = None,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Page[Thread]:
+        """Get one page of a user's threads, most recently updated first"""
+        try:
+            normalized_user_id = _normalize_user_id(user_id)
+            rows, more_older, more_newer = await _keyset_page(
+                GET_USER_THREADS_NEWEST, GET_USER_THREADS_OLDER, GET_USER_THREADS_NEWER,
+                (normalized_user_id,), _page_size(limit), before, after
+            )
+            return Page(
+                [_thread_from_row(row) for row in rows],
+                **_cursors(rows, more_older, more_newer, lambda row: (row["updated_at"], row["thread_id"]))
+            )
+        except Exception as e:
+            logger.error(f"Error getting user threads page: {str(e)}")
+            raise
+    
+    async def get_thread_for_persona(self, user_id: str, persona: str) -> Optional[Thread]:
+        """Get the user's most recent thread for a persona, if any"""
+        try:
+            normalized_user_id = _normalize_user_id(user_id)
+            key = _persona_thread_key(normalized_user_id, persona)
+            cached = await cache_adapter.get(key)
+            if cached == "":
+                # Negative entry: no thread for this persona yet
+                return None
+            if cached:
+                try:
+                    return await self.get_thread(cached)
+                except ValueError:
+                    # Thread was deleted behind the cache; fall through to the DB
+                    await cache_adapter.delete(key)
+            
+            row = await db_adapter.fetchrow(GET_USER_THREAD_BY_PERSONA, normalized_user_id, persona)
+            thread = _thread_from_row(row) if row else None
+            await cache_adapter.set(key, str(thread.thread_id) if thread else "", ttl=settings.THREAD_CACHE_TTL)
+            return thread
+        except Exception as e:
+            logger.error(f"Error getting thread for persona: {str(e)}")
+            raise
+    
+    async def update_thread_persona(self, thread_id: str, persona: str, tx: Optional[Transaction] = None) -> Thread:
         """Update thread persona"""
+        db = tx or db_adapter
         try:
-            row = await db_adapter.fetchrow(
+            previous = await db.fetchrow(GET_THREAD, UUID(thread_id))
+            row = await db.fetchrow(
                 UPDATE_THREAD_PERSONA,
                 persona,
                 UUID(thread_id)
             )
-            return Thread(
-                thread_id=_to_uuid(row["thread_id"]),
-                user_id=_to_uuid(row["user_id"]),
-                persona=row["persona"],
-                created_at=row["created_at"],
-                updated_at=row["updated_at"]
-            )
+            thread = _thread_from_row(row)
+            await db_adapter.mark_written(thread.thread_id)
+            
+            async def update_cache():
+                await self._cache_thread(thread)
+                # Both the old and the new persona may now resolve to a different thread
+                await cache_adapter.delete(_persona_thread_key(thread.user_id, persona))
+                if previous:
+                    await cache_adapter.delete(_persona_thread_key(thread.user_id, previous["persona"]))
+            
+            await _after_commit(tx, update_cache)
+            return thread
         except Exception as e:
             logger.error(f"Error updating thread persona: {str(e)}")
             raise
     
-    async def save_message(self, thread_id: str, role: str, content: str) -> Message:
+    async def save_message(self, thread_id: str, role: str, content: str, tx: Optional[Transaction] = None) -> Message:
         """Save a message to the database"""
+        db = tx or db_adapter
         try:
             message_id = uuid4()
-            row = await db_adapter.fetchrow(
+            row = await db.fetchrow(
                 CREATE_MESSAGE,
                 message_id,
                 UUID(thread_id),
                 role,
                 content
             )
+            await db_adapter.mark_written(thread_id)
             return Message(
                 message_id=_to_uuid(row["message_id"]),
                 thread_id=_to_uuid(row["thread_id"]),
@@ -205,21 +388,114 @@ class ThreadManager:
             logger.error(f"Error saving message: {str(e)}")
             raise
     
+    async def create_threads_bulk(self, threads: Iterable[dict], tx: Optional[Transaction] = None) -> List[Thread]:
+        """
+        Create many threads in one transaction, provisioning their users.
+        
+        Each item has user_id and persona, and optionally thread_id,
+        created_at and updated_at (e.g. when importing an archive).
+        """
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        created = [
+            Thread(
+                thread_id=_to_uuid(item["thread_id"]) if item.get("thread_id") else uuid4(),
+                user_id=_normalize_user_id(item["user_id"]),
+                persona=item["persona"],
+                created_at=item.get("created_at") or now,
+                updated_at=item.get("updated_at") or item.get("created_at") or now
+            )
+            for item in threads
+        ]
+        if not created:
+            return []
+        user_ids = list(dict.fromkeys(thread.user_id for thread in created))
+        try:
+            async with (nullcontext(tx) if tx else db_adapter.transaction()) as tx:
+                # Provision every user rather than trusting known_users: a stale
+                # entry would fail the whole COPY on its foreign key
+                await tx.execute_many(PROVISION_USER, [(user_id,) for user_id in user_ids])
+                await tx.copy_records("threads", THREAD_COLUMNS, [
+                    (thread.thread_id, thread.user_id, thread.persona, thread.created_at, thread.updated_at)
+                    for thread in created
+                ])
+                
+                async def update_cache():
+                    for user_id in user_ids:
+                        await known_users.add(user_id)
+                    # New threads may change which thread a (user, persona) resolves to
+                    for user_id, persona in dict.fromkeys((t.user_id, t.persona) for t in created):
+                        await cache_adapter.delete(_persona_thread_key(user_id, persona))
+                    # Imported thread_ids may have been looked up (and cached as missing) before
+                    for thread in created:
+                        await cache_adapter.delete(_thread_key(thread.thread_id))
+                
+                tx.on_commit(update_cache)
+            return created
+        except Exception as e:
+            logger.error(f"Error creating threads in bulk: {str(e)}")
+            raise
+    
+    async def save_messages_bulk(self, messages: Iterable[dict], tx: Optional[Transaction] = None) -> int:
+        """
+        Save many messages in one transaction and return how many were written.
+        
+        Each item has thread_id, role and content, and optionally message_id
+        and created_at. Items without created_at are stamped a microsecond
+        apart, so they keep their order within a thread.
+        """
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        records = [
+            (
+                _to_uuid(item["message_id"]) if item.get("message_id") else uuid4(),
+                _to_uuid(item["thread_id"]),
+                item["role"],
+                item["content"],
+                item.get("created_at") or now + timedelta(microseconds=i)
+            )
+            for i, item in enumerate(messages)
+        ]
+        if not records:
+            return 0
+        try:
+            if tx is not None:
+                return await tx.copy_records("messages", MESSAGE_COLUMNS, records)
+            return await db_adapter.copy_records("messages", MESSAGE_COLUMNS, records)
+        except Exception as e:
+            logger.error(f"Error saving messages in bulk: {str(e)}")
+            raise
+    
     async def get_thread_messages(self, thread_id: str) -> List[Message]:
         """Get all messages for a thread"""
         try:
-            rows = await db_adapter.fetch(GET_THREAD_MESSAGES, UUID(thread_id))
-            return [
-                Message(
-                    message_id=_to_uuid(row["message_id"]),
-                    thread_id=_to_uuid(row["thread_id"]),
-                    role=row["role"],
-                    content=row["content"],
-                    created_at=row["created_at"]
-                )
-                for row in rows
-            ]
+            with db_adapter.thread_scope(thread_id):
+                rows = await db_adapter.fetch(GET_THREAD_MESSAGES, UUID(thread_id))
+            return [_message_from_row(row) for row in rows]
         except Exception as e:
             logger.error(f"Error getting thread messages: {str(e)}")
             raise
+    
+    async def get_thread_messages_page(
+        self,
+        thread_id: str,
+        limit: Optional[int] = None,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Page[Message]:
+        """
+        Get one page of a thread's messages in chronological order: the
+        latest messages by default, or those before/after a cursor.
+        """
+        try:
+            with db_adapter.thread_scope(thread_id):
+                rows, more_older, more_newer = await _keyset_page(
+                    GET_THREAD_MESSAGES_NEWEST, GET_THREAD_MESSAGES_OLDER, GET_THREAD_MESSAGES_NEWER,
+                    (UUID(thread_id),), _page_size(limit), before, after
+                )
+            return Page(
+                [_message_from_row(row) for row in reversed(rows)],
+                **_cursors(rows, more_older, more_newer, lambda row: (row["created_at"], row["message_id"]))
+            )
+        except Exception as e:
+            logger.error(f"Error getting thread messages page: {str(e)}")
+            raise
 
@@ -39,6 +39,8 @@ export interface Thread {
 export interface ChatHistoryResponse {
   threads: Thread[];
   messages: Message[];
+  older_cursor?: string | null;
+  newer_cursor?: string | null;
 }
 
 export interface HealthResponse {
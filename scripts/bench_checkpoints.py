@@ -0,0 +1,69 @@
+"""Microbenchmark: bytes per checkpoint and encode/decode time (legacy JSON vs. binary codec)"""
+import json
+import random
+import timeit
+from langchain_core.messages import AIMessage, HumanMessage
+from app.services.memory.checkpoint_codec import CheckpointCodec, zstandard
+
+WORDS = (
+    "runway pricing growth customers retention capital market risk focus build test learn measure "
+    "channel cost value feedback launch users signal iterate hire revenue margin churn cohort"
+).split()
+
+
+def text(rng: random.Random, words: int) -> str:
+    """Chat-like text; repeated phrases would overstate compression"""
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def make_record(turns: int) -> dict:
+    """A storage record shaped like the agent's: message history plus channel bookkeeping"""
+    rng = random.Random(turns)
+    messages = []
+    for turn in range(turns):
+        messages.append(HumanMessage(content=text(rng, 15)))
+        messages.append(AIMessage(
+            content=text(rng, 80),
+            response_metadata={"model": "claude", "stop_reason": "end_turn"},
+            usage_metadata={"input_tokens": 300 + turn, "output_tokens": 80, "total_tokens": 380 + turn}
+        ))
+    checkpoint = {
+        "v": 3,
+        "id": "1f0b7e2c-0000-6000-8000-000000000000",
+        "ts": "2026-01-01T00:00:00+00:00",
+        "channel_values": {
+            "messages": messages,
+            "current_persona": "mentor",
+            "thread_id": "0b7e2c3a-1111-4222-8333-444455556666",
+            "user_id": "bench-user",
+            "metadata": {"priority": "interactive", "response_cache_hit": False},
+        },
+        "channel_versions": {"messages": f"{turns:032}.0.1", "current_persona": f"{turns:032}.0.2"},
+        "versions_seen": {"execute_persona": {"messages": f"{turns:032}.0.1"}},
+        "pending_sends": [],
+    }
+    return {"checkpoint": checkpoint, "metadata": {"source": "loop", "step": turns * 5}}
+
+
+def main():
+    codecs = [("binary", CheckpointCodec(compression="none")), ("binary+zlib", CheckpointCodec(compression="zlib"))]
+    if zstandard is not None:
+        codecs.append(("binary+zstd", CheckpointCodec(compression="zstd")))
+    number = 200
+    print(f"{'turns':>6}  {'format':<13}{'bytes':>10}{'encode':>12}{'decode':>12}")
+    for turns in (5, 50, 200):
+        record = make_record(turns)
+        encoded = json.dumps(record, default=str)
+        encode = min(timeit.repeat(lambda: json.dumps(record, default=str), number=number, repeat=3)) / number
+        decode = min(timeit.repeat(lambda: json.loads(encoded), number=number, repeat=3)) / number
+        print(f"{turns:>6}  {'json (lossy)':<13}{len(encoded.encode()):>10}{encode * 1e6:>10.0f}us{decode * 1e6:>10.0f}us")
+        for name, codec in codecs:
+            data = codec.encode(record)
+            assert codec.decode(data) == record
+            encode = min(timeit.repeat(lambda: codec.encode(record), number=number, repeat=3)) / number
+            decode = min(timeit.repeat(lambda: codec.decode(data), number=number, repeat=3)) / number
+            print(f"{turns:>6}  {name:<13}{len(data):>10}{encode * 1e6:>10.0f}us{decode * 1e6:>10.0f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Microbenchmark: per-query SQL preparation overhead (legacy vs. precompiled statements)"""
+import re
+import timeit
+from uuid import uuid4
+from app.database.adapter import DatabaseAdapter
+from app.database.queries import GET_THREAD, CREATE_THREAD, UPSERT_USER
+
+
+def legacy_prepare(query: str, args):
+    """What the adapter used to do on every SQLite call"""
+    sqlite_query = query
+    sqlite_query = sqlite_query.replace("NOW()", "CURRENT_TIMESTAMP")
+    sqlite_query = sqlite_query.replace("::jsonb", "")
+    param_matches = list(re.finditer(r'\$(\d+)', sqlite_query))
+    if param_matches:
+        for match in reversed(param_matches):
+            sqlite_query = sqlite_query[:match.start()] + "?" + sqlite_query[match.end():]
+    sqlite_args = [str(arg) for arg in args]
+    query_upper = sqlite_query.strip().upper()
+    is_write = any(query_upper.startswith(cmd) for cmd in ('INSERT', 'UPDATE', 'DELETE'))
+    return sqlite_query, sqlite_args, is_write
+
+
+def main():
+    adapter = DatabaseAdapter()
+    adapter.db_type = "sqlite"
+    number = 100000
+    print(f"{'statement':<14}{'legacy':>12}{'precompiled':>14}{'speedup':>10}")
+    for statement, args in [
+        (GET_THREAD, (uuid4(),)),
+        (CREATE_THREAD, (uuid4(), uuid4(), "mentor")),
+        (UPSERT_USER, (uuid4(),)),
+    ]:
+        raw = statement.sqlite if statement is UPSERT_USER else statement.postgresql
+        legacy = min(timeit.repeat(lambda: legacy_prepare(raw, args), number=number, repeat=3)) / number
+        current = min(timeit.repeat(lambda: adapter._prepare(statement, args), number=number, repeat=3)) / number
+        print(f"{statement.name:<14}{legacy * 1e6:>10.2f}us{current * 1e6:>12.2f}us{legacy / current:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
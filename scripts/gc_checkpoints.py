@@ -0,0 +1,41 @@
+"""Apply the checkpoint retention policy once and report what was reclaimed
+
+Usage: python scripts/gc_checkpoints.py [--keep-latest N] [--max-age-hours T]
+       (defaults come from CHECKPOINT_KEEP_LATEST / CHECKPOINT_MAX_AGE_HOURS)
+"""
+import argparse
+import asyncio
+from app.database.connection import create_pool, close_pool
+from app.services.cache.adapter import cache_adapter
+from app.services.memory.checkpoint_gc import checkpoint_gc
+from app.core.logging import logger
+
+
+async def main():
+    """Main GC function"""
+    parser = argparse.ArgumentParser(description="Delete checkpoints outside the retention policy")
+    parser.add_argument("--keep-latest", type=int, default=None, help="checkpoints kept per thread")
+    parser.add_argument("--max-age-hours", type=float, default=None, help="also keep checkpoints younger than this")
+    args = parser.parse_args()
+    
+    try:
+        await create_pool()
+        await cache_adapter.initialize()
+        report = await checkpoint_gc.run_once(keep_latest=args.keep_latest, max_age_hours=args.max_age_hours)
+        if report is None:
+            logger.warning("Another checkpoint GC run is in progress; nothing done")
+        else:
+            print(
+                f"Deleted {report['rows']} checkpoints, reclaimed {report['bytes']} bytes "
+                f"({report['threads_scanned']} threads scanned in {report['seconds']}s)"
+            )
+    except Exception as e:
+        logger.error(f"Error in checkpoint GC script: {str(e)}")
+        raise
+    finally:
+        await cache_adapter.close()
+        await close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,144 @@
+"""Import conversation archives from NDJSON using the bulk ingest path
+
+Each line is one JSON object; threads must appear before their messages:
+
+    {"type": "thread", "id": "<archive thread id>", "user_id": "...", "persona": "mentor", "created_at": "..."}
+    {"type": "message", "thread": "<archive thread id>", "role": "user", "content": "...", "created_at": "..."}
+
+Archive IDs that aren't UUIDs are mapped to deterministic UUIDs, so the
+importer keeps no ID map and runs in constant memory however large the
+file is. Rows are written in batches, one transaction per batch; bulk
+loads don't skip duplicates, so don't import the same archive twice.
+
+Usage: python scripts/import_ndjson.py archive.ndjson [--batch-size 5000]
+       (use "-" to read from stdin)
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime
+from app.database.connection import create_pool, close_pool
+from app.services.memory.thread_manager import ThreadManager, _to_uuid
+from app.core.logging import logger
+
+
+def _timestamp(value):
+    """Parse an ISO-8601 timestamp from the archive (naive UTC, like the rest of the DB)"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.replace(tzinfo=None) - parsed.utcoffset()
+    return parsed
+
+
+class Importer:
+    """Buffers archive records and writes them through the bulk APIs"""
+    
+    def __init__(self, batch_size: int):
+        self.manager = ThreadManager()
+        self.batch_size = batch_size
+        self.threads = []
+        self.messages = []
+        self.thread_count = 0
+        self.message_count = 0
+        self.skipped = 0
+        # Archives are usually grouped by thread: remember the last ID mapping
+        self._last_thread = (None, None)
+    
+    def thread_id(self, archive_id: str):
+        if self._last_thread[0] != archive_id:
+            self._last_thread = (archive_id, _to_uuid(archive_id))
+        return self._last_thread[1]
+    
+    async def add(self, record: dict):
+        kind = record.get("type")
+        if kind == "thread":
+            self.threads.append({
+                "thread_id": self.thread_id(record["id"]),
+                "user_id": record["user_id"],
+                "persona": record["persona"],
+                "created_at": _timestamp(record.get("created_at")),
+                "updated_at": _timestamp(record.get("updated_at"))
+            })
+            if len(self.threads) >= self.batch_size:
+                await self.flush_threads()
+        elif kind == "message":
+            self.messages.append({
+                "thread_id": self.thread_id(record["thread"]),
+                "role": record["role"],
+                "content": record["content"],
+                "created_at": _timestamp(record.get("created_at"))
+            })
+            if len(self.messages) >= self.batch_size:
+                await self.flush_messages()
+        else:
+            raise ValueError(f"unknown record type: {kind!r}")
+    
+    async def flush_threads(self):
+        if self.threads:
+            created = await self.manager.create_threads_bulk(self.threads)
+            self.thread_count += len(created)
+            self.threads = []
+    
+    async def flush_messages(self):
+        # Messages reference threads, so pending threads go first
+        await self.flush_threads()
+        if self.messages:
+            self.message_count += await self.manager.save_messages_bulk(self.messages)
+            self.messages = []
+    
+    async def flush(self):
+        await self.flush_messages()
+
+
+async def import_file(stream, batch_size: int):
+    """Stream records from `stream` into the database"""
+    importer = Importer(batch_size)
+    started = time.monotonic()
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            await importer.add(json.loads(line))
+        except (ValueError, KeyError, TypeError) as e:
+            # Bad records are skipped; database errors abort the import
+            importer.skipped += 1
+            logger.warning(f"Skipping line {line_number}: {str(e)}")
+        if line_number % 100000 == 0:
+            logger.info(f"{line_number} lines read ({importer.message_count} messages written)")
+    await importer.flush()
+    elapsed = time.monotonic() - started
+    logger.info(
+        f"Imported {importer.thread_count} threads and {importer.message_count} messages "
+        f"in {elapsed:.1f}s ({importer.skipped} lines skipped)"
+    )
+    return importer
+
+
+async def main():
+    """Main import function"""
+    parser = argparse.ArgumentParser(description="Import conversations from an NDJSON archive")
+    parser.add_argument("path", help="NDJSON file, or - for stdin")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per transaction")
+    args = parser.parse_args()
+    
+    try:
+        await create_pool()
+        if args.path == "-":
+            await import_file(sys.stdin, args.batch_size)
+        else:
+            with open(args.path, "r", encoding="utf-8") as f:
+                await import_file(f, args.batch_size)
+    except Exception as e:
+        logger.error(f"Error in import script: {str(e)}")
+        raise
+    finally:
+        await close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -21,6 +21,19 @@ async def db_pool():
     await close_pool()
 
 
+@pytest.fixture
+async def sqlite_db(tmp_path, monkeypatch):
+    """Fresh SQLite database with the schema applied and a pool open on it"""
+    from app.database.adapter import db_adapter
+    from app.main import initialize_database
+    monkeypatch.setattr(settings, "SQLITE_DB_PATH", str(tmp_path / "test.db"))
+    await db_adapter.close_pool()
+    await db_adapter.create_pool()
+    await initialize_database()
+    yield
+    await db_adapter.close_pool()
+
+
 @pytest.fixture
 async def db_connection(db_pool):
     """Get database connection for tests"""
@@ -1,9 +1,33 @@
 """Tests for chat endpoint"""
+import json
 import pytest
 from httpx import AsyncClient
+from app.core.config import settings
 from app.main import app
 
 
+@pytest.fixture
+async def fake_llm(sqlite_db, monkeypatch):
+    """Local fake LLM (fast, deterministic) in place of the provider API"""
+    from app.services.llm.registry import llm_registry
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "fake")
+    monkeypatch.setattr(settings, "FAKE_LLM_TTFT_MS", 1.0)
+    monkeypatch.setattr(settings, "FAKE_LLM_TOKENS_PER_SEC", 10000.0)
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_ENABLED", False)
+    await llm_registry.close()
+    yield
+    await llm_registry.close()
+
+
+def _sse_frames(body: str) -> list:
+    """(event, data) pairs of a Server-Sent Events body"""
+    frames = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        frames.append((fields["event"], json.loads(fields["data"])))
+    return frames
+
+
 @pytest.mark.asyncio
 async def test_chat_endpoint():
     """Test chat endpoint"""
@@ -32,3 +56,62 @@ async def test_chat_with_thread_id():
         )
         assert response.status_code in [200, 500]
 
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_endpoint(fake_llm):
+    """Test streaming chat sends metadata, then tokens, then a done frame with the thread"""
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post(
+            "/api/chat/stream",
+            json={
+                "user_id": "test-user-123",
+                "message": "Hello, act like my mentor"
+            }
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+    
+    frames = _sse_frames(response.text)
+    events = [event for event, _ in frames]
+    assert events[0] == "metadata" and events[-1] == "done"
+    assert "token" in events[1:-1] and set(events[1:-1]) == {"token"}
+    thread_id = frames[0][1]["thread_id"]
+    done = frames[-1][1]
+    assert done["thread_id"] == thread_id
+    assert done["response"] == "".join(data["content"] for event, data in frames if event == "token")
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_llm_failure(fake_llm, monkeypatch):
+    """Test an LLM failure mid-stream ends with an error frame, not a dropped connection"""
+    monkeypatch.setattr(settings, "FAKE_LLM_ERROR_RATE", 1.0)
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 0)
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post(
+            "/api/chat/stream",
+            json={"user_id": "test-user-123", "message": "Hello, act like my mentor"}
+        )
+        assert response.status_code == 200
+    
+    frames = _sse_frames(response.text)
+    assert [event for event, _ in frames] == ["metadata", "error"]
+    assert frames[-1][1]["type"] == "LLMException"
+
+
+@pytest.mark.asyncio
+async def test_chat_batch_endpoint():
+    """Test batch endpoint returns one NDJSON line per item"""
+    import json
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post(
+            "/api/chat/batch",
+            json=[
+                {"user_id": "test-user-123", "message": "Hello"},
+                {"user_id": "test-user-456", "message": "Act like an investor"}
+            ]
+        )
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(line["index"] for line in lines) == [0, 1]
+        assert all(line["status"] in ["ok", "error"] for line in lines)
@@ -26,5 +26,21 @@ async def test_chat_history_with_thread_id():
                 "thread_id": "test-thread-123"
             }
         )
-        assert response.status_code in [200, 500]
+        assert response.status_code in [404, 500]  # no such thread
+
+
 
+@pytest.mark.asyncio
+async def test_chat_history_unknown_thread_with_cursor(sqlite_db):
+    """Test paging an unknown thread is a 404, not an error from the paging query"""
+    from datetime import datetime
+    from uuid import uuid4
+    from app.services.memory.pagination import encode_cursor
+    cursor = encode_cursor(datetime(2026, 1, 1), uuid4())
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        for thread_id in (str(uuid4()), "not-a-thread"):
+            response = await client.get(
+                "/api/chat_history",
+                params={"user_id": "test-user-123", "thread_id": thread_id, "before": cursor}
+            )
+            assert response.status_code == 404
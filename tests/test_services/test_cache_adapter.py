@@ -0,0 +1,36 @@
+"""Tests for the in-memory cache backend"""
+import pytest
+from app.core.config import settings
+from app.services.cache.adapter import CacheAdapter
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_evicts_lru_in_batches(monkeypatch):
+    """Test a full cache evicts least recently used entries down to the low-water mark"""
+    monkeypatch.setattr(settings, "CACHE_MEMORY_MAX_ENTRIES", 10)
+    monkeypatch.setattr(settings, "CACHE_MEMORY_EVICT_TO", 0.5)
+    cache = CacheAdapter()
+    cache.cache_type = "memory"
+    for i in range(10):
+        await cache.set(f"key{i}", i)
+    assert await cache.get("key0") == 0  # now the most recently used
+    
+    await cache.set("key10", 10)
+    assert len(cache._memory_cache) == 5
+    assert await cache.get("key0") == 0
+    assert await cache.get("key1") is None
+    assert await cache.get("key10") == 10
+
+
+@pytest.mark.asyncio
+async def test_memory_locks_survive_eviction(monkeypatch):
+    """Test held locks are not cache entries, so filling the cache can't release them"""
+    monkeypatch.setattr(settings, "CACHE_MEMORY_MAX_ENTRIES", 2)
+    cache = CacheAdapter()
+    cache.cache_type = "memory"
+    assert await cache.acquire_lock("lock:thread", "a", 60000)
+    for i in range(5):
+        await cache.set(f"key{i}", i)
+    assert not await cache.acquire_lock("lock:thread", "b", 60000)
+    assert await cache.release_lock("lock:thread", "a")
+    assert await cache.acquire_lock("lock:thread", "b", 60000)
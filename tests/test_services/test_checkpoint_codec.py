@@ -0,0 +1,43 @@
+"""Tests for the binary checkpoint codec"""
+import json
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from app.services.memory.checkpoint_codec import CheckpointCodec, FORMAT_VERSION
+
+
+def _record(turns: int) -> dict:
+    messages = []
+    for turn in range(turns):
+        messages.append(HumanMessage(content=f"question {turn} about runway and pricing", id=f"h{turn}"))
+        messages.append(AIMessage(content=f"answer {turn}: focus on retention and customers", id=f"a{turn}"))
+    return {"checkpoint": {"id": "1", "channel_values": {"messages": messages}}, "metadata": {"step": turns}}
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+def test_round_trip_keeps_message_objects(compression):
+    """Test records decode to the objects that were encoded"""
+    codec = CheckpointCodec(compression=compression, min_bytes=0)
+    record = _record(20)
+    data = codec.encode(record)
+    assert data[0] == FORMAT_VERSION
+    decoded = codec.decode(data)
+    assert decoded == record
+    assert isinstance(decoded["checkpoint"]["channel_values"]["messages"][1], AIMessage)
+
+
+def test_compression_is_recorded_per_row():
+    """Test compressed and small uncompressed rows both decode with any settings"""
+    compressed = CheckpointCodec(compression="zlib", min_bytes=0).encode(_record(20))
+    small = CheckpointCodec(compression="zlib", min_bytes=1 << 20).encode(_record(20))
+    assert len(compressed) < len(small)
+    reader = CheckpointCodec(compression="none")
+    assert reader.decode(compressed) == reader.decode(small)
+
+
+def test_legacy_json_rows_and_unknown_versions():
+    """Test rows without binary data load as JSON and unknown formats are rejected"""
+    codec = CheckpointCodec(compression="none")
+    row = {"state": json.dumps({"checkpoint": {"id": "1"}, "metadata": {}}), "data": None}
+    assert codec.decode_row(row)["checkpoint"] == {"id": "1"}
+    with pytest.raises(ValueError):
+        codec.decode(bytes([FORMAT_VERSION + 1, 0, 0]))
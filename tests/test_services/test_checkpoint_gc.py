@@ -0,0 +1,60 @@
+"""Tests for checkpoint retention"""
+import pytest
+from app.core.config import settings
+from app.database.adapter import db_adapter
+from app.services.memory.checkpointer import DatabaseCheckpointer
+from app.services.memory.checkpoint_gc import checkpoint_gc, GC_LOCK_KEY
+from app.services.memory.thread_manager import ThreadManager
+
+
+async def _threads_with_checkpoints(count: int, steps: int) -> list:
+    manager = ThreadManager()
+    checkpointer = DatabaseCheckpointer()
+    threads = [await manager.create_thread(user_id="gc-user", persona="mentor") for _ in range(count)]
+    for thread in threads:
+        for step in range(steps):
+            config = {"configurable": {"thread_id": str(thread.thread_id)}}
+            await checkpointer.aput(config, {"id": str(step), "step": step}, {}, {})
+    return threads
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_retention(sqlite_db):
+    """Test GC keeps each thread's latest checkpoints and reports what it reclaimed"""
+    threads = await _threads_with_checkpoints(3, 6)
+    checkpointer = DatabaseCheckpointer()
+    
+    report = await checkpoint_gc.run_once(keep_latest=2, max_age_hours=0)
+    assert report["rows"] == 12 and report["bytes"] > 0
+    for thread in threads:
+        rows = await db_adapter.fetch("SELECT checkpoint_id FROM checkpoints WHERE thread_id = $1", thread.thread_id)
+        assert len(rows) == 2
+        latest = await checkpointer.aget_tuple({"configurable": {"thread_id": str(thread.thread_id)}})
+        assert latest.checkpoint["step"] == 5
+    assert (await checkpoint_gc.run_once(keep_latest=2, max_age_hours=0))["rows"] == 0
+
+
+@pytest.mark.asyncio
+async def test_deletes_in_bounded_batches(sqlite_db, monkeypatch):
+    """Test each DELETE removes at most CHECKPOINT_GC_BATCH_SIZE rows, walking threads in ranges"""
+    monkeypatch.setattr(settings, "CHECKPOINT_GC_BATCH_SIZE", 3)
+    monkeypatch.setattr(settings, "CHECKPOINT_GC_THREADS_PER_SCAN", 2)
+    monkeypatch.setattr(settings, "CHECKPOINT_GC_BATCH_PAUSE_MS", 0)
+    await _threads_with_checkpoints(3, 5)
+    
+    report = await checkpoint_gc.run_once(keep_latest=1, max_age_hours=0)
+    assert report["rows"] == 12 and report["threads_scanned"] == 3
+    assert report["batches"] >= 12 // 3
+    rows = await db_adapter.fetch("SELECT thread_id FROM checkpoints")
+    assert len(rows) == 3
+
+
+@pytest.mark.asyncio
+async def test_concurrent_run_is_skipped(sqlite_db):
+    """Test a run is skipped while another holds the GC lock"""
+    from app.services.cache.adapter import cache_adapter
+    assert await cache_adapter.acquire_lock(GC_LOCK_KEY, "other-worker", 60000)
+    try:
+        assert await checkpoint_gc.run_once() is None
+    finally:
+        await cache_adapter.release_lock(GC_LOCK_KEY, "other-worker")
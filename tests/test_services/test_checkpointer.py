@@ -0,0 +1,129 @@
+"""Tests for the database checkpointer (delta storage)"""
+import pytest
+from app.core.config import settings
+from app.database.adapter import db_adapter
+from app.services.memory import checkpointer as checkpointer_module
+from app.services.memory.checkpointer import DatabaseCheckpointer, diff_state, apply_delta
+from app.services.memory.checkpoint_gc import checkpoint_gc
+from app.services.memory.thread_manager import ThreadManager
+
+
+@pytest.fixture
+def delta_mode(monkeypatch):
+    monkeypatch.setattr(settings, "CHECKPOINT_STORAGE_MODE", "delta")
+    monkeypatch.setattr(settings, "CHECKPOINT_DELTA_MAX_CHAIN", 3)
+    checkpointer_module._chain_heads.clear()
+    yield
+    checkpointer_module._chain_heads.clear()
+
+
+async def _put_steps(checkpointer: DatabaseCheckpointer, config: dict, steps: range, messages: list) -> dict:
+    for step in steps:
+        messages.append(f"message {step}")
+        checkpoint = {"id": str(step), "channel_values": {"messages": list(messages), "step": step}}
+        await checkpointer.aput(config, checkpoint, {"step": step}, {})
+    return checkpoint
+
+
+async def _base_flags(thread_id) -> list:
+    rows = await db_adapter.fetch("SELECT base_id FROM checkpoints WHERE thread_id = $1 ORDER BY created_at", thread_id)
+    return [row["base_id"] is None for row in rows]
+
+
+def test_diff_and_apply_delta():
+    """Test a delta stores only appended messages and changed keys, and applies back exactly"""
+    old = {"id": "1", "channel_values": {"messages": ["a", "b"], "persona": "mentor"}, "pending": [1]}
+    new = {"id": "2", "channel_values": {"messages": ["a", "b", "c"], "persona": "investor"}, "extra": True}
+    delta = diff_state(old, new)
+    assert delta["unset"] == ["pending"]
+    assert delta["nested"]["channel_values"] == {"append": {"messages": ["c"]}, "set": {"persona": "investor"}}
+    assert apply_delta(old, delta) == new
+    assert old["channel_values"]["messages"] == ["a", "b"]
+    assert diff_state(new, new) == {}
+
+
+@pytest.mark.asyncio
+async def test_delta_checkpoints(sqlite_db, delta_mode):
+    """Test delta checkpoints replay to the full state and survive GC as whole chains"""
+    thread = await ThreadManager().create_thread(user_id="delta-user", persona="mentor")
+    config = {"configurable": {"thread_id": str(thread.thread_id)}}
+    checkpointer = DatabaseCheckpointer()
+    messages = []
+    checkpoint = await _put_steps(checkpointer, config, range(6), messages)
+    assert await _base_flags(thread.thread_id) == [True, False, False, True, False, False]
+    
+    # A fresh process has no chain heads and must replay from the database
+    checkpointer_module._chain_heads.clear()
+    latest = await checkpointer.aget_tuple(config)
+    assert latest.checkpoint == checkpoint and latest.metadata == {"step": 5}
+    
+    # Only the chain before the latest base is expendable
+    report = await checkpoint_gc.run_once(keep_latest=1, max_age_hours=0)
+    assert report["rows"] == 3
+    latest = await checkpointer.aget_tuple(config)
+    assert latest.checkpoint["channel_values"]["messages"] == messages
+
+
+@pytest.mark.asyncio
+async def test_chain_after_restart(sqlite_db, delta_mode, monkeypatch):
+    """Test a restarted process starts a full base, or continues a loaded chain within CHECKPOINT_DELTA_MAX_CHAIN"""
+    thread = await ThreadManager().create_thread(user_id="restart-user", persona="mentor")
+    config = {"configurable": {"thread_id": str(thread.thread_id)}}
+    checkpointer = DatabaseCheckpointer()
+    messages = []
+    await _put_steps(checkpointer, config, range(2), messages)
+    
+    # Restart without loading: no known parent, so the next write is a full base
+    checkpointer_module._chain_heads.clear()
+    await _put_steps(checkpointer, config, range(2, 4), messages)
+    assert await _base_flags(thread.thread_id) == [True, False, True, False]
+    
+    # Restart and load: the loaded chain is continued, but never past the limit
+    checkpointer_module._chain_heads.clear()
+    await checkpointer.aget_tuple(config)
+    await _put_steps(checkpointer, config, range(4, 7), messages)
+    assert await _base_flags(thread.thread_id) == [True, False, True, False, False, True, False]
+    
+    replayed = []
+    fetch = db_adapter.fetch
+    
+    async def counting_fetch(query, *args):
+        rows = await fetch(query, *args)
+        if getattr(query, "name", None) == "GET_CHECKPOINT_CHAIN":
+            replayed.append(len(rows))
+        return rows
+    
+    monkeypatch.setattr(db_adapter, "fetch", counting_fetch)
+    checkpointer_module._chain_heads.clear()
+    latest = await checkpointer.aget_tuple(config)
+    assert latest.checkpoint["channel_values"]["messages"] == messages
+    assert replayed and max(replayed) <= settings.CHECKPOINT_DELTA_MAX_CHAIN
+
+
+@pytest.mark.asyncio
+async def test_load_reuses_decoded_state(sqlite_db, monkeypatch):
+    """Test loading the checkpoint this process wrote last skips decoding, and a newer row doesn't"""
+    monkeypatch.setattr(settings, "CHECKPOINT_STORAGE_MODE", "full")
+    thread = await ThreadManager().create_thread(user_id="decode-user", persona="mentor")
+    config = {"configurable": {"thread_id": str(thread.thread_id)}}
+    checkpointer = DatabaseCheckpointer()
+    messages = []
+    await _put_steps(checkpointer, config, range(1), messages)
+    stale = checkpointer_module._chain_heads[thread.thread_id]
+    checkpoint = await _put_steps(checkpointer, config, range(1, 2), messages)
+    
+    decode_row = checkpointer.codec.decode_row
+    
+    def fail_decode(row):
+        raise AssertionError("decoded a cached checkpoint")
+    
+    monkeypatch.setattr(checkpointer.codec, "decode_row", fail_decode)
+    latest = await checkpointer.aget_tuple(config)
+    assert latest.checkpoint == checkpoint and latest.metadata == {"step": 1}
+    
+    # Another worker wrote since: the cached state is stale and must be decoded
+    monkeypatch.setattr(checkpointer.codec, "decode_row", decode_row)
+    checkpointer_module._chain_heads[thread.thread_id] = stale
+    latest = await checkpointer.aget_tuple(config)
+    assert latest.checkpoint == checkpoint
+    assert checkpointer_module._chain_heads[thread.thread_id].checkpoint_id != stale.checkpoint_id
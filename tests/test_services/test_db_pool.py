@@ -0,0 +1,126 @@
+"""Tests for database pool configuration and telemetry"""
+import pytest
+from app.core.config import settings
+from app.database.adapter import DatabaseAdapter
+
+
+def test_pool_size_split_across_workers(monkeypatch):
+    """Test DB_MAX_CONNECTIONS is shared between worker processes"""
+    monkeypatch.setattr(settings, "DB_POOL_MAX_SIZE", 20)
+    monkeypatch.setattr(settings, "DB_MAX_CONNECTIONS", None)
+    assert DatabaseAdapter._pool_max_size() == 20
+    monkeypatch.setattr(settings, "DB_MAX_CONNECTIONS", 60)
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 4)
+    assert DatabaseAdapter._pool_max_size() == 15
+
+
+def test_connect_kwargs_use_dsn():
+    """Test database URLs are passed through as a DSN (no hand parsing)"""
+    url = "postgresql+asyncpg://u:p%40ss@db:5433/app?sslmode=require"
+    assert DatabaseAdapter._connect_kwargs(url) == {"dsn": "postgresql://u:p%40ss@db:5433/app?sslmode=require"}
+
+
+@pytest.mark.asyncio
+async def test_pg_sessions_use_utc(monkeypatch):
+    """Test pooled PostgreSQL sessions are pinned to UTC, the zone of app-supplied timestamps"""
+    import asyncpg
+    captured = {}
+    
+    async def create_pool(**kwargs):
+        captured.update(kwargs)
+    
+    monkeypatch.setattr(asyncpg, "create_pool", create_pool)
+    await DatabaseAdapter()._create_pg_pool("postgresql://u:p@db/app")
+    assert captured["server_settings"] == {"timezone": "UTC"}
+
+
+@pytest.mark.asyncio
+async def test_sqlite_pool_stats(tmp_path, monkeypatch):
+    """Test pool occupancy is reported while connections are borrowed"""
+    from app.core.metrics import metrics
+    monkeypatch.setattr(settings, "SQLITE_DB_PATH", str(tmp_path / "pool.db"))
+    monkeypatch.setattr(settings, "SQLITE_READER_CONNECTIONS", 2)
+    adapter = DatabaseAdapter()
+    adapter.db_type = "sqlite"
+    await adapter.create_pool()
+    try:
+        assert adapter.pool_stats() == {"size": 3, "idle": 3, "acquired": 0, "max_size": 3}
+        async with adapter._connection(readonly=True), adapter._connection():
+            assert adapter.pool_stats()["acquired"] == 2
+        assert metrics.sample_count("db.pool.acquire_wait_seconds") >= 2
+    finally:
+        await adapter.close_pool()
+
+
+@pytest.mark.asyncio
+async def test_replica_read_your_writes():
+    """Test reads go to replicas except after a write in the request, or to a recently written thread"""
+    import asyncio
+    from app.services.cache.adapter import cache_adapter
+    await cache_adapter.clear()
+    adapter = DatabaseAdapter()
+    adapter._replica_pools = [object()]  # routing only; no connection is opened
+    
+    async def routed_to_replica(thread_id, write_first=None):
+        if write_first:
+            await adapter.mark_written(write_first)
+        with adapter.thread_scope(thread_id):
+            return await adapter._use_replica()
+    
+    # Each task stands in for a separate request
+    assert await asyncio.create_task(routed_to_replica("thread-1"))
+    assert not await asyncio.create_task(routed_to_replica("thread-2", write_first="thread-1"))
+    assert not await asyncio.create_task(routed_to_replica("thread-1"))
+    assert await asyncio.create_task(routed_to_replica("thread-2"))
+
+
+@pytest.mark.asyncio
+async def test_replica_stickiness_shared_between_workers():
+    """Test a thread written by one worker is read from the primary by another sharing the cache"""
+    import asyncio
+    from app.services.cache.adapter import cache_adapter
+    await cache_adapter.clear()
+    worker_a, worker_b = DatabaseAdapter(), DatabaseAdapter()
+    for worker in (worker_a, worker_b):
+        worker._replica_pools = [object()]
+    
+    async def routed_to_replica(worker, thread_id):
+        with worker.thread_scope(thread_id):
+            return await worker._use_replica()
+    
+    await asyncio.create_task(worker_a.mark_written("thread-1"))
+    assert not await asyncio.create_task(routed_to_replica(worker_b, "thread-1"))
+    assert await asyncio.create_task(routed_to_replica(worker_b, "thread-2"))
+    
+    async def checkpoint_load_on_replica():
+        with worker_b.primary_reads():
+            return await worker_b._use_replica()
+    
+    assert not await asyncio.create_task(checkpoint_load_on_replica())
+
+
+@pytest.mark.asyncio
+async def test_sqlite_pool_pragmas_and_reuse(tmp_path, monkeypatch):
+    """Test the pool runs in WAL mode with read-only readers that are reused"""
+    import sqlite3
+    monkeypatch.setattr(settings, "SQLITE_DB_PATH", str(tmp_path / "pragmas.db"))
+    monkeypatch.setattr(settings, "SQLITE_READER_CONNECTIONS", 1)
+    adapter = DatabaseAdapter()
+    adapter.db_type = "sqlite"
+    await adapter.create_pool()
+    try:
+        async with adapter._connection() as writer:
+            async with writer.execute("PRAGMA journal_mode") as cursor:
+                assert (await cursor.fetchone())[0] == "wal"
+            await writer.execute("CREATE TABLE items (id INTEGER)")
+            await writer.commit()
+        
+        async with adapter._connection(readonly=True) as first:
+            async with first.execute("PRAGMA query_only") as cursor:
+                assert (await cursor.fetchone())[0] == 1
+            with pytest.raises(sqlite3.OperationalError):
+                await first.execute("INSERT INTO items VALUES (1)")
+        async with adapter._connection(readonly=True) as second:
+            assert second is first
+    finally:
+        await adapter.close_pool()
@@ -0,0 +1,73 @@
+"""Tests for the fake LLM backend"""
+import pytest
+from langchain_core.messages import HumanMessage
+from app.services.llm.fake import FakeChatModel, FakeLLMError
+
+
+def _model(**overrides):
+    params = dict(ttft_ms=1, ttft_stddev_ms=0, tokens_per_second=0, output_tokens=12, output_tokens_stddev=4)
+    params.update(overrides)
+    return FakeChatModel(**params)
+
+
+@pytest.mark.asyncio
+async def test_fake_llm_is_deterministic():
+    """Test the same prompt always yields the same reply"""
+    messages = [HumanMessage(content="How do I raise a seed round?")]
+    first = await _model().ainvoke(messages)
+    second = await _model().ainvoke(messages)
+    assert first.content == second.content
+    assert first.usage_metadata["output_tokens"] == len(first.content.split())
+
+
+@pytest.mark.asyncio
+async def test_fake_llm_stream_matches_invoke():
+    """Test streaming yields the same text as a single call"""
+    messages = [HumanMessage(content="Tell me about pricing")]
+    chunks = [chunk.content async for chunk in _model().astream(messages)]
+    assert len(chunks) > 1
+    assert "".join(chunks) == (await _model().ainvoke(messages)).content
+
+
+@pytest.mark.asyncio
+async def test_fake_llm_injects_errors():
+    """Test the error rate injects failures with the configured status"""
+    with pytest.raises(FakeLLMError) as exc_info:
+        await _model(error_rate=1.0, error_status=429).ainvoke([HumanMessage(content="hi")])
+    assert exc_info.value.status_code == 429
+
+
+@pytest.mark.asyncio
+async def test_fake_llm_errors_vary_per_call():
+    """Test injected errors follow a reproducible per-call stream, so retries can succeed"""
+    messages = [HumanMessage(content="hi")]
+    
+    async def outcomes(model):
+        results = []
+        for _ in range(20):
+            try:
+                await model.ainvoke(messages)
+                results.append(True)
+            except FakeLLMError:
+                results.append(False)
+        return results
+    
+    first = await outcomes(_model(error_rate=0.5, seed=7))
+    assert True in first and False in first
+    assert first == await outcomes(_model(error_rate=0.5, seed=7))
+
+
+@pytest.mark.asyncio
+async def test_limiter_retries_recover_from_injected_errors(monkeypatch):
+    """Test a retried call against a flaky fake eventually succeeds"""
+    from app.core.config import settings
+    from app.core.metrics import metrics
+    from app.services.llm.limiter import llm_limiter
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 10)
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY", 0.0)
+    metrics.reset()
+    model = _model(error_rate=0.5, error_status=529, seed=0)  # first two calls fail
+    
+    reply = await llm_limiter.run(lambda: model.ainvoke([HumanMessage(content="hi")]))
+    assert reply.content
+    assert metrics.counter("llm.retries", status=529) == 2
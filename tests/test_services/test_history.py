@@ -0,0 +1,39 @@
+"""Tests for conversation history compaction helpers"""
+from langchain_core.messages import HumanMessage, AIMessage
+from app.services.agent.history import window_start, needs_compaction
+
+
+def _conversation(turns: int, text: str = "hello"):
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"{text} {i}"))
+        messages.append(AIMessage(content=f"reply {i}"))
+    return messages
+
+
+def test_window_keeps_last_turns():
+    """Test the verbatim window starts at a user message and keeps N turns"""
+    messages = _conversation(10)
+    start = window_start(messages, 0, max_turns=3, token_budget=10_000)
+    assert start == 14
+    assert isinstance(messages[start], HumanMessage)
+
+
+def test_window_respects_token_budget():
+    """Test the token budget shrinks the window but keeps the newest turn"""
+    messages = _conversation(5, text="x" * 400)
+    assert window_start(messages, 0, max_turns=10, token_budget=50) == 8
+
+
+def test_window_never_precedes_summary_index():
+    """Test already-summarized messages are not returned to the window"""
+    messages = _conversation(4)
+    assert window_start(messages, 6, max_turns=10, token_budget=10_000) == 6
+
+
+def test_needs_compaction():
+    """Test compaction triggers only when the pending history outgrows its budget"""
+    messages = _conversation(5)
+    assert not needs_compaction(messages, 0, max_turns=5, token_budget=10_000)
+    assert needs_compaction(messages, 0, max_turns=4, token_budget=10_000)
+    assert not needs_compaction(messages, 2, max_turns=4, token_budget=10_000)
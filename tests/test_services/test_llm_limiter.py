@@ -0,0 +1,67 @@
+"""Tests for LLM admission control"""
+import asyncio
+import pytest
+from app.core.config import settings
+from app.core.exceptions import LLMException
+from app.services.llm.fake import FakeLLMError
+from app.services.llm.limiter import LLMAdmissionController
+
+
+@pytest.mark.asyncio
+async def test_interactive_calls_jump_the_batch_queue(monkeypatch):
+    """Test queued interactive calls are admitted before queued batch calls"""
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENCY", 1)
+    limiter = LLMAdmissionController()
+    gate = asyncio.Event()
+    order = []
+    
+    async def call(name):
+        if name == "first":
+            await gate.wait()
+        order.append(name)
+    
+    first = asyncio.create_task(limiter.run(lambda: call("first")))
+    await asyncio.sleep(0)
+    batch = asyncio.create_task(limiter.run(lambda: call("batch"), priority="batch"))
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(limiter.run(lambda: call("interactive")))
+    await asyncio.sleep(0)
+    assert limiter.queue_depth == 2
+    gate.set()
+    await asyncio.gather(first, batch, interactive)
+    assert order == ["first", "interactive", "batch"]
+
+
+@pytest.mark.asyncio
+async def test_retries_honour_retry_after(monkeypatch):
+    """Test rate-limited calls are retried and then surfaced as LLMException"""
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 2)
+    limiter = LLMAdmissionController()
+    attempts = []
+    
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise FakeLLMError(429, retry_after=0.01)
+        return "ok"
+    
+    assert await limiter.run(flaky) == "ok"
+    assert len(attempts) == 3
+    
+    async def always_overloaded():
+        raise FakeLLMError(529, retry_after=0)
+    
+    with pytest.raises(LLMException):
+        await limiter.run(always_overloaded)
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_errors_pass_through():
+    """Test errors that aren't rate limits are raised immediately"""
+    limiter = LLMAdmissionController()
+    
+    async def broken():
+        raise ValueError("bad request")
+    
+    with pytest.raises(ValueError):
+        await limiter.run(broken)
@@ -0,0 +1,15 @@
+"""Tests for LLM client registry"""
+import pytest
+from app.services.llm.registry import LLMClientRegistry
+
+
+@pytest.mark.asyncio
+async def test_registry_reuses_clients():
+    """Test clients are cached per persona and share one HTTP pool"""
+    registry = LLMClientRegistry()
+    mentor = registry.get("mentor")
+    investor = registry.get("investor")
+    assert registry.get("mentor") is mentor
+    assert investor is not mentor
+    assert mentor._async_client._client is investor._async_client._client
+    await registry.close()
@@ -0,0 +1,144 @@
+"""Tests for write-behind message persistence and group commit"""
+import asyncio
+import pytest
+from uuid import uuid4
+from app.core.config import settings
+from app.database.adapter import db_adapter
+from app.services.memory.message_writer import MessageWriter
+
+
+async def _turn(writer: MessageWriter, i: int):
+    uow = db_adapter.unit_of_work()
+    await writer.save_turn(str(uuid4()), f"question {i}", f"answer {i}", uow=uow)
+    committed = []
+    
+    async def on_commit():
+        committed.append(i)
+    
+    uow.on_commit(on_commit)
+    await writer.commit(uow)
+    return committed
+
+
+@pytest.mark.asyncio
+async def test_write_behind_acks_before_flush(monkeypatch):
+    """Test enqueue-acked messages are flushed later as one multi-row insert, checkpoints right away"""
+    monkeypatch.setattr(settings, "MESSAGE_WRITE_ACK", "enqueue")
+    monkeypatch.setattr(settings, "MESSAGE_FLUSH_INTERVAL_MS", 1000)
+    transactions = []
+    
+    async def execute_batch(commands):
+        transactions.append(commands)
+    
+    monkeypatch.setattr(db_adapter, "execute_batch", execute_batch)
+    writer = MessageWriter()
+    await writer.start()
+    for i in range(3):
+        uow = db_adapter.unit_of_work()
+        uow.add("INSERT INTO checkpoints", i)
+        await writer.save_turn(str(uuid4()), f"question {i}", f"answer {i}", uow=uow)
+        await writer.commit(uow)
+    assert transactions == [[("INSERT INTO checkpoints", (i,))] for i in range(3)]
+    
+    await writer.close()
+    assert len(transactions) == 4
+    [(query, args)] = transactions[3]
+    assert query.count("(") == 1 + 6  # column list + one group per message
+    assert args[2:4] == ["user", "question 0"]
+    assert args[7:9] == ["assistant", "answer 0"]
+
+
+@pytest.mark.asyncio
+async def test_write_behind_flushes_on_interval(monkeypatch):
+    """Test queued messages are written once MESSAGE_FLUSH_INTERVAL_MS has passed"""
+    monkeypatch.setattr(settings, "MESSAGE_WRITE_ACK", "enqueue")
+    monkeypatch.setattr(settings, "MESSAGE_FLUSH_INTERVAL_MS", 10)
+    transactions = []
+    
+    async def execute_batch(commands):
+        transactions.append(commands)
+    
+    monkeypatch.setattr(db_adapter, "execute_batch", execute_batch)
+    writer = MessageWriter()
+    await writer.start()
+    await writer.save_turn(str(uuid4()), "question", "answer")
+    assert transactions == []
+    await asyncio.sleep(0.05)
+    assert len(transactions) == 1
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_turns_share_one_commit(monkeypatch):
+    """Test turns waiting while a commit is in flight go in one transaction, acked once committed"""
+    monkeypatch.setattr(settings, "MESSAGE_WRITE_ACK", "flush")
+    transactions = []
+    release = asyncio.Event()
+    
+    async def execute_batch(commands):
+        transactions.append(commands)
+        await release.wait()
+    
+    monkeypatch.setattr(db_adapter, "execute_batch", execute_batch)
+    writer = MessageWriter()
+    await writer.start()
+    turns = [asyncio.create_task(_turn(writer, 0))]
+    await asyncio.sleep(0.01)
+    assert len(transactions) == 1  # the first turn's commit is in flight
+    turns += [asyncio.create_task(_turn(writer, i)) for i in range(1, 4)]
+    await asyncio.sleep(0.01)
+    assert len(transactions) == 1
+    assert not any(turn.done() for turn in turns)
+    
+    release.set()
+    assert [await turn for turn in turns] == [[0], [1], [2], [3]]
+    assert [len(commands) for commands in transactions] == [1, 3]
+    query, args = transactions[0][0]
+    assert query.count("(") == 1 + 2  # column list + one group per message
+    assert args[2:4] == ("user", "question 0")
+    assert args[7:9] == ("assistant", "answer 0")
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_group_commit_isolates_bad_turn(monkeypatch):
+    """Test an integrity error splits the batch without retries and fails only the offending turn"""
+    import sqlite3
+    monkeypatch.setattr(settings, "MESSAGE_WRITE_ACK", "flush")
+    calls, committed = [], []
+    
+    async def execute_batch(commands):
+        calls.append(len(commands))
+        if any("question 1" in args for _, args in commands):
+            raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+        committed.extend(commands)
+    
+    monkeypatch.setattr(db_adapter, "execute_batch", execute_batch)
+    writer = MessageWriter()
+    await writer.start()
+    results = await asyncio.gather(*(_turn(writer, i) for i in range(3)), return_exceptions=True)
+    assert results[0] == [0] and results[2] == [2]
+    assert isinstance(results[1], sqlite3.IntegrityError)
+    assert calls == [3, 1, 1, 1]  # the batch once, then each turn once
+    assert len(committed) == 2
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_transient_failures_are_retried(monkeypatch):
+    """Test a locked database is retried with the batch kept whole"""
+    import sqlite3
+    monkeypatch.setattr(settings, "MESSAGE_WRITE_ACK", "flush")
+    calls = []
+    
+    async def execute_batch(commands):
+        calls.append(len(commands))
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+    
+    monkeypatch.setattr(db_adapter, "execute_batch", execute_batch)
+    writer = MessageWriter()
+    await writer.start()
+    assert await asyncio.gather(*(_turn(writer, i) for i in range(3))) == [[0], [1], [2]]
+    assert calls == [3, 3]
+    await writer.close()
@@ -0,0 +1,55 @@
+"""Tests for the schema migration runner"""
+import pytest
+from app.core.config import settings
+from app.core.exceptions import MigrationException
+from app.database.adapter import DatabaseAdapter
+from app.database.migrator import MigrationRunner, split_sqlite_script
+
+
+@pytest.fixture
+def sqlite_adapter(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SQLITE_DB_PATH", str(tmp_path / "migrations.db"))
+    adapter = DatabaseAdapter()
+    adapter.db_type = "sqlite"
+    return adapter
+
+
+async def _names(adapter, kind):
+    async with adapter.get_connection() as conn:
+        async with conn.execute("SELECT name FROM sqlite_master WHERE type = ?", (kind,)) as cursor:
+            return {row[0] for row in await cursor.fetchall()}
+
+
+def test_split_sqlite_script():
+    """Test statements are split where SQLite says they end, comments included"""
+    script = "-- users\nCREATE TABLE a (x TEXT DEFAULT 'a;b');\nCREATE INDEX i ON a(x); -- trailing\n-- done\n"
+    assert split_sqlite_script(script) == ["-- users\nCREATE TABLE a (x TEXT DEFAULT 'a;b');", "CREATE INDEX i ON a(x); -- trailing"]
+
+
+@pytest.mark.asyncio
+async def test_migrations_apply_once(sqlite_adapter):
+    """Test every migration for the dialect is applied, including the index migration, and only once"""
+    runner = MigrationRunner(sqlite_adapter)
+    applied = await runner.migrate()
+    assert [m.version for m in applied] == [m.version for m in runner.discover()]
+    assert {1, 2} <= {m.version for m in applied}
+    assert applied[0].path.name == "001_initial_schema_sqlite.sql"
+    assert "idx_messages_created_at" in await _names(sqlite_adapter, "index")
+    assert await runner.migrate() == []
+
+
+@pytest.mark.asyncio
+async def test_failed_migration_rolls_back(sqlite_adapter, tmp_path):
+    """Test a failing migration leaves neither partial schema nor a version record"""
+    directory = tmp_path / "migrations"
+    directory.mkdir()
+    (directory / "001_base.sql").write_text("CREATE TABLE base (id TEXT);\n")
+    (directory / "002_broken.sql").write_text("CREATE TABLE half (id TEXT);\nCREATE INDEX x ON missing(id);\n")
+    runner = MigrationRunner(sqlite_adapter, directory)
+    with pytest.raises(MigrationException):
+        await runner.migrate()
+    tables = await _names(sqlite_adapter, "table")
+    assert "base" in tables and "half" not in tables
+    
+    (directory / "002_broken.sql").write_text("CREATE TABLE half (id TEXT);\n")
+    assert [m.version for m in await runner.migrate()] == [2]
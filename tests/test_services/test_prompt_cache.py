@@ -0,0 +1,29 @@
+"""Tests for prompt-caching helpers"""
+from langchain_core.messages import HumanMessage, AIMessage
+from app.services.llm.prompt_cache import build_system_message, mark_cache_breakpoint, extract_usage
+
+
+def test_system_message_blocks_are_cacheable():
+    """Test persona prompt and summary become separate cacheable blocks"""
+    message = build_system_message("You are a mentor.", "User is raising a seed round.", cache=True)
+    assert [block["cache_control"] for block in message.content] == [{"type": "ephemeral"}] * 2
+    assert build_system_message("You are a mentor.", "", cache=False).content == "You are a mentor."
+
+
+def test_cache_breakpoint_copies_message():
+    """Test the breakpoint is added to a copy, leaving the state message untouched"""
+    original = HumanMessage(content="How do I raise a seed round?")
+    marked = mark_cache_breakpoint(original)
+    assert original.content == "How do I raise a seed round?"
+    assert marked.content[-1]["cache_control"] == {"type": "ephemeral"}
+
+
+def test_extract_usage_reads_cache_tokens():
+    """Test cache read/write token counts are taken from the response metadata"""
+    response = AIMessage(content="hi", response_metadata={"usage": {
+        "input_tokens": 10, "output_tokens": 5,
+        "cache_read_input_tokens": 1200, "cache_creation_input_tokens": 0
+    }})
+    usage = extract_usage(response)
+    assert usage["cache_read_input_tokens"] == 1200
+    assert usage["output_tokens"] == 5
@@ -0,0 +1,18 @@
+"""Tests for the precompiled statement registry"""
+from app.database.queries import QUERIES, CREATE_CHECKPOINT, GET_THREAD, UPSERT_USER
+
+
+def test_statements_are_translated_once_per_dialect():
+    """Test SQLite SQL is derived at import time with numbered placeholders"""
+    assert QUERIES["GET_THREAD"] is GET_THREAD
+    assert "?1" in GET_THREAD.sqlite and "$1" not in GET_THREAD.sqlite
+    assert "::jsonb" not in CREATE_CHECKPOINT.sqlite and "NOW()" not in CREATE_CHECKPOINT.sqlite
+    assert "WITH inserted" in UPSERT_USER.sql_for("postgresql")
+    assert "DO NOTHING" in UPSERT_USER.sql_for("sqlite")
+
+
+def test_statement_metadata():
+    """Test statements carry read/write kind, RETURNING and cardinality"""
+    assert not GET_THREAD.is_write and GET_THREAD.cardinality == "one"
+    assert CREATE_CHECKPOINT.is_write and CREATE_CHECKPOINT.returning
+    assert all(q.kind in ("read", "write") for q in QUERIES.values())
@@ -0,0 +1,78 @@
+"""Tests for the circuit breaker and hedged LLM calls"""
+import asyncio
+import pytest
+from app.core.config import settings
+from app.core.exceptions import CircuitOpenException, LLMCapacityException
+from app.core.metrics import metrics
+from app.services.llm.fake import FakeLLMError
+from app.services.llm.resilience import ResilientLLMCaller, OPEN, CLOSED
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_and_recovers(monkeypatch):
+    """Test the breaker fails fast once open and closes after a successful probe"""
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 0)
+    monkeypatch.setattr(settings, "LLM_RESILIENCE_OVERRIDES", {
+        "breaker_test": {"failure_threshold": 2, "recovery_seconds": 0.05}
+    })
+    caller = ResilientLLMCaller()
+    calls = []
+    
+    async def failing():
+        calls.append(1)
+        raise FakeLLMError(503)
+    
+    for _ in range(2):
+        with pytest.raises(Exception):
+            await caller.call("breaker_test", failing)
+    assert caller.breaker("breaker_test").state == OPEN
+    
+    with pytest.raises(CircuitOpenException):
+        await caller.call("breaker_test", failing)
+    assert len(calls) == 2
+    
+    await asyncio.sleep(0.06)
+    
+    async def healthy():
+        return "ok"
+    
+    assert await caller.call("breaker_test", healthy) == "ok"
+    assert caller.breaker("breaker_test").state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_local_rejections_do_not_open_breaker(monkeypatch):
+    """Test admission-queue rejections aren't counted against the provider"""
+    monkeypatch.setattr(settings, "LLM_RESILIENCE_OVERRIDES", {"overload_test": {"failure_threshold": 1}})
+    caller = ResilientLLMCaller()
+    
+    async def rejected():
+        raise LLMCapacityException("LLM capacity exhausted, please retry shortly")
+    
+    for _ in range(3):
+        with pytest.raises(LLMCapacityException):
+            await caller.call("overload_test", rejected)
+    assert caller.breaker("overload_test").state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_hedge_wins_over_slow_primary(monkeypatch):
+    """Test a slow first attempt is raced by a backup request after the hedge delay"""
+    monkeypatch.setattr(settings, "LLM_RESILIENCE_OVERRIDES", {
+        "hedge_test": {"hedging_enabled": True, "hedge_min_samples": 1, "hedge_min_delay": 0.01}
+    })
+    metrics.reset()
+    metrics.observe("llm.latency_seconds", 0.01, persona="hedge_test")
+    caller = ResilientLLMCaller()
+    attempts = []
+    
+    async def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            await asyncio.sleep(5)
+            return "slow"
+        return "fast"
+    
+    assert await asyncio.wait_for(caller.call("hedge_test", call), timeout=1) == "fast"
+    assert metrics.counter("llm.hedges_fired", persona="hedge_test") == 1
+    assert metrics.counter("llm.hedges_won", persona="hedge_test", winner="backup") == 1
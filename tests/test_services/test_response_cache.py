@@ -0,0 +1,38 @@
+"""Tests for the response cache"""
+import pytest
+from langchain_core.messages import HumanMessage, AIMessage
+from app.core.config import settings
+from app.services.cache.response_cache import (
+    ResponseCache, normalize_message, minhash_signature, estimated_similarity
+)
+
+
+def test_normalize_message():
+    """Test case, punctuation and whitespace are ignored"""
+    assert normalize_message("  How do I raise a SEED round?? ") == "how do i raise a seed round"
+
+
+def test_minhash_similarity():
+    """Test paraphrases score higher than unrelated questions"""
+    base = minhash_signature(normalize_message("how do i raise a seed round"))
+    paraphrase = minhash_signature(normalize_message("how do i raise my seed round"))
+    unrelated = minhash_signature(normalize_message("what database should i use"))
+    assert estimated_similarity(base, paraphrase) > estimated_similarity(base, unrelated)
+
+
+@pytest.mark.asyncio
+async def test_lookup_and_store(monkeypatch):
+    """Test exact and near-duplicate hits are scoped to persona and history"""
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_NEAR_DUPLICATE", True)
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_SIMILARITY_THRESHOLD", 0.5)
+    cache = ResponseCache()
+    
+    await cache.store("investor", "How do I raise a seed round?", [], "Start with angels.")
+    assert await cache.lookup("investor", "how do i raise a seed round", []) == "Start with angels."
+    assert await cache.lookup("investor", "How do I raise my seed round?", []) == "Start with angels."
+    assert await cache.lookup("mentor", "How do I raise a seed round?", []) is None
+    
+    history = [HumanMessage(content="hi"), AIMessage(content="hello")]
+    assert await cache.lookup("investor", "How do I raise a seed round?", history) is None
+    assert cache.enabled_for(history)
@@ -0,0 +1,64 @@
+"""Tests for per-thread request serialization"""
+import asyncio
+import pytest
+from app.core.config import settings
+from app.core.exceptions import ThreadBusyException
+from app.services.memory.thread_lock import ThreadLockManager
+
+
+@pytest.mark.asyncio
+async def test_turns_on_same_thread_are_serialized():
+    """Test two turns on one thread never overlap"""
+    manager = ThreadLockManager()
+    active = []
+    overlaps = []
+    
+    async def turn():
+        async with manager.hold("thread-1"):
+            active.append(1)
+            overlaps.append(len(active))
+            await asyncio.sleep(0.01)
+            active.pop()
+    
+    await asyncio.gather(turn(), turn(), turn())
+    assert overlaps == [1, 1, 1]
+    assert not manager._locks
+
+
+@pytest.mark.asyncio
+async def test_reject_policy(monkeypatch):
+    """Test a busy thread is rejected immediately under the reject policy"""
+    monkeypatch.setattr(settings, "THREAD_LOCK_POLICY", "reject")
+    manager = ThreadLockManager()
+    async with manager.hold("thread-1"):
+        with pytest.raises(ThreadBusyException):
+            async with manager.hold("thread-1"):
+                pass
+        async with manager.hold("thread-2"):
+            pass
+
+
+@pytest.mark.asyncio
+async def test_queue_wait_is_bounded(monkeypatch):
+    """Test queued requests give up after the wait timeout"""
+    monkeypatch.setattr(settings, "THREAD_LOCK_WAIT_TIMEOUT", 0.01)
+    manager = ThreadLockManager()
+    async with manager.hold("thread-1"):
+        with pytest.raises(ThreadBusyException):
+            async with manager.hold("thread-1"):
+                pass
+
+
+@pytest.mark.asyncio
+async def test_distributed_lock_is_renewed_while_held(monkeypatch):
+    """Test a turn longer than THREAD_LOCK_TTL keeps the distributed lock until it ends"""
+    from app.services.cache.adapter import cache_adapter
+    monkeypatch.setattr(cache_adapter, "cache_type", "redis")  # no client: in-memory lock store
+    monkeypatch.setattr(settings, "THREAD_LOCK_TTL", 0.06)
+    manager = ThreadLockManager()
+    key = manager._key("thread-1")
+    async with manager.hold("thread-1"):
+        await asyncio.sleep(0.2)
+        assert not await cache_adapter.acquire_lock(key, "other-worker", 60000)
+    assert await cache_adapter.acquire_lock(key, "other-worker", 60000)
+    await cache_adapter.release_lock(key, "other-worker")
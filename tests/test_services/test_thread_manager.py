@@ -27,3 +27,159 @@ async def test_get_thread(db_connection):
     assert retrieved.thread_id == thread.thread_id
     assert retrieved.persona == "investor"
 
+
+@pytest.mark.asyncio
+async def test_get_thread_for_persona(sqlite_db):
+    """Test the (user, persona) lookup sees threads created after a cached miss"""
+    
+    manager = ThreadManager()
+    assert await manager.get_thread_for_persona("persona-user", "mentor") is None
+    thread = await manager.create_thread(user_id="persona-user", persona="mentor")
+    await manager.create_thread(user_id="persona-user", persona="investor")
+    found = await manager.get_thread_for_persona("persona-user", "mentor")
+    assert found.thread_id == thread.thread_id
+
+
+@pytest.mark.asyncio
+async def test_thread_metadata_cache(sqlite_db):
+    """Test thread lookups are served from cache, including unknown IDs"""
+    from uuid import uuid4
+    from app.core.metrics import metrics
+    metrics.reset()
+    
+    manager = ThreadManager()
+    thread = await manager.create_thread(user_id="cache-user", persona="mentor")
+    retrieved = await manager.get_thread(str(thread.thread_id))
+    assert retrieved.persona == "mentor"
+    assert metrics.counter("thread_cache.hits") == 1
+    
+    missing = str(uuid4())
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            await manager.get_thread(missing)
+    assert metrics.counter("thread_cache.misses") == 1
+    assert metrics.counter("thread_cache.negative_hits") == 1
+
+
+@pytest.mark.asyncio
+async def test_known_user_skips_provisioning(sqlite_db, monkeypatch):
+    """Test known users skip provisioning, and a stale entry is repaired on thread creation"""
+    from app.database.adapter import db_adapter
+    from app.services.memory.known_users import known_users
+    from app.services.memory.thread_manager import _normalize_user_id
+    
+    manager = ThreadManager()
+    await manager.create_user("known-user")
+    queries = []
+    fetchrow = db_adapter.fetchrow
+    
+    async def counting_fetchrow(query, *args):
+        queries.append(query)
+        return await fetchrow(query, *args)
+    
+    monkeypatch.setattr(db_adapter, "fetchrow", counting_fetchrow)
+    await manager.create_thread(user_id="known-user", persona="mentor")
+    assert len(queries) == 1  # just the thread INSERT
+    
+    # A known-users entry for a user that isn't in the DB must not break thread creation
+    await known_users.add(_normalize_user_id("phantom-user"))
+    thread = await manager.create_thread(user_id="phantom-user", persona="mentor")
+    assert thread.persona == "mentor"
+    
+    # Looking up an existing user is a read: it never queues for the SQLite writer
+    queries.clear()
+    user = await manager.create_user("known-user")
+    assert user.user_id == _normalize_user_id("known-user")
+    assert [query.name for query in queries] == ["GET_USER"]
+
+
+@pytest.mark.asyncio
+async def test_transaction_rolls_back_and_defers_cache(sqlite_db):
+    """Test a failed transaction leaves no rows and no cache entries behind"""
+    from app.database.adapter import db_adapter
+    from app.services.cache.adapter import cache_adapter
+    from app.database.queries import CREATE_MESSAGE
+    from app.services.memory.thread_manager import _thread_key
+    from uuid import uuid4
+    
+    manager = ThreadManager()
+    created = []
+    with pytest.raises(RuntimeError):
+        async with db_adapter.transaction() as tx:
+            created.append(await manager.create_thread(user_id="tx-user", persona="mentor", tx=tx))
+            raise RuntimeError("abort")
+    assert await cache_adapter.get(_thread_key(created[0].thread_id)) is None
+    assert await manager.get_user_threads("tx-user") == []
+    
+    uow = db_adapter.unit_of_work()
+    thread = await manager.create_thread(user_id="tx-user", persona="mentor")
+    uow.add(CREATE_MESSAGE, uuid4(), thread.thread_id, "user", "hello")
+    await uow.commit()
+    messages = await manager.get_thread_messages(str(thread.thread_id))
+    assert [m.content for m in messages] == ["hello"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_ingest(sqlite_db):
+    """Test threads and messages can be created in bulk"""
+    manager = ThreadManager()
+    threads = await manager.create_threads_bulk([
+        {"user_id": "bulk-user", "persona": "mentor"},
+        {"user_id": "bulk-user-2", "persona": "investor"},
+    ])
+    written = await manager.save_messages_bulk([
+        {"thread_id": threads[0].thread_id, "role": "user", "content": f"message {i}"}
+        for i in range(50)
+    ])
+    assert written == 50
+    messages = await manager.get_thread_messages(str(threads[0].thread_id))
+    assert [m.content for m in messages] == [f"message {i}" for i in range(50)]
+    found = await manager.get_thread_for_persona("bulk-user-2", "investor")
+    assert found.thread_id == threads[1].thread_id
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_clears_missing_thread_entries(sqlite_db):
+    """Test an imported thread_id that was looked up before the import is found afterwards"""
+    from uuid import uuid4
+    manager = ThreadManager()
+    thread_id = str(uuid4())
+    with pytest.raises(ValueError):
+        await manager.get_thread(thread_id)  # cached as missing
+    await manager.create_threads_bulk([{"user_id": "import-user", "persona": "mentor", "thread_id": thread_id}])
+    assert str((await manager.get_thread(thread_id)).thread_id) == thread_id
+
+
+@pytest.mark.asyncio
+async def test_thread_messages_keyset_pages(sqlite_db):
+    """Test paging backwards and forwards through messages, including timestamp ties"""
+    from datetime import datetime, timedelta
+    manager = ThreadManager()
+    thread = await manager.create_thread(user_id="page-user", persona="mentor")
+    start = datetime(2024, 1, 1)
+    # Messages 3 and 4 share a timestamp; a page boundary falls between them
+    await manager.save_messages_bulk([
+        {"thread_id": thread.thread_id, "role": "user", "content": str(i),
+         "created_at": start + timedelta(seconds=min(i, 3) if i <= 4 else i - 1)}
+        for i in range(7)
+    ])
+    
+    latest = await manager.get_thread_messages_page(str(thread.thread_id), limit=3)
+    assert latest.newer_cursor is None
+    seen = list(latest.items)
+    pages = [latest]
+    while pages[-1].older_cursor:
+        pages.append(await manager.get_thread_messages_page(str(thread.thread_id), limit=3, before=pages[-1].older_cursor))
+        seen = list(pages[-1].items) + seen
+    
+    # Chronological, with the tie broken by message_id
+    tied = sorted((m for m in seen if m.content in ("3", "4")), key=lambda m: str(m.message_id))
+    expected = ["0", "1", "2"] + [m.content for m in tied] + ["5", "6"]
+    assert [m.content for m in seen] == expected
+    assert [[m.content for m in page.items] for page in reversed(pages)] == [expected[:1], expected[1:4], expected[4:]]
+    
+    oldest = pages[-1]
+    forward = await manager.get_thread_messages_page(str(thread.thread_id), limit=3, after=oldest.newer_cursor)
+    assert [m.content for m in forward.items] == expected[1:4]
+    forward = await manager.get_thread_messages_page(str(thread.thread_id), limit=3, after=forward.newer_cursor)
+    assert [m.content for m in forward.items] == expected[4:] and forward.newer_cursor is None